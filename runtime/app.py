@@ -5,10 +5,10 @@ Handles Phase 4: Interactive conversation with voice input
 Handles Phase 5: Streaming conversation with progressive video chunks
 """
 from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, TYPE_CHECKING
 import logging
 import os
 import uuid
@@ -17,11 +17,22 @@ from datetime import datetime
 import shutil
 import json
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 from config import settings, get_settings
-from pipelines.phase1_script import Phase1Pipeline
-from pipelines.conversation_pipeline import ConversationPipeline
-from pipelines.streaming_conversation import StreamingConversationPipeline# Configure logging
+
+# Local (non GPU service) mode loads ASR/LLM/TTS in this process: grow allocator
+# blocks in place instead of fragmenting across turns (must be set before CUDA init)
+os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', 'expandable_segments:True')
+
+# Pipelines pull in torch, faster-whisper, TTS etc. - import them in startup_event
+# so cheap endpoints (/health, asset listings) don't pay for it at import time
+if TYPE_CHECKING:
+    from pipelines.phase1_script import Phase1Pipeline
+    from pipelines.conversation_pipeline import ConversationPipeline
+    from pipelines.streaming_conversation import StreamingConversationPipeline
+
+# Configure logging
 logging.basicConfig(
     level=getattr(logging, settings.log_level.upper()),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -32,7 +43,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Realtime Avatar Runtime Service",
     description="Real-time avatar generation API with conversation support",
-    version="0.2.0"
+    version="0.2.0",
+    default_response_class=ORJSONResponse  # orjson encoder instead of stdlib json
 )
 
 # Add CORS middleware for web UI
@@ -44,69 +56,173 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Uploaded audio is staged here; created once at startup
+AUDIO_UPLOAD_DIR = "/tmp/audio_uploads"
+
+
+def upload_path(job_id: str) -> str:
+    """Temp path for an uploaded audio file, named after the request's job id"""
+    return f"{AUDIO_UPLOAD_DIR}/{job_id}.wav"
+
+
 # Initialize pipelines (will lazy-load models)
-phase1_pipeline: Optional[Phase1Pipeline] = None
-conversation_pipeline: Optional[ConversationPipeline] = None
-streaming_pipeline: Optional[StreamingConversationPipeline] = None
+phase1_pipeline: Optional["Phase1Pipeline"] = None
+conversation_pipeline: Optional["ConversationPipeline"] = None
+streaming_pipeline: Optional["StreamingConversationPipeline"] = None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize models on startup"""
-    global phase1_pipeline, conversation_pipeline, streaming_pipeline
-    logger.info(f"Starting Realtime Avatar Runtime in {settings.mode} mode on {settings.device}")
+    global phase1_pipeline, streaming_pipeline
+    from pipelines.phase1_script import get_phase1_pipeline
+    from pipelines.streaming_conversation import StreamingConversationPipeline
+    
+    logger.info(f"Starting Realtime Avatar Runtime in {settings.mode} mode on {settings.resolved_device}")
     logger.info(f"Video resolution: {settings.video_resolution}, FPS: {settings.video_fps}")
     
+    # Small dedicated executor for blocking file I/O (asyncio.to_thread uses the default
+    # executor, which otherwise sizes itself to cpu_count + 4 threads)
+    app.state.io_exec = ThreadPoolExecutor(
+        max_workers=settings.io_executor_workers,
+        thread_name_prefix="io"
+    )
+    asyncio.get_running_loop().set_default_executor(app.state.io_exec)
+    
     # Create output directories
     os.makedirs(settings.output_dir, exist_ok=True)
+    os.makedirs(settings.final_output_dir, exist_ok=True)
+    app.state.output_sweeper = asyncio.create_task(_output_sweeper())
     os.makedirs("outputs/conversations", exist_ok=True)
-    os.makedirs("/tmp/audio_uploads", exist_ok=True)
+    os.makedirs(AUDIO_UPLOAD_DIR, exist_ok=True)
     
     # Initialize Phase 1 pipeline (lazy load - will initialize on first request)
     try:
-        phase1_pipeline = Phase1Pipeline()
+        phase1_pipeline = get_phase1_pipeline()
         # Don't force initialization at startup - models will load on first request
         logger.info("Phase 1 pipeline created (models will load on first request)")
     except Exception as e:
         logger.error(f"Failed to create Phase 1 pipeline: {e}")
         raise
     
-    # Initialize Phase 4 conversation pipeline
+    # Phase 5 streaming pipeline (the Phase 4 conversation pipeline is the
+    # process-wide one from get_conversation_pipeline, created below)
+    streaming_pipeline = StreamingConversationPipeline(
+        reference_image="bruce_haircut_small.jpg",
+        reference_audio="bruce_en_sample.wav",
+        output_dir="outputs/conversations",
+        device=settings.resolved_device,
+        use_tensorrt=True,
+        max_parallel_chunks=2,  # Process 2 chunks in parallel
+    )
+    
+    # Model loading runs in worker threads, concurrently with each other and with
+    # the async GPU service probe (which the pipelines' own health checks then skip)
+    await asyncio.gather(
+        preflight(),
+        _load_conversation_pipeline(),
+        _initialize_pipeline(streaming_pipeline, "Phase 5 streaming conversation",
+                             "Streaming conversation features will be unavailable"),
+    )
+
+
+async def preflight():
+    """Probe the GPU service's TTS and avatar endpoints concurrently on the pooled async clients"""
+    if not settings.use_external_gpu_service:
+        return
+    from models.tts_client import get_xtts_client
+    from models.avatar_client import get_avatar_client
+    
+    start_time = time.time()
+    results = await asyncio.gather(
+        get_xtts_client().ensure_ready(),
+        get_avatar_client().ensure_ready(),
+        return_exceptions=True
+    )
+    for name, result in zip(("TTS", "avatar"), results):
+        if isinstance(result, Exception):
+            logger.warning(f"GPU service {name} preflight failed: {result}")
+    logger.info(f"GPU service preflight done in {time.time() - start_time:.2f}s")
+
+
+async def _load_conversation_pipeline():
+    """Create and initialize the process-wide Phase 4 pipeline in a worker thread"""
+    global conversation_pipeline
+    from pipelines.conversation_pipeline import get_conversation_pipeline
     try:
-        conversation_pipeline = ConversationPipeline(
+        conversation_pipeline = await asyncio.to_thread(
+            get_conversation_pipeline,
             reference_image="bruce_haircut_small.jpg",  # Just filename, Phase1Pipeline will resolve the path
             reference_audio="bruce_en_sample.wav",  # Just filename, Phase1Pipeline will resolve the path
             output_dir="outputs/conversations",
-            device=settings.device,
+            device=settings.resolved_device,
             use_tensorrt=True,
         )
-        conversation_pipeline.initialize()
         logger.info("Phase 4 conversation pipeline initialized successfully")
+        await conversation_pipeline.warm_references()
     except Exception as e:
-        logger.error(f"Failed to initialize conversation pipeline: {e}")
+        logger.error(f"Failed to initialize Phase 4 conversation pipeline: {e}")
         logger.warning("Conversation features will be unavailable")
-    
-    # Initialize Phase 5 streaming pipeline
+
+
+async def _initialize_pipeline(pipeline, name: str, unavailable_msg: str):
+    """Run a pipeline's blocking initialize() in a worker thread; log instead of raising"""
     try:
-        streaming_pipeline = StreamingConversationPipeline(
-            reference_image="bruce_haircut_small.jpg",
-            reference_audio="bruce_en_sample.wav",
-            output_dir="outputs/conversations",
-            device=settings.device,
-            use_tensorrt=True,
-            max_parallel_chunks=2,  # Process 2 chunks in parallel
-        )
-        streaming_pipeline.initialize()
-        logger.info("Phase 5 streaming conversation pipeline initialized successfully")
+        await asyncio.to_thread(pipeline.initialize)
+        logger.info(f"{name} pipeline initialized successfully")
+        # Move the first request's cold start (kernel autotuning, reference caches) to startup
+        if hasattr(pipeline, "warm_references"):
+            await pipeline.warm_references()
     except Exception as e:
-        logger.error(f"Failed to initialize streaming pipeline: {e}")
-        logger.warning("Streaming conversation features will be unavailable")
+        logger.error(f"Failed to initialize {name} pipeline: {e}")
+        logger.warning(unavailable_msg)
+
+
+def _sweep_output_dir(max_age_s: float) -> int:
+    """Delete intermediate outputs older than max_age_s"""
+    cutoff = time.time() - max_age_s
+    removed = 0
+    with os.scandir(settings.output_dir) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+async def _output_sweeper():
+    """Periodically remove old intermediates so the output_dir tmpfs does not fill up"""
+    while True:
+        await asyncio.sleep(60)
+        try:
+            removed = await asyncio.to_thread(_sweep_output_dir, settings.output_ttl_s)
+            if removed:
+                logger.info(f"Removed {removed} expired output files")
+        except Exception as e:
+            logger.warning(f"Output sweep failed: {e}")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown"""
     logger.info("Shutting down Realtime Avatar Runtime")
+    
+    sweeper = getattr(app.state, "output_sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
+    
+    io_exec = getattr(app.state, "io_exec", None)
+    if io_exec is not None:
+        io_exec.shutdown(wait=False, cancel_futures=True)
+    
+    from models.avatar_client import close_avatar_client
+    from models.tts_client import close_xtts_client
+    await asyncio.gather(close_xtts_client(), close_avatar_client())
 
 
 # Request/Response models
@@ -160,6 +276,7 @@ class ChatRequest(BaseModel):
     message: str
     conversation_history: Optional[List[Dict[str, str]]] = None
     max_tokens: int = 150
+    conversation_id: Optional[str] = None  # Lets the local LLM reuse its KV cache across turns
 
 
 class ChatResponse(BaseModel):
@@ -186,7 +303,7 @@ async def root():
         "service": "Realtime Avatar Runtime",
         "version": "0.1.0",
         "mode": settings.mode,
-        "device": settings.device
+        "device": settings.resolved_device
     }
 
 
@@ -198,12 +315,14 @@ async def health_check():
     return HealthResponse(
         status="healthy" if models_loaded else "initializing",
         mode=settings.mode,
-        device=settings.device,
+        device=settings.resolved_device,
         models_loaded=models_loaded
     )
 
 
-@app.post("/api/v1/generate", response_model=GenerationResponse)
+# GenerationResponse is the only response model with Optional fields, so it is
+# the only route that drops None fields; the others always send every field
+@app.post("/api/v1/generate", response_model=GenerationResponse, response_model_exclude_none=True)
 async def generate_video(request: ScriptRequest, background_tasks: BackgroundTasks):
     """
     Generate talking-head video from text script.
@@ -274,8 +393,10 @@ async def get_video(filename: str):
     if os.path.exists(gpu_output_path):
         video_path = gpu_output_path
     else:
-        # Fallback to regular output directory
-        video_path = os.path.join(settings.output_dir, filename)
+        # Final videos, then intermediates (streamed chunks)
+        video_path = os.path.join(settings.final_output_dir, filename)
+        if not os.path.exists(video_path):
+            video_path = os.path.join(settings.output_dir, filename)
         if not os.path.exists(video_path):
             logger.error(f"[VIDEO] File not found: {filename}")
             raise HTTPException(status_code=404, detail="Video not found")
@@ -352,13 +473,13 @@ async def transcribe_audio(audio: UploadFile = File(...), language: str = "en"):
         raise HTTPException(status_code=503, detail="Conversation pipeline not initialized")
     
     # Save uploaded audio to temp file
-    temp_path = f"/tmp/audio_uploads/{uuid.uuid4().hex}.wav"
+    temp_path = upload_path(f"transcribe_{uuid.uuid4().hex[:8]}")
     try:
         with open(temp_path, "wb") as f:
             shutil.copyfileobj(audio.file, f)
         
         # Transcribe
-        result = conversation_pipeline.transcribe(temp_path, language=language)
+        result = await asyncio.to_thread(conversation_pipeline.transcribe, temp_path, language=language)
         
         return TranscribeResponse(
             text=result["text"],
@@ -386,10 +507,11 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=503, detail="Conversation pipeline not initialized")
     
     try:
-        result = conversation_pipeline.generate_response(
+        result = await conversation_pipeline.generate_response(
             user_message=request.message,
             conversation_history=request.conversation_history,
             max_tokens=request.max_tokens,
+            conversation_id=request.conversation_id,
         )
         
         return ChatResponse(
@@ -407,6 +529,7 @@ async def process_conversation(
     audio: UploadFile = File(...),
     language: str = "en",
     conversation_history: Optional[str] = None,  # JSON string of history
+    conversation_id: Optional[str] = None,
 ):
     """
     Full conversation pipeline: Audio → ASR → LLM → TTS → Video.
@@ -417,7 +540,7 @@ async def process_conversation(
     
     # Save uploaded audio
     job_id = f"conversation_{uuid.uuid4().hex[:8]}"
-    temp_path = f"/tmp/audio_uploads/{job_id}.wav"
+    temp_path = upload_path(job_id)
     
     try:
         with open(temp_path, "wb") as f:
@@ -438,6 +561,7 @@ async def process_conversation(
             conversation_history=history,
             output_name=job_id,
             language=language,
+            conversation_id=conversation_id,
         )
         
         # Get video URL
@@ -484,8 +608,7 @@ async def process_conversation_stream(
     
     # Save uploaded audio BEFORE creating generator
     job_id = f"stream_{uuid.uuid4().hex[:8]}"
-    temp_path = f"/tmp/audio_uploads/{job_id}.wav"
-    os.makedirs("/tmp/audio_uploads", exist_ok=True)
+    temp_path = upload_path(job_id)
     
     # Save audio synchronously before yielding
     with open(temp_path, "wb") as f:
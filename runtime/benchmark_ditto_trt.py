@@ -6,16 +6,78 @@ Uses official Ditto API (StreamSDK) with TensorRT engines.
 import os
 import sys
 import time
-import librosa
-import math
+import subprocess
 import pickle
 import argparse
-from pathlib import Path
+import inspect
+from functools import lru_cache
 
-# Add ditto to path
-sys.path.insert(0, '/app/ditto-talkinghead')
+import numpy as np
 
-from stream_pipeline_offline import StreamSDK
+from config import settings, resolve_trt_engine_dir
+from utils.audio import load_audio_16k, num_video_frames, to_pinned_host
+
+DEFAULT_DATA_ROOT = "/app/ditto-talkinghead/checkpoints/ditto_trt_Ampere_Plus"
+DEFAULT_CFG_PKL = "/app/ditto-talkinghead/checkpoints/ditto_cfg/v0.4_hubert_cfg_trt.pkl"
+
+# StreamSDK instances keyed by (cfg_pkl, data_root) so engines load once per process
+_sdk_cache = {}
+
+
+@lru_cache(maxsize=None)
+def _get_sdk_cls():
+    """Import StreamSDK on first use (pulls in TensorRT), so --help stays fast"""
+    if '/app/ditto-talkinghead' not in sys.path:
+        sys.path.insert(0, '/app/ditto-talkinghead')
+    from stream_pipeline_offline import StreamSDK
+    return StreamSDK
+
+
+def prefetch_engines(data_root: str):
+    """
+    Ask the kernel to start reading every engine file into the page cache.
+    
+    StreamSDK deserializes several hundred MB of engines one after another;
+    with POSIX_FADV_WILLNEED the disk reads are issued up front and overlap,
+    and repeated runs are served from the page cache.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    
+    for root, _, files in os.walk(data_root):
+        for name in files:
+            fd = os.open(os.path.join(root, name), os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+
+
+def create_sdk(cfg_pkl: str, data_root: str):
+    """
+    Construct a StreamSDK with the worker/queue knobs from Settings applied.
+    
+    num_workers is only passed when the installed StreamSDK accepts it.
+    """
+    sdk_cls = _get_sdk_cls()
+    kwargs = {}
+    if "num_workers" in inspect.signature(sdk_cls).parameters:
+        kwargs["num_workers"] = settings.sdk_workers
+    SDK = sdk_cls(cfg_pkl, data_root, **kwargs)
+    
+    # queue.Queue checks maxsize on every put, so it can be bounded after creation
+    if hasattr(SDK, "audio2motion_queue"):
+        SDK.audio2motion_queue.maxsize = settings.sdk_queue_depth
+    return SDK
+
+
+def get_sdk(cfg_pkl: str, data_root: str):
+    """Get or create the StreamSDK for the given config and engine directory"""
+    key = (cfg_pkl, data_root)
+    if key not in _sdk_cache:
+        prefetch_engines(data_root)
+        _sdk_cache[key] = create_sdk(cfg_pkl, data_root)
+    return _sdk_cache[key]
 
 
 def benchmark_trt_inference(
@@ -23,7 +85,8 @@ def benchmark_trt_inference(
     data_root: str,
     audio_path: str,
     source_path: str,
-    output_path: str
+    output_path: str,
+    sdk=None
 ):
     """
     Run Ditto TensorRT inference and measure performance.
@@ -34,6 +97,7 @@ def benchmark_trt_inference(
         audio_path: Path to input audio file
         source_path: Path to input image
         output_path: Path to output video
+        sdk: Already-initialized StreamSDK to reuse (default: cached per config)
     
     Returns:
         dict with timing metrics
@@ -48,18 +112,18 @@ def benchmark_trt_inference(
     print(f"Image: {source_path}")
     print(f"Output: {output_path}")
     
-    # Initialize SDK
+    # Initialize SDK (reused if already loaded in this process)
     print("\nInitializing StreamSDK with TensorRT engines...")
     init_start = time.time()
-    SDK = StreamSDK(cfg_pkl, data_root)
+    SDK = sdk if sdk is not None else get_sdk(cfg_pkl, data_root)
     init_time = time.time() - init_start
     print(f"✓ SDK initialized in {init_time:.2f}s")
     
     # Load and analyze audio
     print("\nLoading audio...")
-    audio, sr = librosa.core.load(audio_path, sr=16000)
+    audio, sr = load_audio_16k(audio_path)
     audio_duration = len(audio) / sr
-    num_frames = math.ceil(len(audio) / 16000 * 25)
+    num_frames = num_video_frames(len(audio))
     print(f"  Audio duration: {audio_duration:.2f}s")
     print(f"  Expected frames: {num_frames} @ 25fps")
     
@@ -77,7 +141,10 @@ def benchmark_trt_inference(
     inference_start = time.time()
     
     # Extract features and run
-    aud_feat = SDK.wav2feat.wav2feat(audio)
+    aud_feat = SDK.wav2feat.wav2feat(to_pinned_host(audio))
+    # Contiguous float32 once, so per-frame slices bind to the TRT inputs
+    # without a dtype/layout conversion copy each frame
+    aud_feat = np.ascontiguousarray(aud_feat, dtype=np.float32)
     SDK.audio2motion_queue.put(aud_feat)
     SDK.close()
     
@@ -87,8 +154,14 @@ def benchmark_trt_inference(
     # Mux audio and video
     print("\nMuxing audio and video with ffmpeg...")
     mux_start = time.time()
-    cmd = f'ffmpeg -loglevel error -y -i "{SDK.tmp_output_path}" -i "{audio_path}" -map 0:v -map 1:a -c:v copy -c:a aac "{output_path}"'
-    os.system(cmd)
+    # argv list: no /bin/sh fork and no shell quoting of the paths
+    subprocess.run([
+        "ffmpeg", "-loglevel", "error", "-y",
+        "-i", SDK.tmp_output_path, "-i", audio_path,
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "copy", "-c:a", "aac",
+        output_path
+    ], check=True)
     mux_time = time.time() - mux_start
     print(f"✓ Muxing complete in {mux_time:.2f}s")
     
@@ -136,18 +209,28 @@ def benchmark_trt_inference(
     }
 
 
+def _require(path: str, name: str) -> bool:
+    """Single stat() per input; reports which input is missing"""
+    try:
+        os.stat(path)
+        return True
+    except FileNotFoundError:
+        print(f"ERROR: {name} not found: {path}")
+        return False
+
+
 def main():
     parser = argparse.ArgumentParser(description="Benchmark Ditto TensorRT inference")
     parser.add_argument(
         "--data_root",
         type=str,
-        default="/app/ditto-talkinghead/checkpoints/ditto_trt_Ampere_Plus",
+        default=DEFAULT_DATA_ROOT,
         help="Path to TensorRT engines"
     )
     parser.add_argument(
         "--cfg_pkl",
         type=str,
-        default="/app/ditto-talkinghead/checkpoints/ditto_cfg/v0.4_hubert_cfg_trt.pkl",
+        default=DEFAULT_CFG_PKL,
         help="Path to TRT config pickle"
     )
     parser.add_argument(
@@ -170,12 +253,12 @@ def main():
     )
     
     args = parser.parse_args()
+    args.data_root = resolve_trt_engine_dir(args.data_root)
     
     # Verify files exist
     for path, name in [(args.cfg_pkl, "config"), (args.data_root, "engines"), 
                        (args.audio_path, "audio"), (args.source_path, "image")]:
-        if not Path(path).exists():
-            print(f"ERROR: {name} not found: {path}")
+        if not _require(path, name):
             return 1
     
     # Run benchmark
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Build INT8 TensorRT engines for LivePortrait (post-training quantization).
+
+Quantizes the motion extractor from its ONNX export with an entropy
+calibrator fed by the avatar reference images, preprocessed the way
+LivePortrait prepares a source frame (RGB, 256x256, [0, 1], NCHW). The
+appearance feature extractor is more sensitive to quantization and is copied
+over as its FP16 engine.
+
+The INT8 engine is only kept if its outputs stay within --max-rel-err of the
+FP16 engine on the same images. Engines are written to
+"<engine_dir>_int8", which LivePortraitModel picks up with TRT_PRECISION=int8.
+
+Usage:
+    python build_liveportrait_int8.py [--onnx-dir DIR] [--images DIR]
+"""
+import argparse
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import tensorrt as trt
+import torch
+
+from config import settings
+from models.liveportrait_model import _TRTEngine
+
+SOURCE_SIZE = 256
+INT8_ENGINES = {"motion_extractor.onnx": "motion_extractor.trt"}
+FP16_ENGINES = ["appearance_feature_extractor.trt"]
+
+TRT_LOGGER = trt.Logger(trt.Logger.WARNING)
+
+
+def load_source_images(images_dir: str) -> list:
+    """Reference images preprocessed like LivePortrait's prepare_source: (1, 3, 256, 256) float32"""
+    images = []
+    for entry in sorted(os.scandir(images_dir), key=lambda e: e.name):
+        if not entry.name.lower().endswith((".jpg", ".jpeg", ".png")):
+            continue
+        img = cv2.imread(entry.path)
+        if img is None:
+            continue
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        img = cv2.resize(img, (SOURCE_SIZE, SOURCE_SIZE), interpolation=cv2.INTER_AREA)
+        images.append(np.ascontiguousarray(img.transpose(2, 0, 1)[None], dtype=np.float32) / 255.0)
+    return images
+
+
+class ImageCalibrator(trt.IInt8EntropyCalibrator2):
+    """Feeds preprocessed source images to the TensorRT INT8 calibrator, one per batch"""
+
+    def __init__(self, images: list, cache_path: Path):
+        super().__init__()
+        self.images = images
+        self.cache_path = cache_path
+        self.index = 0
+        self.device_input = None
+
+    def get_batch_size(self):
+        return 1
+
+    def get_batch(self, names):
+        if self.index >= len(self.images):
+            return None
+        # Keep a reference: TensorRT reads the buffer after get_batch returns
+        self.device_input = torch.from_numpy(self.images[self.index]).cuda()
+        self.index += 1
+        return [self.device_input.data_ptr()]
+
+    def read_calibration_cache(self):
+        if self.cache_path.exists():
+            return self.cache_path.read_bytes()
+        return None
+
+    def write_calibration_cache(self, cache):
+        self.cache_path.write_bytes(cache)
+
+
+def build_int8_engine(onnx_path: Path, engine_path: Path, calibrator: ImageCalibrator):
+    """Parse an ONNX model and build an INT8 (FP16 fallback) engine for batch size 1"""
+    builder = trt.Builder(TRT_LOGGER)
+    network = builder.create_network(1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH))
+    parser = trt.OnnxParser(network, TRT_LOGGER)
+    if not parser.parse(onnx_path.read_bytes()):
+        errors = [str(parser.get_error(i)) for i in range(parser.num_errors)]
+        raise RuntimeError(f"Failed to parse {onnx_path}: {errors}")
+
+    config = builder.create_builder_config()
+    config.set_memory_pool_limit(trt.MemoryPoolType.WORKSPACE, 4 << 30)
+    config.set_flag(trt.BuilderFlag.INT8)
+    config.set_flag(trt.BuilderFlag.FP16)  # Layers without INT8 kernels
+    config.int8_calibrator = calibrator
+
+    profile = builder.create_optimization_profile()
+    for i in range(network.num_inputs):
+        tensor = network.get_input(i)
+        shape = (1,) + tuple(tensor.shape)[1:]
+        profile.set_shape(tensor.name, shape, shape, shape)
+    config.add_optimization_profile(profile)
+    config.set_calibration_profile(profile)
+
+    serialized = builder.build_serialized_network(network, config)
+    if serialized is None:
+        raise RuntimeError(f"TensorRT build failed for {onnx_path}")
+    engine_path.write_bytes(serialized)
+
+
+def max_relative_error(int8_path: Path, fp16_path: Path, images: list) -> float:
+    """Largest ||int8 - fp16|| / ||fp16|| over all outputs and images"""
+    stream = torch.cuda.Stream()
+    int8, fp16 = _TRTEngine(int8_path, stream), _TRTEngine(fp16_path, stream)
+    worst = 0.0
+    for image in images:
+        x = torch.from_numpy(image).cuda()
+        a, b = int8(x), fp16(x)
+        if not isinstance(a, dict):
+            a, b = {"out": a}, {"out": b}
+        for name in b:
+            err = (torch.linalg.vector_norm(a[name] - b[name]) / torch.linalg.vector_norm(b[name]).clamp_min(1e-6)).item()
+            worst = max(worst, err)
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--onnx-dir", default=os.path.join(settings.liveportrait_model_path, "onnx"))
+    parser.add_argument("--fp16-dir", default=settings.liveportrait_trt_engine_dir,
+                        help="FP16 engines to validate against / copy")
+    parser.add_argument("--images", default=settings.images_dir, help="Calibration images")
+    parser.add_argument("--max-rel-err", type=float, default=0.05)
+    args = parser.parse_args()
+
+    onnx_dir, fp16_dir = Path(args.onnx_dir), Path(args.fp16_dir)
+    out_dir = Path(f"{str(fp16_dir).rstrip('/')}_int8")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    images = load_source_images(args.images)
+    if len(images) < 2:
+        sys.exit(f"Need at least 2 calibration images in {args.images}, found {len(images)}")
+    # Hold out every 5th image for validation
+    calib_images = [img for i, img in enumerate(images) if i % 5 != 4]
+    check_images = [img for i, img in enumerate(images) if i % 5 == 4] or images[:1]
+    print(f"Calibrating on {len(calib_images)} images, validating on {len(check_images)}")
+
+    for onnx_name, engine_name in INT8_ENGINES.items():
+        engine_path = out_dir / engine_name
+        calibrator = ImageCalibrator(calib_images, out_dir / f"{engine_name}.calib")
+        print(f"Building INT8 {engine_name} from {onnx_dir / onnx_name}...")
+        build_int8_engine(onnx_dir / onnx_name, engine_path, calibrator)
+
+        fp16_path = fp16_dir / engine_name
+        if fp16_path.exists():
+            err = max_relative_error(engine_path, fp16_path, check_images)
+            print(f"  max relative error vs FP16: {err:.4f}")
+            if err > args.max_rel_err:
+                # Fall back to the FP16 engine for this network
+                print(f"  exceeds {args.max_rel_err}; keeping the FP16 engine instead")
+                shutil.copyfile(fp16_path, engine_path)
+        else:
+            print(f"  no FP16 engine at {fp16_path}; skipping validation")
+
+    for engine_name in FP16_ENGINES:
+        if (fp16_dir / engine_name).exists():
+            shutil.copyfile(fp16_dir / engine_name, out_dir / engine_name)
+            print(f"Copied FP16 {engine_name}")
+
+    print(f"\nEngines written to {out_dir} (use with TRT_PRECISION=int8)")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,54 +5,47 @@ Complete pipeline: Text → XTTS voice cloning → Ditto TensorRT lip sync
 import os
 import sys
 import time
-import subprocess
 import argparse
 
+# tts_voice_clone.py and benchmark_ditto_trt.py live next to this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
 def run_tts(text, speaker_wav, output_audio, language="en"):
-    """Run TTS voice cloning in separate process to avoid NumPy conflicts"""
+    """Run TTS voice cloning in-process (XTTS model is loaded once and reused)"""
     print(f"\n{'='*60}")
     print("STEP 1: Text-to-Speech with Voice Cloning")
     print(f"{'='*60}")
     
-    cmd = [
-        "python3", "/root/tts_voice_clone.py",
-        text,
-        speaker_wav,
-        output_audio,
-        language
-    ]
+    from tts_voice_clone import synthesize_speech
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    print(result.stdout)
-    if result.returncode != 0:
-        print("TTS Error:", result.stderr)
+    try:
+        _, duration = synthesize_speech(text, speaker_wav, output_audio, language)
+    except Exception as e:
+        print("TTS Error:", e)
         return None
     
-    # Parse duration from output
-    for line in result.stdout.split('\n'):
-        if 'Audio duration:' in line:
-            duration = float(line.split(':')[1].strip().replace('s', ''))
-            return duration
-    
-    return None
+    return duration
 
 def run_ditto_trt(image_path, audio_path, output_video):
-    """Run Ditto TensorRT lip sync"""
+    """Run Ditto TensorRT lip sync in-process (StreamSDK is cached per process)"""
     print(f"\n{'='*60}")
     print("STEP 2: Ditto TensorRT Lip Sync")
     print(f"{'='*60}")
     
-    cmd = [
-        "python3", "/app/runtime/benchmark_ditto_trt.py",
-        "--source_path", image_path,
-        "--audio_path", audio_path,
-        "--output_path", output_video
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    print(result.stdout)
-    if result.returncode != 0:
-        print("Ditto Error:", result.stderr)
+    from benchmark_ditto_trt import benchmark_trt_inference, DEFAULT_CFG_PKL, DEFAULT_DATA_ROOT
+    from config import resolve_trt_engine_dir
+    
+    try:
+        benchmark_trt_inference(
+            cfg_pkl=DEFAULT_CFG_PKL,
+            data_root=resolve_trt_engine_dir(DEFAULT_DATA_ROOT),
+            audio_path=audio_path,
+            source_path=image_path,
+            output_path=output_video
+        )
+    except Exception as e:
+        print("Ditto Error:", e)
         return False
     
     return True
@@ -4,17 +4,20 @@ Complete end-to-end TensorRT pipeline:
 1. Text -> TTS (audio generation)
 2. Audio -> Ditto TensorRT (lip-synced video)
 """
-import os
 import sys
 import time
-import librosa
-import math
+import subprocess
+import queue
 import argparse
+import threading
 from pathlib import Path
 
-# Add ditto to path
-sys.path.insert(0, '/app/ditto-talkinghead')
-from stream_pipeline_offline import StreamSDK
+import numpy as np
+import soundfile as sf
+
+from config import resolve_trt_engine_dir
+from benchmark_ditto_trt import create_sdk
+from utils.audio import to_mono_16k, num_video_frames, to_pinned_host
 
 
 def generate_audio_with_tts(text: str, output_path: str, voice: str = "default") -> dict:
@@ -44,19 +47,23 @@ def generate_audio_with_tts(text: str, output_path: str, voice: str = "default")
     print("\nInitializing TTS model...")
     tts = TTS(model_name="tts_models/en/vctk/vits", progress_bar=False)
     
-    # Generate speech
+    # Generate speech straight into memory
     print("Generating speech...")
-    tts.tts_to_file(
+    wav = tts.tts(
         text=text,
-        file_path=output_path,
         speaker="p326"  # Female voice
     )
+    sample_rate = tts.synthesizer.output_sample_rate
+    wav = np.asarray(wav, dtype=np.float32)
+    
+    # Written once, only for the final ffmpeg mux
+    sf.write(output_path, wav, sample_rate, subtype='PCM_16')
     
     tts_time = time.time() - tts_start
     
-    # Get audio duration
-    audio, sr = librosa.core.load(output_path, sr=16000)
-    audio_duration = len(audio) / sr
+    # Ditto consumes the in-memory 16 kHz copy, no re-read from disk
+    audio = to_mono_16k(wav, sample_rate)
+    audio_duration = len(wav) / sample_rate
     
     print(f"✓ Audio generated in {tts_time:.2f}s")
     print(f"  Audio duration: {audio_duration:.2f}s")
@@ -66,68 +73,93 @@ def generate_audio_with_tts(text: str, output_path: str, voice: str = "default")
         "tts_time": tts_time,
         "audio_duration": audio_duration,
         "audio_path": output_path,
+        "audio": audio,
         "rtf": tts_time / audio_duration
     }
 
 
-def run_ditto_trt(
+def prepare_ditto_trt(
     cfg_pkl: str,
     data_root: str,
-    audio_path: str,
     source_path: str,
     output_path: str
-) -> dict:
+) -> tuple:
     """
-    Run Ditto TensorRT inference for lip syncing.
+    Load TensorRT engines and prepare the source image.
+    
+    Neither step depends on the audio, so this runs while TTS is still
+    generating speech.
     
     Args:
         cfg_pkl: Path to TRT config pickle
         data_root: Path to TRT engine directory
-        audio_path: Path to input audio file
         source_path: Path to input image
         output_path: Path to output video
     
     Returns:
-        dict with timing metrics
+        Tuple of (SDK, dict with timing metrics)
     """
     print("\n" + "=" * 80)
     print("Step 2: Lip Sync with Ditto TensorRT")
     print("=" * 80)
     
-    print(f"Audio: {audio_path}")
     print(f"Image: {source_path}")
     print(f"Output: {output_path}")
     
     # Initialize SDK
     print("\nInitializing StreamSDK with TensorRT engines...")
     init_start = time.time()
-    SDK = StreamSDK(cfg_pkl, data_root)
+    SDK = create_sdk(cfg_pkl, data_root)
     init_time = time.time() - init_start
     print(f"✓ SDK initialized in {init_time:.2f}s")
     
-    # Load and analyze audio
-    print("\nLoading audio...")
-    audio, sr = librosa.core.load(audio_path, sr=16000)
-    audio_duration = len(audio) / sr
-    num_frames = math.ceil(len(audio) / 16000 * 25)
-    print(f"  Audio duration: {audio_duration:.2f}s")
-    print(f"  Expected frames: {num_frames} @ 25fps")
-    
-    # Setup inference
+    # Setup source image (face crop + appearance features)
     print("\nSetting up inference...")
     setup_start = time.time()
     SDK.setup(source_path, output_path)
-    SDK.setup_Nd(N_d=num_frames, fade_in=-1, fade_out=-1, ctrl_info={})
     setup_time = time.time() - setup_start
     print(f"✓ Setup complete in {setup_time:.2f}s")
     
+    return SDK, {"init_time": init_time, "setup_time": setup_time}
+
+
+def run_ditto_trt(
+    SDK,
+    audio: np.ndarray,
+    audio_path: str,
+    output_path: str
+) -> dict:
+    """
+    Run Ditto TensorRT inference for lip syncing on a prepared SDK.
+    
+    Args:
+        SDK: StreamSDK returned by prepare_ditto_trt
+        audio: Mono float32 audio at 16 kHz
+        audio_path: Path to the audio file muxed into the output video
+        output_path: Path to output video
+    
+    Returns:
+        dict with timing metrics
+    """
+    print(f"\nAudio: {audio_path}")
+    
+    audio_duration = len(audio) / 16000
+    num_frames = num_video_frames(len(audio))
+    print(f"  Audio duration: {audio_duration:.2f}s")
+    print(f"  Expected frames: {num_frames} @ 25fps")
+    
+    SDK.setup_Nd(N_d=num_frames, fade_in=-1, fade_out=-1, ctrl_info={})
+    
     # Run inference
     print(f"\nRunning TensorRT inference...")
     print(f"  Processing {num_frames} frames ({audio_duration:.2f}s audio)")
     inference_start = time.time()
     
     # Extract features and run
-    aud_feat = SDK.wav2feat.wav2feat(audio)
+    aud_feat = SDK.wav2feat.wav2feat(to_pinned_host(audio))
+    # Contiguous float32 once, so per-frame slices bind to the TRT inputs
+    # without a dtype/layout conversion copy each frame
+    aud_feat = np.ascontiguousarray(aud_feat, dtype=np.float32)
     SDK.audio2motion_queue.put(aud_feat)
     SDK.close()
     
@@ -137,22 +169,24 @@ def run_ditto_trt(
     # Mux audio and video
     print("\nMuxing audio and video...")
     mux_start = time.time()
-    cmd = f'ffmpeg -loglevel error -y -i "{SDK.tmp_output_path}" -i "{audio_path}" -map 0:v -map 1:a -c:v copy -c:a aac "{output_path}"'
-    os.system(cmd)
+    # argv list: no /bin/sh fork and no shell quoting of the paths
+    subprocess.run([
+        "ffmpeg", "-loglevel", "error", "-y",
+        "-i", SDK.tmp_output_path, "-i", audio_path,
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "copy", "-c:a", "aac",
+        output_path
+    ], check=True)
     mux_time = time.time() - mux_start
     print(f"✓ Muxing complete in {mux_time:.2f}s")
     
     # Calculate metrics
-    total_time = init_time + setup_time + inference_time + mux_time
     rtf = inference_time / audio_duration
     fps = num_frames / inference_time
     
     return {
-        "init_time": init_time,
-        "setup_time": setup_time,
         "inference_time": inference_time,
         "mux_time": mux_time,
-        "total_time": total_time,
         "audio_duration": audio_duration,
         "num_frames": num_frames,
         "fps": fps,
@@ -200,6 +234,7 @@ def main():
     )
     
     args = parser.parse_args()
+    args.data_root = resolve_trt_engine_dir(args.data_root)
     
     # Verify source image exists
     if not Path(args.source_image).exists():
@@ -212,27 +247,53 @@ def main():
     print()
     
     try:
-        # Step 1: Generate audio from text
-        tts_metrics = generate_audio_with_tts(
-            text=args.text,
-            output_path=args.audio_output
-        )
+        pipeline_start = time.time()
         
-        # Step 2: Run Ditto TensorRT for lip syncing
-        ditto_metrics = run_ditto_trt(
+        # Step 1: Generate audio from text in a producer thread; the result
+        # (or the exception) is handed over through a single-slot queue
+        tts_queue = queue.Queue(maxsize=1)
+        
+        def tts_producer():
+            try:
+                tts_queue.put(generate_audio_with_tts(
+                    text=args.text,
+                    output_path=args.audio_output
+                ))
+            except Exception as e:
+                tts_queue.put(e)
+        
+        tts_thread = threading.Thread(target=tts_producer, name="tts", daemon=True)
+        tts_thread.start()
+        
+        # Step 2: Load engines and prepare the source image while TTS runs
+        SDK, prep_metrics = prepare_ditto_trt(
             cfg_pkl=args.cfg_pkl,
             data_root=args.data_root,
-            audio_path=args.audio_output,
             source_path=args.source_image,
             output_path=args.output_video
         )
         
+        tts_metrics = tts_queue.get()
+        tts_thread.join()
+        if isinstance(tts_metrics, Exception):
+            raise tts_metrics
+        
+        # Step 3: Run Ditto TensorRT for lip syncing
+        ditto_metrics = run_ditto_trt(
+            SDK,
+            audio=tts_metrics["audio"],
+            audio_path=args.audio_output,
+            output_path=args.output_video
+        )
+        ditto_metrics.update(prep_metrics)
+        
         # Print complete pipeline metrics
         print("\n" + "=" * 80)
         print("COMPLETE PIPELINE METRICS")
         print("=" * 80)
         
-        total_pipeline_time = tts_metrics["tts_time"] + ditto_metrics["total_time"]
+        # Wall-clock time: TTS overlaps with SDK init + setup
+        total_pipeline_time = time.time() - pipeline_start
         audio_duration = tts_metrics["audio_duration"]
         
         print("\n--- TTS Metrics ---")
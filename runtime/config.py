@@ -3,13 +3,17 @@ Configuration management for runtime service.
 Supports local (CPU/MPS), and production (GPU) modes.
 """
 from pydantic_settings import BaseSettings
-from typing import Literal
+from typing import Literal, Optional
+from functools import lru_cache
 import os
-import torch
 
 
+@lru_cache(maxsize=None)
 def auto_detect_device() -> str:
     """Auto-detect best available device (MPS for M1/M2/M3, CUDA for NVIDIA, CPU fallback)"""
+    # Imported here so tools that never touch the device don't pay for torch/CUDA init
+    import torch
+    
     if torch.backends.mps.is_available():
         return "mps"  # Apple Silicon GPU
     elif torch.cuda.is_available():
@@ -23,7 +27,8 @@ class Settings(BaseSettings):
     
     # Execution mode
     mode: Literal["local", "production"] = "local"
-    device: Literal["cpu", "cuda", "mps"] = auto_detect_device()
+    # None = auto-detect on first use of resolved_device (set DEVICE to override)
+    device: Optional[Literal["cpu", "cuda", "mps"]] = None
     
     # Server config
     host: str = "0.0.0.0"
@@ -40,20 +45,81 @@ class Settings(BaseSettings):
     model_cache_dir: str = "/root/.cache"
     xtts_model_path: str = "/root/.cache/tts_models"
     liveportrait_model_path: str = "/root/.cache/liveportrait"
+    # LivePortrait networks on CUDA: "torch_compile" (Inductor max-autotune, all
+    # four networks) or "tensorrt" (prebuilt extractor engines + decoder CUDA graphs)
+    liveportrait_backend: Literal["torch_compile", "tensorrt"] = "torch_compile"
+    # Inductor FX graph / autotuning cache, kept on the model-cache volume across restarts
+    torchinductor_cache_dir: str = "/root/.cache/torchinductor"
+    # FasterLivePortrait TensorRT engines (appearance/motion extractors); PyTorch when absent
+    liveportrait_trt_engine_dir: str = "/root/.cache/liveportrait/trt"
+    # Capture the LivePortrait SPADE decoder into CUDA graphs (one per input shape; tensorrt backend)
+    liveportrait_cuda_graphs: bool = True
+    # Compute LivePortrait audio features (80-bin log-mel at video fps) on the GPU
+    # instead of with the checkout's CPU extract_audio_features; enable only for
+    # checkpoints trained on that feature layout
+    liveportrait_gpu_audio_features: bool = False
+    gfpgan_model_path: str = "/root/.cache/gfpgan/GFPGANv1.4.pth"
+    # Offload LivePortrait to CPU while GFPGAN runs and free GFPGAN afterwards
+    # (set False on GPUs with room for both to skip the transfers)
+    gfpgan_unload: bool = True
+    # GFPGAN worker processes in unload mode (0 = as many as fit in free VRAM, max 4)
+    gfpgan_workers: int = 0
     
     # Model settings
     xtts_language: Literal["en", "es", "fr", "de", "it", "pt", "pl", "tr", "ru", "nl", "cs", "ar", "zh-cn", "ja", "hu", "ko"] = "en"
     default_reference_image: str = "bruce_neutral.jpg"
     
+    # XTTS inference backend: "pytorch" (FP32) or "pytorch_fp16" (FP16 autocast on CUDA)
+    xtts_backend: Literal["pytorch", "pytorch_fp16"] = "pytorch_fp16"
+    
+    # TensorRT engine precision for Ditto. Engines for a precision live in
+    # "<engine_dir>_<precision>" (e.g. ditto_trt_Ampere_Plus_fp16)
+    trt_precision: Literal["fp32", "fp16", "int8"] = "fp16"
+    
+    # Ditto StreamSDK pipelining. Roughly one worker per CUDA stream; a good
+    # starting point is torch.cuda.get_device_properties(0).multi_processor_count // 20
+    sdk_workers: int = 2
+    # Max audio-feature chunks buffered ahead of audio2motion
+    sdk_queue_depth: int = 8
+    # torch.compile (CUDA graphs) the Ditto PyTorch modules on CUDA; TRT engines are unaffected
+    ditto_torch_compile: bool = True
+    
     # GPU Service settings (for hybrid deployment)
-    gpu_service_url: str = os.getenv("GPU_SERVICE_URL", "http://host.docker.internal:8001")
-    use_external_gpu_service: bool = os.getenv("USE_EXTERNAL_GPU_SERVICE", "true").lower() == "true"
+    # Read from GPU_SERVICE_URL / USE_EXTERNAL_GPU_SERVICE by BaseSettings
+    gpu_service_url: str = "http://host.docker.internal:8001"
+    use_external_gpu_service: bool = True
     
     # Gemini LLM settings (replaces local Qwen)
-    use_gemini_llm: bool = os.getenv("USE_GEMINI_LLM", "true").lower() == "true"
-    gemini_model: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
-    gemini_project: str = os.getenv("GEMINI_PROJECT", "realtime-avatar-bg")
-    gemini_location: str = os.getenv("GEMINI_LOCATION", "us-central1")
+    use_gemini_llm: bool = True
+    gemini_model: str = "gemini-2.0-flash-exp"
+    gemini_project: str = "realtime-avatar-bg"
+    gemini_location: str = "us-central1"
+    
+    # Local Qwen LLM (USE_GEMINI_LLM=false). On CUDA the INT4 AWQ checkpoint is
+    # loaded instead; set LLM_AWQ_MODEL="" to run llm_model in FP16
+    llm_model: str = "Qwen/Qwen2.5-7B-Instruct"
+    llm_awq_model: str = "Qwen/Qwen2.5-7B-Instruct-AWQ"
+    # FP8 TensorRT-LLM engine of llm_model, used instead on Ada/Hopper GPUs when present
+    llm_trt_engine_dir: str = "/root/.cache/llm/qwen2.5-7b-fp8"
+    # Per-conversation KV caches kept between turns (~60MB per 1k tokens for Qwen2.5-7B;
+    # needs transformers>=4.42, skipped on older versions)
+    llm_kv_cache_ttl_s: float = 600
+    llm_kv_cache_max_conversations: int = 8
+    
+    # Streamed LLM replies are cut into TTS chunks: the first one as soon as a
+    # sentence (or first_chunk_max_words words) is complete, later ones once they
+    # reach min_words at a sentence end, or max_words at a clause break
+    stream_first_chunk_max_words: int = 8
+    stream_chunk_min_words: int = 3
+    stream_chunk_max_words: int = 25
+    # Later sentences shorter than this are appended to the chunk before them
+    # (within stream_chunk_max_words): one GPU service round trip instead of two
+    stream_merge_min_words: int = 6
+    
+    @property
+    def resolved_device(self) -> str:
+        """Configured device, or the auto-detected one (probed once, then cached)"""
+        return self.device or auto_detect_device()
     
     # Performance settings (adjust based on mode)
     @property
@@ -75,13 +141,28 @@ class Settings(BaseSettings):
         """Maximum audio duration in seconds"""
         return 30
     
+    # Thread pool for blocking file I/O in the runtime service
+    io_executor_workers: int = 4
+    
     # Output settings
+    # Intermediates (TTS audio read back by the GPU service, segment and streamed
+    # chunk videos); a tmpfs volume in docker-compose, swept after output_ttl_s
     output_dir: str = "/tmp/realtime-avatar-output"
+    output_ttl_s: int = 600
+    # Final videos (and their audio) served by /api/v1/videos; kept on disk
+    final_output_dir: str = "/app/outputs/videos"
+    
+    # Synthesized TTS audio reused for repeated (text, language, speaker) requests
+    tts_cache_dir: str = "/tmp/realtime-avatar-tts-cache"
+    tts_cache_max_entries: int = 256
+    # Copies of recent avatar videos reused for repeated (image, audio) requests
+    avatar_cache_dir: str = "/tmp/realtime-avatar-avatar-cache"
     
     class Config:
         env_file = ".env"
         case_sensitive = False
         extra = "ignore"  # Allow extra env variables
+        frozen = True  # Read-only after load; shared across threads and requests
 
 
 # Global settings instance
@@ -98,6 +179,16 @@ def is_local() -> bool:
     return settings.mode == "local"
 
 
+def resolve_trt_engine_dir(base_dir: str) -> str:
+    """
+    Pick the TensorRT engine directory for the configured precision.
+    
+    Falls back to base_dir when no "<base_dir>_<precision>" variant has been built.
+    """
+    variant = f"{base_dir.rstrip('/')}_{settings.trt_precision}"
+    return variant if os.path.isdir(variant) else base_dir
+
+
 def is_gpu_available() -> bool:
     """Check if GPU (CUDA or MPS) is available"""
-    return settings.device in ("cuda", "mps")
+    return settings.resolved_device in ("cuda", "mps")
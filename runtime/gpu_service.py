@@ -14,26 +14,52 @@ Deployment modes:
 - Remote: GCP GPU instance with CUDA
 """
 import os
+import re
 import sys
-
-# Enable MPS fallback for operations not yet implemented (like grid_sampler_3d)
-# Most operations still use GPU, only unsupported ones fall back to CPU
-os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
+import time
+import uuid
+import shutil
+import asyncio
+
+# Expandable segments let the caching allocator grow blocks in place instead of
+# fragmenting under bursty, variable-length requests; the GC threshold reclaims
+# cached blocks before OOM when GFPGAN and LivePortrait alternate on one GPU
+# (must be set before CUDA init)
+os.environ.setdefault(
+    'PYTORCH_CUDA_ALLOC_CONF',
+    'expandable_segments:True,max_split_size_mb:128,garbage_collection_threshold:0.8'
+)
 
 import torch
 import logging
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Optional, Literal
+from typing import Optional, Literal, Callable, Awaitable, List
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
 import uvicorn
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
+from config import auto_detect_device
 from models.tts import XTTSModel
+from utils.mps_ops import patch_mps_ops
 # Conditionally import avatar models based on backend config
 AVATAR_BACKEND = os.getenv("AVATAR_BACKEND", "auto")  # auto, sadtalker, liveportrait, ditto
+# Reference image used for the startup warmup pass (skipped if missing)
+WARMUP_IMAGE = os.getenv("WARMUP_IMAGE", "/app/assets/images/bruce_neutral.jpg")
+
+# Shared output directory; files the caller fetches by path are swept after OUTPUT_TTL_S
+OUTPUT_DIR = Path("/tmp/gpu-service-output")
+OUTPUT_TTL_S = int(os.getenv("OUTPUT_TTL_S", 600))
+# Fixed slot files reused by /tts/generate_raw (bytes are returned inline)
+RAW_TTS_SLOTS = 8
+# Long text is synthesized in sentence-aligned chunks of about this many characters
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", 200))
 
 # Only import models we'll actually use
 if AVATAR_BACKEND in ("auto", "sadtalker"):
@@ -57,9 +83,84 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="GPU Acceleration Service",
     description="ML inference service for TTS, video generation, and other GPU tasks",
-    version="1.0"
+    version="1.0",
+    default_response_class=ORJSONResponse
 )
 
+class MicroBatcher:
+    """
+    Coalesces requests that arrive within a short window into one batch.
+    
+    Callers await submit(item); a single background task collects up to
+    max_batch items (waiting at most window_s after the first one), passes them
+    to handler(items) and resolves each caller's future with its result. The
+    handler returns one result (or Exception) per item, in order.
+    """
+    
+    def __init__(
+        self,
+        handler: Callable[[list], Awaitable[list]],
+        max_batch: int = 4,
+        window_s: float = 0.02,
+        name: str = "batcher"
+    ):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.window_s = window_s
+        self.name = name
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the background batching task (call from a running event loop)"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run(), name=self.name)
+    
+    async def stop(self):
+        """Cancel the background task"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def submit(self, item):
+        """Queue an item and wait for its result"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+    
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = await self.handler(items)
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
 # Global models
 tts_model = None
 avatar_model = None  # SadTalker or LivePortrait
@@ -68,13 +169,19 @@ avatar_backend_name = None  # Track which backend is loaded
 
 
 def detect_device() -> str:
-    """Auto-detect best available device"""
-    if torch.backends.mps.is_available():
-        return "mps"  # Apple Silicon (M1/M2/M3)
-    elif torch.cuda.is_available():
-        return "cuda"  # NVIDIA GPU (GCP)
-    else:
-        return "cpu"
+    """Best available device; shares the cached probe with config and the models"""
+    return auto_detect_device()
+
+
+@lru_cache(maxsize=None)
+def device_capabilities() -> dict:
+    """Accelerator availability reported by /health (probed once per process)"""
+    cuda = torch.cuda.is_available()
+    return {
+        "mps": torch.backends.mps.is_available(),
+        "cuda": cuda,
+        "cuda_device": torch.cuda.get_device_name(0) if cuda else None
+    }
 
 
 class TTSRequest(BaseModel):
@@ -83,27 +190,44 @@ class TTSRequest(BaseModel):
     speaker_wav: Optional[str] = None
 
 
-class TTSResponse(BaseModel):
-    success: bool
-    audio_path: Optional[str] = None
-    duration_s: Optional[float] = None
-    generation_time_ms: Optional[float] = None
-    error: Optional[str] = None
-
-
 # Future: Video generation endpoint
 class VideoRequest(BaseModel):
     audio_path: str
     reference_image: str
     mode: Literal["sadtalker", "liveportrait", "auto"] = "auto"
     enhancer: Optional[str] = None  # 'gfpgan' or None
+    # Content hash of reference_image; keys the backend's preprocessing cache
+    reference_image_sha256: Optional[str] = None
+
 
+class PipelineRequest(BaseModel):
+    text: str
+    reference_image: str
+    language: str = "en"
+    speaker_wav: Optional[str] = None
+    enhancer: Optional[str] = None
 
-class VideoResponse(BaseModel):
-    success: bool
-    video_path: Optional[str] = None
-    backend: Optional[str] = None  # Which backend was used
-    error: Optional[str] = None
+
+# Sentence ends: Latin punctuation followed by whitespace, or CJK punctuation
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|(?<=[。！？])')
+
+
+def chunk_text(text: str, max_chars: int = TTS_CHUNK_CHARS) -> List[str]:
+    """Split text at sentence boundaries into chunks of up to ~max_chars"""
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_SPLIT.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
 
 
 def select_avatar_backend(device: str, preference: str = "auto") -> str:
@@ -129,6 +253,81 @@ def select_avatar_backend(device: str, preference: str = "auto") -> str:
         return "sadtalker"
 
 
+# All model calls run on this one thread: GPU jobs are serialized, the event
+# loop stays free for /health, and per-thread CUDA state (compiled CUDA graphs,
+# TRT execution contexts) is reused instead of rebuilt on whichever pool thread
+gpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpu")
+
+
+async def run_on_gpu(fn, *args, **kwargs):
+    """Run a blocking model call on the GPU thread and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(gpu_executor, partial(fn, *args, **kwargs))
+
+
+def _warmup_models():
+    """
+    Run one short TTS synthesis and one avatar generation with outputs discarded.
+    
+    Triggers cuDNN autotuning / Metal kernel compilation and grows the allocator
+    pools at startup. Failures are logged and never block startup.
+    """
+    warm_wav = OUTPUT_DIR / "warmup.wav"
+    warm_mp4 = OUTPUT_DIR / "warmup.mp4"
+    start_time = time.time()
+    
+    try:
+        tts_model.synthesize(text="Hello.", language="en", output_path=str(warm_wav))
+    except Exception as e:
+        logger.warning(f"TTS warmup failed (continuing): {e}")
+    
+    if os.path.exists(WARMUP_IMAGE):
+        try:
+            if hasattr(avatar_model, "warmup"):
+                avatar_model.warmup(WARMUP_IMAGE)
+            elif warm_wav.exists():
+                avatar_model.generate_video(
+                    audio_path=str(warm_wav),
+                    reference_image_path=WARMUP_IMAGE,
+                    output_path=str(warm_mp4)
+                )
+        except Exception as e:
+            logger.warning(f"Avatar warmup failed (continuing): {e}")
+    
+    for path in (warm_wav, warm_mp4):
+        path.unlink(missing_ok=True)
+    logger.info(f"Warmup done in {time.time() - start_time:.2f}s")
+
+
+def _sweep_output_dir(max_age_s: float) -> int:
+    """Delete per-request outputs older than max_age_s (ring slot files are kept)"""
+    cutoff = time.time() - max_age_s
+    removed = 0
+    with os.scandir(OUTPUT_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith("tts_raw_slot") or not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+async def _output_sweeper():
+    """Periodically remove old TTS/avatar outputs so /tmp does not grow unbounded"""
+    while True:
+        await asyncio.sleep(60)
+        try:
+            removed = await asyncio.to_thread(_sweep_output_dir, OUTPUT_TTL_S)
+            if removed:
+                logger.info(f"Removed {removed} expired output files")
+        except Exception as e:
+            logger.warning(f"Output sweep failed: {e}")
+
+
 @app.on_event("startup")
 async def startup():
     """Initialize models with GPU acceleration"""
@@ -137,10 +336,19 @@ async def startup():
     device = detect_device()
     logger.info(f"🚀 GPU Service starting on device: {device}")
     
+    OUTPUT_DIR.mkdir(exist_ok=True, parents=True)
+    app.state.output_sweeper = asyncio.create_task(_output_sweeper())
+    
     if device == "mps":
         logger.info("✅ Apple Silicon (M3) GPU detected - using MPS acceleration")
+        # No CPU fallback: unsupported ops raise instead of silently bouncing to CPU
+        patch_mps_ops()
     elif device == "cuda":
         logger.info(f"✅ NVIDIA GPU detected - using CUDA (GPU: {torch.cuda.get_device_name(0)})")
+        if os.getenv("CUDA_MEMORY_HISTORY", "false").lower() == "true":
+            # Debug only: snapshot with torch.cuda.memory._dump_snapshot()
+            torch.cuda.memory._record_memory_history()
+            logger.info("CUDA memory history recording enabled")
     else:
         logger.warning("⚠️  No GPU detected - falling back to CPU (will be slow)")
     
@@ -189,6 +397,19 @@ async def startup():
         avatar_model.device = device
         avatar_model.initialize()
         logger.info("✅ SadTalker model ready")
+    
+    # One dummy pass per model so the first request runs at steady-state latency
+    await run_on_gpu(_warmup_models)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background tasks"""
+    sweeper = getattr(app.state, "output_sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
+    await avatar_batcher.stop()
+    gpu_executor.shutdown(wait=False, cancel_futures=True)
 
 
 @app.get("/health")
@@ -199,11 +420,7 @@ async def health():
         "status": "healthy" if tts_model and tts_model.is_ready() and avatar_model and avatar_model.is_ready() else "initializing",
         "device": device,
         "avatar_backend": avatar_backend_name,
-        "capabilities": {
-            "mps": torch.backends.mps.is_available(),
-            "cuda": torch.cuda.is_available(),
-            "cuda_device": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None
-        },
+        "capabilities": device_capabilities(),
         "models": {
             "tts": tts_model.is_ready() if tts_model else False,
             "avatar": avatar_model.is_ready() if avatar_model else False,
@@ -213,85 +430,314 @@ async def health():
     }
 
 
-@app.post("/tts/generate", response_model=TTSResponse)
+def _concat_wavs(part_paths: List[str], output_path: str) -> float:
+    """Concatenate chunk WAVs into output_path, delete the parts, return duration (s)"""
+    import numpy as np
+    import soundfile as sf
+    
+    parts = []
+    sample_rate = None
+    for path in part_paths:
+        audio, sample_rate = sf.read(path, dtype='float32')
+        parts.append(audio)
+    audio = np.concatenate(parts)
+    sf.write(output_path, audio, sample_rate)
+    for path in part_paths:
+        os.unlink(path)
+    return len(audio) / sample_rate
+
+
+async def _synthesize_text(request: TTSRequest, audio_path: str) -> tuple:
+    """
+    Synthesize request.text into audio_path, chunking long text.
+    
+    XTTS memory grows with input length, so text longer than TTS_CHUNK_CHARS
+    is synthesized sentence-chunk by chunk and the audio concatenated.
+    
+    Returns:
+        Tuple of (output_path, audio_duration_s)
+    """
+    chunks = chunk_text(request.text)
+    if len(chunks) <= 1:
+        output_path, _, audio_duration = await run_on_gpu(
+            tts_model.synthesize,
+            text=request.text,
+            language=request.language,
+            speaker_wav=request.speaker_wav,
+            output_path=audio_path
+        )
+        return output_path, audio_duration
+    
+    part_paths = []
+    for i, chunk in enumerate(chunks):
+        part_path, _, _ = await run_on_gpu(
+            tts_model.synthesize,
+            text=chunk,
+            language=request.language,
+            speaker_wav=request.speaker_wav,
+            output_path=f"{audio_path[:-4]}_part{i}.wav"
+        )
+        part_paths.append(part_path)
+    audio_duration = await asyncio.to_thread(_concat_wavs, part_paths, audio_path)
+    logger.info(f"TTS: {len(chunks)} chunks, {audio_duration:.2f}s audio")
+    return audio_path, audio_duration
+
+
+@app.post("/tts/generate", response_class=FileResponse)
 async def generate_tts(request: TTSRequest):
-    """Generate audio from text using TTS"""
+    """
+    Generate audio from text using TTS.
+    
+    The WAV is streamed back in the response body (duration and generation
+    time in X-Audio-Duration / X-Generation-Time-Ms headers), so the caller
+    does not need the output volume; the file is deleted once sent.
+    """
     if not tts_model or not tts_model.is_ready():
         raise HTTPException(status_code=503, detail="TTS model not ready")
     
-    import time
     start_time = time.time()
     
     try:
         logger.info(f"TTS request: '{request.text[:50]}...' (language: {request.language})")
         
-        # Generate output path in shared directory
-        output_dir = Path("/tmp/gpu-service-output")
-        output_dir.mkdir(exist_ok=True, parents=True)
-        
+        # Generate output path (unique: each response deletes its own file)
         timestamp = int(time.time() * 1000)
-        audio_path = output_dir / f"tts_{timestamp}.wav"
+        audio_path = OUTPUT_DIR / f"tts_{timestamp}_{uuid.uuid4().hex[:6]}.wav"
         
         # Generate audio using TTS model
-        output_path, _, audio_duration = tts_model.synthesize(
-            text=request.text,
-            language=request.language,
-            speaker_wav=request.speaker_wav,
-            output_path=str(audio_path)
-        )
-        
-        generation_time = (time.time() - start_time) * 1000  # ms
-        
-        logger.info(f"✅ TTS complete: {audio_duration:.2f}s audio in {generation_time:.0f}ms")
-        
-        return TTSResponse(
-            success=True,
-            audio_path=str(output_path),
-            duration_s=audio_duration,
-            generation_time_ms=generation_time
-        )
+        output_path, audio_duration = await _synthesize_text(request, str(audio_path))
         
     except Exception as e:
         logger.error(f"TTS generation failed: {e}", exc_info=True)
-        return TTSResponse(success=False, error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    generation_time = (time.time() - start_time) * 1000  # ms
+    logger.info(f"✅ TTS complete: {audio_duration:.2f}s audio in {generation_time:.0f}ms")
+    
+    return FileResponse(
+        output_path,
+        media_type="audio/wav",
+        headers={
+            "X-Audio-Duration": f"{audio_duration:.3f}",
+            "X-Generation-Time-Ms": f"{generation_time:.0f}"
+        },
+        background=BackgroundTask(os.unlink, output_path)
+    )
+
+
+_raw_tts_counter = 0
+
+
+@app.post("/tts/generate_raw")
+async def generate_tts_raw(request: TTSRequest):
+    """Generate audio from text and return the WAV bytes in the response body"""
+    global _raw_tts_counter
+    if not tts_model or not tts_model.is_ready():
+        raise HTTPException(status_code=503, detail="TTS model not ready")
+    
+    start_time = time.time()
+    
+    # Rotate through a fixed set of files instead of creating one per request
+    slot = _raw_tts_counter % RAW_TTS_SLOTS
+    _raw_tts_counter += 1
+    audio_path = OUTPUT_DIR / f"tts_raw_slot{slot}.wav"
+    
+    try:
+        output_path, audio_duration = await _synthesize_text(request, str(audio_path))
+        wav_bytes = await asyncio.to_thread(Path(output_path).read_bytes)
+    except Exception as e:
+        logger.error(f"TTS generation failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    generation_time = (time.time() - start_time) * 1000  # ms
+    logger.info(f"✅ TTS raw complete: {audio_duration:.2f}s audio in {generation_time:.0f}ms")
+    
+    return Response(
+        content=wav_bytes,
+        media_type="audio/wav",
+        headers={
+            "X-Audio-Duration": f"{audio_duration:.3f}",
+            "X-Generation-Time-Ms": f"{generation_time:.0f}"
+        }
+    )
 
 
-@app.post("/avatar/generate", response_model=VideoResponse)
+async def _generate_avatar_batch(items: List[tuple]) -> list:
+    """
+    Avatar batch handler: items are (VideoRequest, output_path) pairs.
+    
+    None of the backends expose a batched forward pass, so requests run one
+    after another on the GPU; identical (audio, image, enhancer) requests are
+    generated once and the video is copied to each caller's own output path
+    (each response deletes its file after sending).
+    """
+    done = {}
+    results = []
+    for request, output_path in items:
+        key = (request.audio_path, request.reference_image_sha256 or request.reference_image, request.enhancer)
+        if key not in done:
+            # Only Ditto takes the hash (its generate_video accepts extra kwargs)
+            extra = {}
+            if request.reference_image_sha256 and avatar_backend_name == "ditto":
+                extra["reference_image_sha256"] = request.reference_image_sha256
+            try:
+                done[key] = await run_on_gpu(
+                    avatar_model.generate_video,
+                    audio_path=request.audio_path,
+                    reference_image_path=request.reference_image,
+                    output_path=output_path,
+                    enhancer=request.enhancer,
+                    **extra
+                )
+                results.append(done[key])
+            except Exception as e:
+                done[key] = e
+                results.append(e)
+        elif isinstance(done[key], Exception):
+            results.append(done[key])
+        else:
+            video_path, generation_time = done[key]
+            try:
+                await asyncio.to_thread(shutil.copyfile, video_path, output_path)
+                results.append((output_path, generation_time))
+            except Exception as e:
+                results.append(e)
+    if len(items) > 1:
+        logger.info(f"Avatar batch: {len(items)} requests, {len(done)} generated")
+    return results
+
+
+avatar_batcher = MicroBatcher(_generate_avatar_batch, max_batch=4, window_s=0.015, name="avatar-batcher")
+
+
+@app.post("/avatar/generate", response_class=FileResponse)
 async def generate_avatar(request: VideoRequest):
-    """Generate talking head video from audio + reference image"""
+    """
+    Generate talking head video from audio + reference image.
+    
+    The mp4 is streamed back in the response body (backend and generation time
+    in X-Backend / X-Gen-Time-Ms headers), so the caller does not need the
+    output volume; the file is deleted once sent.
+    """
     if not avatar_model or not avatar_model.is_ready():
         raise HTTPException(status_code=503, detail="Avatar model not ready")
     
     try:
         logger.info(f"Avatar request: audio={request.audio_path}, image={request.reference_image}, backend={avatar_backend_name}")
         
-        # Generate output path
-        output_dir = Path("/tmp/gpu-service-output")
-        output_dir.mkdir(exist_ok=True, parents=True)
-        
-        import time
+        # Generate output path (unique: concurrent requests share a batch window)
         timestamp = int(time.time() * 1000)
-        output_path = output_dir / f"avatar_{avatar_backend_name}_{timestamp}.mp4"
-        
-        # Generate video using selected backend (SadTalker or LivePortrait)
-        video_path, generation_time = avatar_model.generate_video(
-            audio_path=request.audio_path,
-            reference_image_path=request.reference_image,
-            output_path=str(output_path),
-            enhancer=request.enhancer
-        )
+        output_path = OUTPUT_DIR / f"avatar_{avatar_backend_name}_{timestamp}_{uuid.uuid4().hex[:6]}.mp4"
         
-        logger.info(f"✅ Avatar video generated in {generation_time:.0f}ms using {avatar_backend_name}")
-        
-        return VideoResponse(
-            success=True,
-            video_path=video_path,
-            backend=avatar_backend_name
-        )
+        # Generate video using selected backend (coalesced with concurrent requests)
+        video_path, generation_time = await avatar_batcher.submit((request, str(output_path)))
         
     except Exception as e:
         logger.error(f"Avatar generation failed: {e}", exc_info=True)
-        return VideoResponse(success=False, error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    logger.info(f"✅ Avatar video generated in {generation_time:.0f}ms using {avatar_backend_name}")
+    
+    return FileResponse(
+        video_path,
+        media_type="video/mp4",
+        headers={
+            "X-Backend": avatar_backend_name,
+            "X-Gen-Time-Ms": f"{generation_time:.0f}"
+        },
+        background=BackgroundTask(os.unlink, video_path)
+    )
+
+
+_SEGMENT_BOUNDARY = "avatar-segment"
+
+
+@app.post("/pipeline/generate")
+async def generate_pipeline(request: PipelineRequest):
+    """
+    Text -> TTS -> avatar, streamed as one mp4 segment per text chunk.
+    
+    The body is multipart/mixed (boundary "avatar-segment"); each part is a
+    complete mp4 with X-Segment-Index and X-Segment-Count headers. Synthesis of
+    chunk N+1 is queued on the GPU thread right behind the render of chunk N,
+    so it runs while segment N is being sent and the first segment arrives
+    after one chunk's TTS + render instead of the whole text's.
+    """
+    if not tts_model or not tts_model.is_ready() or not avatar_model or not avatar_model.is_ready():
+        raise HTTPException(status_code=503, detail="Models not ready")
+    
+    chunks = chunk_text(request.text)
+    if not chunks:
+        raise HTTPException(status_code=400, detail="Empty text")
+    
+    prefix = OUTPUT_DIR / f"pipeline_{int(time.time() * 1000)}_{uuid.uuid4().hex[:6]}"
+    logger.info(f"Pipeline request: {len(chunks)} chunks, backend={avatar_backend_name}")
+    
+    # Ditto takes the TTS audio in memory; other backends read it from a file
+    in_memory = avatar_backend_name == "ditto"
+    
+    def synthesize(i: int):
+        if in_memory:
+            return asyncio.ensure_future(run_on_gpu(
+                tts_model.synthesize_bytes,
+                text=chunks[i],
+                language=request.language,
+                speaker_wav=request.speaker_wav
+            ))
+        return asyncio.ensure_future(run_on_gpu(
+            tts_model.synthesize,
+            text=chunks[i],
+            language=request.language,
+            speaker_wav=request.speaker_wav,
+            output_path=f"{prefix}_{i}.wav"
+        ))
+    
+    async def segments():
+        next_tts = synthesize(0)
+        try:
+            for i in range(len(chunks)):
+                if in_memory:
+                    audio_bytes, _ = await next_tts
+                    audio_kwargs = {"audio_path": None, "audio_bytes": audio_bytes}
+                else:
+                    audio_path, _, _ = await next_tts
+                    audio_kwargs = {"audio_path": audio_path}
+                render = asyncio.ensure_future(run_on_gpu(
+                    avatar_model.generate_video,
+                    reference_image_path=request.reference_image,
+                    output_path=f"{prefix}_{i}.mp4",
+                    enhancer=request.enhancer,
+                    **audio_kwargs
+                ))
+                if i + 1 < len(chunks):
+                    next_tts = synthesize(i + 1)
+                video_path, _ = await render
+                
+                data = await asyncio.to_thread(Path(video_path).read_bytes)
+                for path in OUTPUT_DIR.glob(f"{prefix.name}_{i}.*"):
+                    path.unlink(missing_ok=True)
+                
+                yield (
+                    f"--{_SEGMENT_BOUNDARY}\r\n"
+                    f"Content-Type: video/mp4\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"X-Segment-Index: {i}\r\n"
+                    f"X-Segment-Count: {len(chunks)}\r\n\r\n"
+                ).encode() + data + b"\r\n"
+            yield f"--{_SEGMENT_BOUNDARY}--\r\n".encode()
+        except Exception as e:
+            logger.error(f"Pipeline generation failed: {e}", exc_info=True)
+            raise
+        finally:
+            # Leftovers from an aborted stream are also removed by the output sweeper
+            for path in OUTPUT_DIR.glob(f"{prefix.name}_*"):
+                path.unlink(missing_ok=True)
+    
+    return StreamingResponse(
+        segments(),
+        media_type=f"multipart/mixed; boundary={_SEGMENT_BOUNDARY}",
+        headers={"X-Backend": avatar_backend_name}
+    )
 
 
 @app.get("/")
@@ -305,7 +751,9 @@ async def root():
         "endpoints": {
             "health": "/health",
             "tts": "/tts/generate",
-            "avatar": "/avatar/generate"
+            "tts_raw": "/tts/generate_raw",
+            "avatar": "/avatar/generate",
+            "pipeline": "/pipeline/generate"
         }
     }
 
@@ -316,9 +764,21 @@ if __name__ == "__main__":
     
     logger.info(f"Starting GPU service on {host}:{port}")
     
+    # uvloop/httptools come with uvicorn[standard]; fall back to asyncio/h11 if absent
+    try:
+        import uvloop  # noqa: F401
+        import httptools  # noqa: F401
+        loop, http = "uvloop", "httptools"
+    except ImportError:
+        loop, http = "asyncio", "h11"
+    
     uvicorn.run(
         app,
         host=host,
         port=port,
+        loop=loop,
+        http=http,
+        workers=1,  # Models live in this process
+        limit_concurrency=int(os.getenv("LIMIT_CONCURRENCY", 64)),
         log_level="info"
     )
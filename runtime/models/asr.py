@@ -10,7 +10,6 @@ import os
 import time
 from pathlib import Path
 from typing import Optional, List, Tuple, Iterator
-import tempfile
 
 import numpy as np
 
@@ -41,14 +40,16 @@ class ASRModel:
         self.compute_type = compute_type
         self._initialized = False
         self.model = None
-        self.vad_model = None
+        # faster-whisper's built-in Silero VAD (see transcribe_stream)
+        self.use_vad = True
+        self.vad_threshold = 0.5
         
     def initialize(self, 
                    model_size: str = "base",
                    use_vad: bool = True,
                    vad_threshold: float = 0.5):
         """
-        Initialize Faster-Whisper model and optional VAD.
+        Initialize Faster-Whisper model.
         
         Args:
             model_size: Model size ("tiny", "base", "small", "medium", "large-v2", "large-v3")
@@ -57,8 +58,8 @@ class ASRModel:
                        - small: better quality (~2GB)
                        - medium: high quality (~5GB)
                        - large-v3: best quality (~3GB, newest)
-            use_vad: Enable Voice Activity Detection for filtering
-            vad_threshold: VAD sensitivity (0-1, lower = more sensitive)
+            use_vad: Drop non-speech with faster-whisper's VAD filter before decoding
+            vad_threshold: VAD speech probability threshold (0-1, lower = more sensitive)
         """
         if self._initialized:
             return
@@ -77,9 +78,8 @@ class ASRModel:
                 download_root="./checkpoints/faster-whisper"
             )
             
-            # Initialize VAD if requested
-            if use_vad:
-                self._initialize_vad(vad_threshold)
+            self.use_vad = use_vad
+            self.vad_threshold = vad_threshold
             
             self._initialized = True
             elapsed = time.time() - start_time
@@ -89,151 +89,15 @@ class ASRModel:
             logger.error(f"Failed to initialize Faster-Whisper: {e}")
             raise
     
-    def _initialize_vad(self, threshold: float = 0.5):
-        """Initialize Silero VAD for voice activity detection"""
-        try:
-            import torch
-            
-            logger.info("Loading Silero VAD model...")
-            self.vad_model, utils = torch.hub.load(
-                repo_or_dir='snakers4/silero-vad',
-                model='silero_vad',
-                force_reload=False,
-                onnx=False
-            )
-            
-            (self.get_speech_timestamps,
-             self.save_audio,
-             self.read_audio,
-             self.VADIterator,
-             self.collect_chunks) = utils
-            
-            self.vad_threshold = threshold
-            logger.info("VAD initialized")
-            
-        except Exception as e:
-            logger.warning(f"VAD initialization failed: {e}. Continuing without VAD.")
-            self.vad_model = None
-    
     def is_ready(self) -> bool:
         """Check if model is initialized"""
         return self._initialized and self.model is not None
     
-    def transcribe(
-        self,
-        audio_path: str,
-        language: Optional[str] = None,
-        task: str = "transcribe",
-        beam_size: int = 5,
-        best_of: int = 5,
-        temperature: float = 0.0,
-        vad_filter: bool = True
-    ) -> Tuple[str, dict]:
-        """
-        Transcribe audio file to text.
-        
-        Args:
-            audio_path: Path to audio file (any format supported by ffmpeg)
-            language: Source language code (None = auto-detect)
-            task: "transcribe" or "translate" (to English)
-            beam_size: Beam search size (1-10, higher = more accurate but slower)
-            best_of: Number of candidates (1-10)
-            temperature: Sampling temperature (0.0 = greedy, >0 = sampling)
-            vad_filter: Apply VAD filtering if available
-            
-        Returns:
-            Tuple of (transcription text, metadata dict)
-        """
-        if not self._initialized:
-            raise RuntimeError("Model not initialized. Call initialize() first.")
-        
-        start_time = time.time()
-        
-        try:
-            # Apply VAD if enabled
-            if vad_filter and self.vad_model is not None:
-                audio_path = self._apply_vad(audio_path)
-            
-            # Transcribe
-            segments, info = self.model.transcribe(
-                audio_path,
-                language=language,
-                task=task,
-                beam_size=beam_size,
-                best_of=best_of,
-                temperature=temperature,
-                vad_filter=vad_filter and self.vad_model is not None
-            )
-            
-            # Collect segments
-            full_text = []
-            segment_list = []
-            
-            for segment in segments:
-                full_text.append(segment.text)
-                segment_list.append({
-                    "start": segment.start,
-                    "end": segment.end,
-                    "text": segment.text,
-                    "confidence": getattr(segment, 'avg_logprob', None)
-                })
-            
-            transcription = " ".join(full_text).strip()
-            
-            elapsed = time.time() - start_time
-            logger.info(
-                f"Transcribed in {elapsed:.2f}s | "
-                f"Language: {info.language} | "
-                f"Text: '{transcription[:50]}...'"
-            )
-            
-            metadata = {
-                "language": info.language,
-                "language_probability": info.language_probability,
-                "duration": info.duration,
-                "transcription_time": elapsed,
-                "segments": segment_list
-            }
-            
-            return transcription, metadata
-            
-        except Exception as e:
-            logger.error(f"Transcription failed: {e}")
-            raise
-    
-    def _apply_vad(self, audio_path: str) -> str:
-        """Apply VAD filtering to remove silence"""
-        try:
-            import torch
-            
-            # Read audio
-            wav = self.read_audio(audio_path, sampling_rate=16000)
-            
-            # Get speech timestamps
-            speech_timestamps = self.get_speech_timestamps(
-                wav,
-                self.vad_model,
-                threshold=self.vad_threshold,
-                sampling_rate=16000
-            )
-            
-            if not speech_timestamps:
-                logger.warning("No speech detected by VAD")
-                return audio_path
-            
-            # Collect speech chunks
-            speech_audio = self.collect_chunks(speech_timestamps, wav)
-            
-            # Save filtered audio
-            output_path = tempfile.mktemp(suffix=".wav")
-            self.save_audio(output_path, speech_audio, sampling_rate=16000)
-            
-            logger.debug(f"VAD filtered: {len(speech_timestamps)} speech segments")
-            return output_path
-            
-        except Exception as e:
-            logger.warning(f"VAD filtering failed: {e}. Using original audio.")
-            return audio_path
+    def warmup(self):
+        """Decode one second of silence so the first request skips CTranslate2's lazy setup"""
+        segments, _ = self.model.transcribe(np.zeros(16000, dtype=np.float32), language="en", beam_size=1)
+        for _ in segments:
+            pass
     
     def detect_language(self, audio_path: str) -> Tuple[str, float]:
         """
@@ -259,33 +123,6 @@ class ASRModel:
         except Exception as e:
             logger.error(f"Language detection failed: {e}")
             raise
-
-        """Load faster-whisper model"""
-        if self._initialized:
-            return
-            
-        logger.info(f"Loading faster-whisper ({self.model_size})...")
-        
-        try:
-            from faster_whisper import WhisperModel
-            
-            # Load model (will download on first run)
-            self.model = WhisperModel(
-                self.model_size,
-                device="cpu",  # TODO: Use GPU in production
-                compute_type="int8"  # Quantized for speed
-            )
-            
-            self._initialized = True
-            logger.info(f"ASR model loaded: {self.model_size}")
-            
-        except Exception as e:
-            logger.error(f"Failed to load ASR model: {e}")
-            raise
-    
-    def is_ready(self) -> bool:
-        """Check if model is initialized"""
-        return self._initialized and self.model is not None
     
     def transcribe(
         self,
@@ -306,14 +143,12 @@ class ASRModel:
             self.initialize()
         
         try:
-            segments, info = self.model.transcribe(
-                audio_path,
-                language=language,
-                beam_size=5
-            )
+            partials, info = self.transcribe_stream(audio_path, language=language)
             
-            # Combine all segments
-            text = " ".join([segment.text for segment in segments])
+            # The last item is the full transcript
+            text = ""
+            for text, _ in partials:
+                pass
             
             return text, info.language, info.language_probability
             
@@ -321,6 +156,50 @@ class ASRModel:
             logger.error(f"Transcription failed: {e}")
             raise
     
+    def transcribe_stream(
+        self,
+        audio_path: str,
+        language: Optional[str] = None,
+        beam_size: int = 5
+    ) -> Tuple[Iterator[Tuple[str, bool]], object]:
+        """
+        Transcribe audio, producing the transcript segment by segment.
+        
+        faster-whisper decodes lazily, so each segment's text is available as
+        soon as it is decoded. Its built-in Silero VAD drops silence (pauses of
+        200ms or more) before decoding, so no decoding is spent on silence.
+        
+        Args:
+            audio_path: Path to audio file
+            language: Language hint (en, zh, es, etc.)
+            beam_size: Beam search size
+            
+        Returns:
+            Tuple of (partials, info) like WhisperModel.transcribe: partials
+            yields (text so far, is_final), ending with the full transcript and
+            is_final=True; info has the detected language
+        """
+        if not self.is_ready():
+            self.initialize()
+        
+        segments, info = self.model.transcribe(
+            audio_path,
+            language=language,
+            beam_size=beam_size,
+            vad_filter=self.use_vad,
+            vad_parameters=dict(threshold=self.vad_threshold, min_silence_duration_ms=200),
+            condition_on_previous_text=True
+        )
+        
+        def partials() -> Iterator[Tuple[str, bool]]:
+            texts = []
+            for segment in segments:
+                texts.append(segment.text.strip())
+                yield " ".join(texts), False
+            yield " ".join(texts), True
+        
+        return partials(), info
+    
     def cleanup(self):
         """Cleanup model resources"""
         if self.model:
@@ -20,7 +20,7 @@ class LivePortraitModel:
     """
     
     def __init__(self):
-        self.device = settings.device
+        self.device = settings.resolved_device
         self._initialized = False
         self.client = None
         
@@ -69,7 +69,10 @@ class LivePortraitModel:
             Tuple of (output_path, duration_ms)
         """
         if not self.is_ready():
-            self.initialize()
+            # Async probe: never block the event loop on a sync health check
+            self.client = self.client or get_avatar_client()
+            await self.client.ensure_ready()
+            self._initialized = True
         
         start_time = time.time()
         
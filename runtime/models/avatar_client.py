@@ -2,12 +2,18 @@
 Avatar Client for GPU Service
 Calls external GPU acceleration service for LivePortrait video generation
 """
+import asyncio
 import logging
 import os
+import shutil
+import threading
 import time
+import aiofiles
 import httpx
+from collections import OrderedDict
 from typing import Optional
 from config import settings
+from utils.files import file_sha256
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +24,31 @@ class AvatarClient:
     def __init__(self, service_url: Optional[str] = None):
         self.service_url = service_url or settings.gpu_service_url
         self._initialized = False
-        self._client = httpx.AsyncClient(timeout=600.0)
+        self._closing = False
+        self._init_lock: Optional[asyncio.Lock] = None
+        # (sha256(image), sha256(audio), enhancer) -> the client's own copy (in
+        # avatar_cache_dir) of a recent video; callers move or delete theirs
+        self._recent: OrderedDict = OrderedDict()
+        self._recent_max = 32
+        # One pooled client per process: connections stay warm between requests,
+        # connect failures surface fast and transient reconnects are retried.
+        # Limits go on the transport: AsyncClient ignores limits= when given one
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(600.0, connect=5.0),
+            transport=httpx.AsyncHTTPTransport(
+                retries=2,
+                limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=300)
+            )
+        )
         
+    def _check_health(self, health_data: dict) -> str:
+        """Validate a /health payload; returns the service device"""
+        if not health_data.get("models", {}).get("avatar", False):
+            raise RuntimeError("Avatar model not ready on GPU service")
+        return health_data.get("device", "unknown")
+    
     def initialize(self):
-        """Check if GPU service is available"""
+        """Check if GPU service is available (blocking; for startup code)"""
         if self._initialized:
             return
             
@@ -33,13 +60,7 @@ class AvatarClient:
             with httpx.Client(timeout=5.0) as sync_client:
                 response = sync_client.get(f"{self.service_url}/health")
                 response.raise_for_status()
-            
-                health_data = response.json()
-                device = health_data.get("device", "unknown")
-                avatar_ready = health_data.get("models", {}).get("avatar", False)
-            
-                if not avatar_ready:
-                    raise RuntimeError("Avatar model not ready on GPU service")
+                device = self._check_health(response.json())
             
             self._initialized = True
             elapsed = time.time() - start_time
@@ -49,9 +70,35 @@ class AvatarClient:
             logger.error(f"Failed to connect to GPU service: {e}")
             raise RuntimeError(f"GPU service unavailable at {self.service_url}") from e
     
+    async def ensure_ready(self):
+        """
+        Async health probe on the pooled client, run at most once.
+        
+        Concurrent first requests wait on one lock, so only one of them probes
+        /health and none of them blocks the event loop.
+        """
+        if self._initialized:
+            return
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        
+        async with self._init_lock:
+            if self._initialized:
+                return
+            try:
+                response = await self._client.get(f"{self.service_url}/health", timeout=5.0)
+                response.raise_for_status()
+                device = self._check_health(response.json())
+            except httpx.HTTPError as e:
+                logger.error(f"Failed to connect to GPU service: {e}")
+                raise RuntimeError(f"GPU service unavailable at {self.service_url}") from e
+            
+            self._initialized = True
+            logger.info(f"Connected to GPU service (device={device}) for avatar generation")
+    
     def is_ready(self) -> bool:
-        """Check if service is initialized"""
-        return self._initialized
+        """Check if service is initialized and not shutting down"""
+        return self._initialized and not self._closing
     
     async def generate_video(
         self,
@@ -72,16 +119,21 @@ class AvatarClient:
         Returns:
             Tuple of (video_path, generation_time_ms)
         """
-        if not self.is_ready():
-            self.initialize()
+        await self.ensure_ready()
         
         start_time = time.time()
         
         try:
-            # Both GPU service and runtime use Docker paths
-            # No mapping needed - both containers share /app/assets mount
+            # Inputs are still read by path: both containers share the /app/assets mount
             logger.info(f"Requesting avatar video: audio={audio_path}, image={reference_image_path}")
             
+            # Identical image + audio generated recently: reuse that video
+            ref_sha, audio_sha = await asyncio.gather(
+                asyncio.to_thread(file_sha256, reference_image_path),
+                asyncio.to_thread(file_sha256, audio_path)
+            )
+            recent_key = (ref_sha, audio_sha, enhancer)
+            
             # Generate output path if not provided
             if not output_path:
                 os.makedirs(settings.output_dir, exist_ok=True)
@@ -90,32 +142,52 @@ class AvatarClient:
                     f"avatar_output_{int(time.time() * 1000)}.mp4"
                 )
             
+            recent_path = self._recent.get(recent_key)
+            if recent_path:
+                try:
+                    await asyncio.to_thread(shutil.copyfile, recent_path, output_path)
+                    if recent_key in self._recent:
+                        self._recent.move_to_end(recent_key)
+                    total_time_ms = (time.time() - start_time) * 1000
+                    logger.info(f"Reusing recent avatar video: {output_path}")
+                    return output_path, total_time_ms
+                except FileNotFoundError:
+                    self._recent.pop(recent_key, None)
+            
             # Call GPU service (ASYNC - doesn't block event loop!)
             payload = {
                 "audio_path": audio_path,
                 "reference_image": reference_image_path,
                 "mode": "sadtalker",
-                "enhancer": enhancer
+                "enhancer": enhancer,
+                "reference_image_sha256": ref_sha
             }
             
-            response = await self._client.post(
+            # Video bytes come back in the response body and are written
+            # straight to output_path as they arrive
+            async with self._client.stream(
+                "POST",
                 f"{self.service_url}/avatar/generate",
                 json=payload,
-            )
-            response.raise_for_status()
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    try:
+                        error = response.json().get("detail")
+                    except ValueError:
+                        error = response.text
+                    raise RuntimeError(f"Avatar generation failed: {error}")
+                
+                async with aiofiles.open(output_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(1 << 20):
+                        await f.write(chunk)
+                
+                backend = response.headers.get("X-Backend", "unknown")
+                gen_time_ms = response.headers.get("X-Gen-Time-Ms", "?")
             
-            result = response.json()
+            logger.info(f"Received video from GPU service ({backend}, {gen_time_ms}ms): {output_path}")
             
-            if not result.get("success"):
-                raise RuntimeError(f"Avatar generation failed: {result.get('error')}")
-            
-            # Get the video file from GPU service
-            remote_video_path = result.get("video_path")
-            
-            # Both containers share /tmp/gpu-service-output volume (read-only for runtime)
-            # Use the GPU service output path directly instead of copying
-            output_path = remote_video_path
-            logger.info(f"Using video path from GPU service: {output_path}")
+            await self._remember(recent_key, output_path)
             
             total_time_ms = (time.time() - start_time) * 1000
             
@@ -130,8 +202,36 @@ class AvatarClient:
             logger.error(f"Avatar generation failed: {e}", exc_info=True)
             raise
     
+    async def _remember(self, key: tuple, video_path: str):
+        """Keep a copy of a generated video for repeated requests, evicting the oldest"""
+        ref_sha, audio_sha, enhancer = key
+        cached_path = os.path.join(
+            settings.avatar_cache_dir,
+            f"{ref_sha[:16]}_{audio_sha[:16]}_{enhancer or 'none'}.mp4"
+        )
+        
+        def store():
+            os.makedirs(settings.avatar_cache_dir, exist_ok=True)
+            # Write under a temp name so a concurrent lookup never sees a partial file
+            tmp_path = f"{cached_path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(video_path, tmp_path)
+            os.replace(tmp_path, cached_path)
+        
+        try:
+            await asyncio.to_thread(store)
+        except OSError as e:
+            logger.warning(f"Could not cache avatar video: {e}")
+            return
+        self._recent[key] = cached_path
+        self._recent.move_to_end(key)
+        while len(self._recent) > self._recent_max:
+            evicted = self._recent.popitem(last=False)[1]
+            if os.path.exists(evicted):
+                os.unlink(evicted)
+    
     async def cleanup(self):
         """Cleanup async client"""
+        self._closing = True
         await self._client.aclose()
         self._initialized = False
         logger.info("Avatar client disconnected")
@@ -147,3 +247,11 @@ def get_avatar_client() -> AvatarClient:
     if _avatar_client is None:
         _avatar_client = AvatarClient()
     return _avatar_client
+
+
+async def close_avatar_client():
+    """Close the global client's connection pool, if it was created"""
+    global _avatar_client
+    if _avatar_client is not None:
+        await _avatar_client.cleanup()
+        _avatar_client = None
@@ -3,30 +3,118 @@ Ditto TalkingHead model wrapper
 Audio-driven talking head synthesis built on LivePortrait
 https://github.com/antgroup/ditto-talkinghead
 """
+import io
 import logging
 import os
+import subprocess
 import time
 from pathlib import Path
 from typing import Optional, Tuple
 import tempfile
+from collections import OrderedDict
+from contextlib import ExitStack
+from functools import lru_cache
 
+import numpy as np
+import soundfile as sf
 import torch
 
+from utils.audio import load_audio_16k, num_video_frames, to_pinned_host, to_mono_16k
+
+try:
+    import av
+except ImportError:  # Fall back to the intermediate file + ffmpeg mux
+    av = None
+
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=8)
+def _load_audio_cached(audio_path: str, mtime_ns: int) -> np.ndarray:
+    """16 kHz mono float32 audio, keyed by (path, mtime) so rewritten files are reloaded"""
+    audio, _ = load_audio_16k(audio_path)
+    audio.setflags(write=False)  # Shared between calls
+    return audio
+
+
+class _AVMuxWriter:
+    """
+    Drop-in for StreamSDK's frame writer that encodes the final mp4 directly.
+    
+    Produces the same output as the ffmpeg re-encode (H.264 baseline 3.0,
+    CRF 28, 18 fps, faststart, 24 kHz mono AAC at 64k) in one pass, without
+    the intermediate video-only file or an ffmpeg process. The SDK calls the
+    writer per frame and close() when rendering ends; finish() then adds the
+    audio track and finalizes the container.
+    """
+    
+    def __init__(self, output_path: str, src_fps: int = 25, out_fps: int = 18):
+        self.container = av.open(output_path, mode="w", options={"movflags": "+faststart"})
+        self.video = self.container.add_stream("libx264", rate=out_fps)
+        self.video.pix_fmt = "yuv420p"
+        self.video.options = {"preset": "veryfast", "crf": "28", "profile": "baseline", "level": "3.0"}
+        self.audio = self.container.add_stream("aac", rate=24000)
+        self.audio.codec_context.layout = "mono"
+        self.audio.codec_context.bit_rate = 64000
+        self.src_fps = src_fps
+        self.out_fps = out_fps
+        self._frames_in = 0
+        self._frames_out = 0
+    
+    def __call__(self, img: np.ndarray, fmt: str = "rgb"):
+        # 25 -> 18 fps: keep a frame only when it starts a new output frame slot
+        slot = self._frames_in * self.out_fps // self.src_fps
+        self._frames_in += 1
+        if slot < self._frames_out:
+            return
+        
+        if self._frames_out == 0:
+            # yuv420p needs even dimensions
+            self.video.height = img.shape[0] - img.shape[0] % 2
+            self.video.width = img.shape[1] - img.shape[1] % 2
+        img = np.ascontiguousarray(img[:self.video.height, :self.video.width])
+        frame = av.VideoFrame.from_ndarray(img, format="rgb24" if fmt == "rgb" else "bgr24")
+        frame.pts = self._frames_out
+        self._frames_out += 1
+        for packet in self.video.encode(frame):
+            self.container.mux(packet)
+    
+    def close(self):
+        """Flush the video encoder (called by StreamSDK.close)"""
+        for packet in self.video.encode():
+            self.container.mux(packet)
+    
+    def finish(self, audio: np.ndarray, sample_rate: int = 16000):
+        """Encode the audio track and finalize the file"""
+        audio_24k = to_mono_16k(audio, sample_rate, target_sr=24000)
+        frame = av.AudioFrame.from_ndarray(audio_24k.reshape(1, -1), format="flt", layout="mono")
+        frame.sample_rate = 24000
+        for packet in self.audio.encode(frame):
+            self.container.mux(packet)
+        for packet in self.audio.encode():
+            self.container.mux(packet)
+        self.container.close()
+
+
 class DittoModel:
     """
     Ditto model wrapper for audio-driven talking head synthesis.
     Uses StreamSDK from ditto-talkinghead for video generation.
     """
     
+    # Return cached CUDA blocks to the driver every N generations; doing it per
+    # request would synchronize with the stream each time
+    EMPTY_CACHE_EVERY = 8
+    
     def __init__(self, device: str = "cuda"):
         self.device = device
         self._initialized = False
         self.sdk = None
         self.data_root = None
         self.cfg_pkl = None
+        self._generation_count = 0
+        # sha256 of the reference image for the current setup(), if the caller sent one
+        self._source_digest: Optional[str] = None
         
     def initialize(self, data_root: Optional[str] = None, cfg_pkl: Optional[str] = None, use_tensorrt: bool = True):
         """
@@ -56,7 +144,8 @@ class DittoModel:
             
             # Auto-detect TensorRT or PyTorch checkpoints
             if data_root is None:
-                trt_path = "/app/ditto-checkpoints/ditto_trt_Ampere_Plus"
+                from config import resolve_trt_engine_dir
+                trt_path = resolve_trt_engine_dir("/app/ditto-checkpoints/ditto_trt_Ampere_Plus")
                 trt_exists = os.path.exists(trt_path)
                 logger.info(f"TensorRT checkpoint check: use_tensorrt={use_tensorrt}, path_exists={trt_exists}")
                 print(f"[DITTO DEBUG] TensorRT check: use_tensorrt={use_tensorrt}, path_exists={trt_exists}, path={trt_path}", flush=True)
@@ -93,6 +182,13 @@ class DittoModel:
             self.sdk = StreamSDK(cfg_pkl, data_root)
             print(f"[DITTO DEBUG] StreamSDK initialized successfully", flush=True)
             
+            self._cache_avatar_registration()
+            
+            from config import settings
+            if (settings.ditto_torch_compile and self.device == "cuda"
+                    and "trt" not in str(data_root) and hasattr(torch, "compile")):
+                self._compile_modules()
+            
             self._initialized = True
             elapsed = time.time() - start_time
             logger.info(f"Ditto initialized with {os.path.basename(data_root)} in {elapsed:.2f}s")
@@ -105,29 +201,135 @@ class DittoModel:
         """Check if model is initialized"""
         return self._initialized and self.sdk is not None
     
+    def _cache_avatar_registration(self, max_entries: int = 8):
+        """
+        Memoize StreamSDK's avatar registration (face detection, landmarks, crop
+        and source features) that setup() runs for the reference image.
+        
+        Keyed by (path, mtime, size, crop kwargs), so reusing the same avatar
+        skips the CPU-bound detection; an edited image file is re-registered.
+        When the caller supplied the image's content hash (self._source_digest),
+        that is used instead of the path, so copies of one image share an entry.
+        """
+        registrar = getattr(self.sdk, "avatar_registrar", None)
+        if registrar is None or not callable(registrar):
+            logger.info("StreamSDK has no avatar_registrar; reference setup is not cached")
+            return
+        
+        cache = OrderedDict()
+        
+        def cached_registrar(source_path, *args, **kwargs):
+            if self._source_digest:
+                source_key = (self._source_digest,)
+            else:
+                st = os.stat(source_path)
+                source_key = (os.path.realpath(source_path), st.st_mtime_ns, st.st_size)
+            key = source_key + (repr(args), repr(sorted(kwargs.items())))
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+            result = registrar(source_path, *args, **kwargs)
+            cache[key] = result
+            if len(cache) > max_entries:
+                cache.popitem(last=False)
+            return result
+        
+        self.sdk.avatar_registrar = cached_registrar
+    
+    def _inference_context(self) -> ExitStack:
+        """
+        No-autograd context, plus FP16 autocast for the PyTorch path on CUDA.
+        
+        Autocast is thread-local, so it covers the stages run on the calling
+        thread (wav2feat and the flush in close()); TensorRT engines keep the
+        precision they were built with.
+        """
+        stack = ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if self.device == "cuda" and "trt" not in str(self.data_root):
+            stack.enter_context(torch.autocast(device_type="cuda", dtype=torch.float16))
+        return stack
+    
+    def _compile_modules(self, max_depth: int = 3):
+        """
+        Wrap the SDK's PyTorch modules with torch.compile(mode="reduce-overhead").
+        
+        StreamSDK keeps its networks inside per-stage wrapper objects, so walk
+        the wrapper attributes (bounded depth) and replace each nn.Module in
+        place. Compilation happens on the first call, i.e. during warmup().
+        Any failure leaves the remaining modules eager.
+        """
+        seen = set()
+        compiled = []
+        
+        def visit(obj, path, depth):
+            if depth == 0 or id(obj) in seen:
+                return
+            seen.add(id(obj))
+            for name, value in list(vars(obj).items()):
+                if isinstance(value, torch.nn.Module):
+                    setattr(obj, name, torch.compile(value, mode="reduce-overhead", dynamic=False))
+                    compiled.append(f"{path}.{name}")
+                elif hasattr(value, "__dict__") and type(value).__module__.split(".")[0] not in (
+                        "builtins", "threading", "queue", "numpy", "torch", "logging"):
+                    visit(value, f"{path}.{name}", depth - 1)
+        
+        try:
+            visit(self.sdk, "sdk", max_depth)
+            logger.info(f"torch.compile enabled for {len(compiled)} Ditto modules: {compiled}")
+        except Exception as e:
+            logger.warning(f"torch.compile of Ditto modules failed, using eager: {e}")
+    
+    def warmup(self, reference_image_path: str):
+        """
+        Run one short dummy generation (1s of silence) with output discarded.
+        
+        Pays TensorRT context creation and cuDNN algorithm selection at startup
+        instead of on the first real request.
+        """
+        if not self.is_ready():
+            self.initialize()
+        
+        logger.info(f"Warming up Ditto with {reference_image_path}...")
+        start_time = time.time()
+        
+        audio = np.zeros(16000, dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.sdk.setup(reference_image_path, os.path.join(tmp_dir, "warmup.mp4"))
+            self.sdk.setup_Nd(N_d=25, fade_in=-1, fade_out=-1, ctrl_info={})
+            with self._inference_context():
+                aud_feat = self.sdk.wav2feat.wav2feat(audio)
+                self.sdk.audio2motion_queue.put(aud_feat)
+                self.sdk.close()
+        
+        logger.info(f"Ditto warmup done in {time.time() - start_time:.2f}s")
+    
     def generate_video(
         self,
-        audio_path: str,
+        audio_path: Optional[str],
         reference_image_path: str,
         output_path: Optional[str] = None,
         enhancer: Optional[str] = None,  # Ignored for Ditto, kept for API compatibility
         crop_scale: float = 2.3,
         crop_vx_ratio: float = 0,
         crop_vy_ratio: float = -0.125,
+        audio_bytes: Optional[bytes] = None,
         **kwargs
     ) -> Tuple[str, float]:
         """
         Generate animated talking-head video from audio and reference image.
         
         Args:
-            audio_path: Path to input audio file (WAV format)
+            audio_path: Path to input audio file (WAV format); None when audio_bytes is given
             reference_image_path: Path to reference portrait image
             output_path: Path to save output video (default: temp file)
             enhancer: Ignored for Ditto (kept for API compatibility)
             crop_scale: Crop scale factor for face detection (default: 2.3)
             crop_vx_ratio: Horizontal crop offset (default: 0)
             crop_vy_ratio: Vertical crop offset (default: -0.125)
-            **kwargs: Additional parameters for StreamSDK
+            audio_bytes: In-memory audio file (e.g. WAV from TTS) used instead of audio_path
+            **kwargs: Additional parameters for StreamSDK (fade_in, fade_out,
+                ctrl_info) and reference_image_sha256 for the setup cache
             
         Returns:
             Tuple of (output_path, generation_time_milliseconds)
@@ -144,7 +346,7 @@ class DittoModel:
             os.close(fd)
         
         try:
-            logger.info(f"Generating video from audio: {audio_path}")
+            logger.info(f"Generating video from audio: {audio_path or f'<{len(audio_bytes)} bytes>'}")
             logger.info(f"Reference image: {reference_image_path}")
             
             # Setup SDK with source image and output path
@@ -153,13 +355,19 @@ class DittoModel:
                 'crop_vx_ratio': crop_vx_ratio,
                 'crop_vy_ratio': crop_vy_ratio
             }
-            self.sdk.setup(reference_image_path, output_path, **setup_kwargs)
+            self._source_digest = kwargs.get('reference_image_sha256')
+            try:
+                self.sdk.setup(reference_image_path, output_path, **setup_kwargs)
+            finally:
+                self._source_digest = None
             
-            # Load audio and calculate number of frames
-            import librosa
-            import math
-            audio, sr = librosa.core.load(audio_path, sr=16000)
-            num_frames = math.ceil(len(audio) / 16000 * 25)
+            # Load audio (float32, resampled only if not already 16 kHz) and calculate number of frames
+            if audio_bytes is not None:
+                audio, sr = sf.read(io.BytesIO(audio_bytes), dtype='float32')
+                audio = to_mono_16k(audio, sr)
+            else:
+                audio = _load_audio_cached(audio_path, os.stat(audio_path).st_mtime_ns)
+            num_frames = num_video_frames(len(audio))
             
             # Setup number of frames
             fade_in = kwargs.get('fade_in', -1)
@@ -167,38 +375,38 @@ class DittoModel:
             ctrl_info = kwargs.get('ctrl_info', {})
             self.sdk.setup_Nd(N_d=num_frames, fade_in=fade_in, fade_out=fade_out, ctrl_info=ctrl_info)
             
+            # Encode the final mp4 as frames are rendered when PyAV is available
+            writer = None
+            if av is not None and hasattr(self.sdk, "writer"):
+                writer = _AVMuxWriter(output_path)
+                self.sdk.writer = writer
+            
             # Process audio (offline mode)
             video_gen_start = time.time()
-            aud_feat = self.sdk.wav2feat.wav2feat(audio)
-            self.sdk.audio2motion_queue.put(aud_feat)
-            self.sdk.close()
+            with self._inference_context():
+                # Pinned copy on CUDA (DMA host->device); contiguous float32 as-is elsewhere
+                aud_feat = self.sdk.wav2feat.wav2feat(to_pinned_host(audio))
+                self.sdk.audio2motion_queue.put(aud_feat)
+                self.sdk.close()
             video_gen_time = time.time() - video_gen_start
             logger.info(f"[PERF] Ditto video generation: {video_gen_time:.2f}s")
             
-            # Add audio track to video with streaming optimizations
-            tmp_video = self.sdk.tmp_output_path
             encoding_start = time.time()
-            cmd = (
-                f'ffmpeg -loglevel error -y '
-                f'-i "{tmp_video}" -i "{audio_path}" '
-                f'-map 0:v -map 1:a '
-                f'-c:v libx264 '              # Re-encode video for optimization
-                f'-preset veryfast '          # Fast encoding
-                f'-profile:v baseline '       # Max browser compatibility
-                f'-level 3.0 '                # Lower level for better streaming
-                f'-crf 28 '                   # Balanced quality/size
-                f'-r 18 '                     # 18 FPS (down from 25)
-                f'-movflags +faststart '      # Progressive download - CRITICAL!
-                f'-c:a aac '                  # AAC audio
-                f'-ar 24000 '                 # 24kHz sample rate
-                f'-ac 1 '                     # Mono audio
-                f'-b:a 64k '                  # 64kbps audio bitrate
-                f'"{output_path}"'
-            )
-            logger.info(f"[PERF] FFmpeg command: {cmd}")
-            os.system(cmd)
+            if writer is not None:
+                writer.finish(audio)
+                # The SDK's own writer was never fed; drop anything it created
+                tmp_video = getattr(self.sdk, "tmp_output_path", None)
+                if tmp_video and os.path.exists(tmp_video):
+                    os.remove(tmp_video)
+            elif audio_path is None:
+                # ffmpeg needs the audio on disk
+                with tempfile.NamedTemporaryFile(suffix=".wav") as tmp_wav:
+                    sf.write(tmp_wav.name, audio, 16000, subtype='PCM_16')
+                    self._mux_with_ffmpeg(tmp_wav.name, output_path)
+            else:
+                self._mux_with_ffmpeg(audio_path, output_path)
             encoding_time = time.time() - encoding_start
-            logger.info(f"[PERF] FFmpeg encoding: {encoding_time:.2f}s")
+            logger.info(f"[PERF] {'Audio mux' if writer is not None else 'FFmpeg encoding'}: {encoding_time:.2f}s")
             
             elapsed = time.time() - start_time
             elapsed_ms = elapsed * 1000  # Convert to milliseconds for consistency
@@ -217,6 +425,36 @@ class DittoModel:
             if output_path and os.path.exists(output_path):
                 os.remove(output_path)
             raise
+        
+        finally:
+            self._generation_count += 1
+            if (self.device == "cuda" and torch.cuda.is_available()
+                    and self._generation_count % self.EMPTY_CACHE_EVERY == 0):
+                torch.cuda.empty_cache()
+    
+    def _mux_with_ffmpeg(self, audio_path: str, output_path: str):
+        """Re-encode the SDK's intermediate video with the audio track (no PyAV)"""
+        tmp_video = self.sdk.tmp_output_path
+        # argv list: no shell fork, paths are never shell-parsed
+        cmd = [
+            "ffmpeg", "-loglevel", "error", "-y",
+            "-i", tmp_video, "-i", audio_path,
+            "-map", "0:v", "-map", "1:a",
+            "-c:v", "libx264",              # Re-encode video for optimization
+            "-preset", "veryfast",          # Fast encoding
+            "-profile:v", "baseline",       # Max browser compatibility
+            "-level", "3.0",                # Lower level for better streaming
+            "-crf", "28",                   # Balanced quality/size
+            "-r", "18",                     # 18 FPS (down from 25)
+            "-movflags", "+faststart",      # Progressive download - CRITICAL!
+            "-c:a", "aac",                  # AAC audio
+            "-ar", "24000",                 # 24kHz sample rate
+            "-ac", "1",                     # Mono audio
+            "-b:a", "64k",                  # 64kbps audio bitrate
+            output_path
+        ]
+        logger.info(f"[PERF] FFmpeg command: {' '.join(cmd)}")
+        subprocess.run(cmd, check=True)
     
     def unload(self):
         """Unload model to free memory"""
@@ -11,14 +11,137 @@ import time
 import torch
 import logging
 import numpy as np
+from collections import OrderedDict
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
 # LivePortrait will be cloned at runtime/LivePortrait
 LIVEPORTRAIT_DIR = Path(__file__).parent.parent / "LivePortrait"
 
+# FasterLivePortrait engine file -> LivePortraitWrapper attribute it replaces.
+# Only the single-tensor-input networks are swapped; warping + SPADE decoder and
+# stitching keep their PyTorch call signatures.
+TRT_ENGINES = {
+    "appearance_feature_extractor.trt": "appearance_feature_extractor",
+    "motion_extractor.trt": "motion_extractor",
+}
+
+# LivePortraitWrapper networks compiled by the torch_compile backend
+COMPILED_NETWORKS = ("appearance_feature_extractor", "motion_extractor", "warping_module", "spade_generator")
+
+
+class _CUDAGraphModule(torch.nn.Module):
+    """
+    Replays a module's forward pass from a captured CUDA graph.
+    
+    The first call for an input shape runs a few warmup forwards on a side
+    stream (cuDNN autotuning, allocator), then captures one forward into a
+    CUDA graph with static input/output buffers. Later calls copy the input
+    into the static buffer and replay the whole kernel sequence with a single
+    launch. Moving the module (e.g. offloading to CPU) drops the graphs.
+    """
+    
+    WARMUP_ITERS = 3
+    
+    def __init__(self, module: torch.nn.Module):
+        super().__init__()
+        self.module = module
+        self._graphs: Dict[tuple, tuple] = {}
+    
+    def _apply(self, fn, *args, **kwargs):
+        # Captured graphs point at the old device memory
+        self._graphs.clear()
+        return super()._apply(fn, *args, **kwargs)
+    
+    def forward(self, feature: torch.Tensor) -> torch.Tensor:
+        if not feature.is_cuda:
+            return self.module(feature=feature)
+        
+        key = (tuple(feature.shape), feature.dtype, torch.is_autocast_enabled())
+        if key not in self._graphs:
+            static_in = feature.clone()
+            side = torch.cuda.Stream()
+            side.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(side):
+                for _ in range(self.WARMUP_ITERS):
+                    self.module(feature=static_in)
+            torch.cuda.current_stream().wait_stream(side)
+            
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph):
+                static_out = self.module(feature=static_in)
+            self._graphs[key] = (graph, static_in, static_out)
+        
+        graph, static_in, static_out = self._graphs[key]
+        static_in.copy_(feature)
+        graph.replay()
+        # The next replay overwrites static_out
+        return static_out.clone()
+
+
+class _TRTEngine:
+    """
+    Callable TensorRT engine with torch-allocated I/O bindings.
+    
+    Output buffers are allocated once per input shape and reused; inference is
+    enqueued with execute_async_v3 on a dedicated CUDA stream. Returns a single
+    tensor, or a dict keyed by output name for multi-output engines (the
+    motion extractor's pitch/yaw/roll/t/exp/scale/kp).
+    """
+    
+    _DTYPES = {"FLOAT": torch.float32, "HALF": torch.float16, "INT32": torch.int32, "BOOL": torch.bool}
+    
+    def __init__(self, engine_path: Path, stream: torch.cuda.Stream):
+        import tensorrt as trt
+        
+        self.trt = trt
+        runtime = trt.Runtime(trt.Logger(trt.Logger.WARNING))
+        self.engine = runtime.deserialize_cuda_engine(engine_path.read_bytes())
+        if self.engine is None:
+            raise RuntimeError(f"Failed to deserialize TensorRT engine {engine_path}")
+        self.context = self.engine.create_execution_context()
+        self.stream = stream
+        
+        names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+        self.inputs = [n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.INPUT]
+        self.outputs = [n for n in names if n not in self.inputs]
+        self._input_shape = None
+        self._out_buffers: Dict[str, torch.Tensor] = {}
+    
+    def _dtype(self, name: str) -> torch.dtype:
+        return self._DTYPES[self.engine.get_tensor_dtype(name).name]
+    
+    def __call__(self, x: torch.Tensor) -> Union[torch.Tensor, Dict[str, torch.Tensor]]:
+        name = self.inputs[0]
+        x = x.to(device="cuda", dtype=self._dtype(name)).contiguous()
+        
+        if tuple(x.shape) != self._input_shape:
+            self.context.set_input_shape(name, tuple(x.shape))
+            self._out_buffers = {
+                out: torch.empty(tuple(self.context.get_tensor_shape(out)), dtype=self._dtype(out), device="cuda")
+                for out in self.outputs
+            }
+            for out, buf in self._out_buffers.items():
+                self.context.set_tensor_address(out, buf.data_ptr())
+            self._input_shape = tuple(x.shape)
+        self.context.set_tensor_address(name, x.data_ptr())
+        
+        # Inputs were produced on the current stream; outputs are consumed there too
+        self.stream.wait_stream(torch.cuda.current_stream())
+        if not self.context.execute_async_v3(self.stream.cuda_stream):
+            raise RuntimeError("TensorRT execution failed")
+        torch.cuda.current_stream().wait_stream(self.stream)
+        x.record_stream(self.stream)
+        
+        # Callers may hold on to results, so hand out copies of the bindings
+        outputs = {out: buf.float().clone() for out, buf in self._out_buffers.items()}
+        if len(outputs) == 1:
+            return next(iter(outputs.values()))
+        return outputs
+
 
 class LivePortraitModel:
     """
@@ -29,10 +152,27 @@ class LivePortraitModel:
     def __init__(self):
         self.device = "cuda"  # LivePortrait works best on CUDA
         self.pipeline = None
+        self.backend = "pytorch"
+        self._trt_stream = None
+        self._gfpgan = None  # Loaded on first enhancer="gfpgan" request
+        # (path, mtime, size) of the reference image for the current generate_video() call
+        self._source_key: Optional[tuple] = None
+        # Host->device uploads: reused pinned staging buffer + side stream
+        self._copy_stream = None
+        self._pinned: Optional[torch.Tensor] = None
+        self._copy_done = None
+        self._mel = None  # torchaudio MelSpectrogram on CUDA, built on first use
+        self._eager_networks: Dict[str, torch.nn.Module] = {}  # Originals of compiled networks
         self._ready = False
         
-    def initialize(self):
-        """Initialize LivePortrait pipeline"""
+    def initialize(self, use_tensorrt: bool = True):
+        """
+        Initialize LivePortrait pipeline
+        
+        Args:
+            use_tensorrt: Swap in TensorRT engines where built (see _load_trt_engines);
+                only with settings.liveportrait_backend == "tensorrt"
+        """
         if self._ready:
             return
             
@@ -64,8 +204,26 @@ class LivePortraitModel:
                 crop_cfg=crop_cfg
             )
             
+            from config import settings
+            compile_networks = self.device == "cuda" and settings.liveportrait_backend == "torch_compile"
+            if self.device == "cuda":
+                self._copy_stream = torch.cuda.Stream()
+                self._optimize_decoder()
+                if settings.liveportrait_cuda_graphs and not compile_networks:
+                    wrapper = self.pipeline.live_portrait_wrapper
+                    wrapper.spade_generator = _CUDAGraphModule(wrapper.spade_generator)
+                    logger.info("LivePortrait decoder wrapped for CUDA graph replay")
+            if compile_networks:
+                self._compile_networks()
+            elif use_tensorrt and self.device == "cuda":
+                self._load_trt_engines()
+            
+            self._cache_source_features()
+            if compile_networks:
+                self._warmup()
+            
             elapsed = time.time() - start_time
-            logger.info(f"✅ LivePortrait initialized successfully in {elapsed:.2f}s")
+            logger.info(f"✅ LivePortrait initialized successfully in {elapsed:.2f}s (backend: {self.backend})")
             self._ready = True
             
         except Exception as e:
@@ -76,6 +234,179 @@ class LivePortraitModel:
         """Check if model is initialized"""
         return self._ready and self.pipeline is not None
     
+    def _to_device(self, array: np.ndarray) -> torch.Tensor:
+        """
+        Upload a float32 array to the GPU via a reused pinned buffer.
+        
+        The copy is a non-blocking DMA on a side stream; the current (compute)
+        stream waits for it on the GPU, so the host thread does not block on
+        the transfer.
+        """
+        host = torch.from_numpy(np.ascontiguousarray(array, dtype=np.float32))
+        n = host.numel()
+        if self._pinned is None or self._pinned.numel() < n:
+            self._pinned = torch.empty(n, dtype=torch.float32, pin_memory=True)
+        elif self._copy_done is not None:
+            # The previous upload may still be reading the buffer
+            self._copy_done.synchronize()
+        pinned = self._pinned[:n].view(host.shape)
+        pinned.copy_(host)
+        
+        with torch.cuda.stream(self._copy_stream):
+            device_tensor = pinned.to("cuda", non_blocking=True)
+        self._copy_done = self._copy_stream.record_event()
+        torch.cuda.current_stream().wait_stream(self._copy_stream)
+        device_tensor.record_stream(torch.cuda.current_stream())
+        return device_tensor
+    
+    def _extract_audio_features_gpu(self, audio_path: str, fps: int) -> torch.Tensor:
+        """
+        (N, 80) log-mel audio features at the video frame rate, computed on the GPU.
+        
+        Replaces the CPU feature extraction: the audio is uploaded once through
+        the pinned buffer, the STFT/mel runs as CUDA kernels and the result is
+        resampled to one row per video frame, staying on the GPU for the pipeline.
+        """
+        import torchaudio
+        import torch.nn.functional as F
+        from utils.audio import load_audio_16k, num_video_frames
+        
+        if self._mel is None:
+            self._mel = torchaudio.transforms.MelSpectrogram(
+                sample_rate=16000, n_fft=400, hop_length=160, n_mels=80
+            ).to("cuda")
+        
+        audio, sr = load_audio_16k(audio_path)
+        mel = torch.log(self._mel(self._to_device(audio)).clamp_min(1e-5))  # (80, T) at 100 Hz
+        n_frames = num_video_frames(len(audio), sr, fps)
+        return F.interpolate(mel[None], size=n_frames, mode="linear", align_corners=False)[0].T.contiguous()
+    
+    def _cache_source_features(self, max_entries: int = 8):
+        """
+        Memoize the 3D appearance feature (f_s) of the reference image.
+        
+        The reference image rarely changes between utterances, so the
+        wrapper's extract_feature_3d is wrapped: during generate_video() it is
+        keyed by the image's (path, mtime, size) and the appearance extractor
+        only runs for a new or edited image. Other calls pass straight
+        through.
+        """
+        wrapper = self.pipeline.live_portrait_wrapper
+        extract_feature_3d = wrapper.extract_feature_3d
+        cache = OrderedDict()
+        
+        def cached_extract_feature_3d(x, *args, **kwargs):
+            if self._source_key is None:
+                return extract_feature_3d(x, *args, **kwargs)
+            key = self._source_key + (tuple(x.shape),)
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+            result = extract_feature_3d(x, *args, **kwargs)
+            cache[key] = result
+            if len(cache) > max_entries:
+                cache.popitem(last=False)
+            return result
+        
+        wrapper.extract_feature_3d = cached_extract_feature_3d
+    
+    def _optimize_decoder(self):
+        """
+        Run the SPADE decoder in FP16 with channels_last weights.
+        
+        The decoder is a plain 2D conv stack at a fixed 512x512 output, so
+        NHWC FP16 kernels (picked by cuDNN benchmark) cover it entirely. The
+        warping module has 3D convs and keeps its layout; autocast in
+        _inference_context handles its precision.
+        """
+        torch.backends.cudnn.benchmark = True
+        wrapper = self.pipeline.live_portrait_wrapper
+        wrapper.spade_generator = wrapper.spade_generator.to(memory_format=torch.channels_last).half()
+        logger.info("LivePortrait decoder converted to FP16 channels_last")
+    
+    def _compile_networks(self):
+        """
+        torch.compile the LivePortrait networks with Inductor (mode="max-autotune").
+        
+        Compiled whole (fullgraph=True) at static shapes, so Triton fuses each
+        network end to end, with no PyTorch/TensorRT boundaries and CUDA graph
+        replay from max-autotune. The FX graph cache lives in
+        settings.torchinductor_cache_dir so restarts reuse compiled kernels.
+        Compilation happens on the first call (see _warmup).
+        """
+        import torch._inductor.config as inductor_config
+        from config import settings
+        
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", settings.torchinductor_cache_dir)
+        inductor_config.fx_graph_cache = True
+        
+        wrapper = self.pipeline.live_portrait_wrapper
+        self._eager_networks = {name: getattr(wrapper, name) for name in COMPILED_NETWORKS}
+        for name, module in self._eager_networks.items():
+            setattr(wrapper, name, torch.compile(module, mode="max-autotune", fullgraph=True, dynamic=False))
+        self.backend = "torch_compile"
+        logger.info(f"LivePortrait networks set up for torch.compile: {list(COMPILED_NETWORKS)}")
+    
+    def _warmup(self, iters: int = 2):
+        """
+        Run the networks on a dummy source frame so compilation (or loading it
+        from the cache) happens at startup, not on the first request. Falls
+        back to eager if compilation fails.
+        """
+        wrapper = self.pipeline.live_portrait_wrapper
+        start_time = time.time()
+        try:
+            dummy = torch.rand(1, 3, 256, 256, device=self.device)
+            with self._inference_context():
+                for _ in range(iters):
+                    kp_info = wrapper.get_kp_info(dummy)
+                    feature_3d = wrapper.extract_feature_3d(dummy)
+                    kp = wrapper.transform_keypoint(kp_info)
+                    wrapper.warp_decode(feature_3d, kp, kp)
+            torch.cuda.synchronize()
+            logger.info(f"LivePortrait warmup done in {time.time() - start_time:.1f}s")
+        except Exception as e:
+            logger.warning(f"LivePortrait torch.compile failed, using eager: {e}")
+            for name, module in self._eager_networks.items():
+                setattr(wrapper, name, module)
+            self.backend = "pytorch"
+    
+    def _load_trt_engines(self):
+        """
+        Replace LivePortrait networks with prebuilt TensorRT engines.
+        
+        Engines are FasterLivePortrait's ONNX -> TRT builds (scripts/all_onnx2trt.sh),
+        looked up in settings.liveportrait_trt_engine_dir (precision variant first).
+        Building them takes minutes, so it is a setup step, not done here.
+        Missing engines or a missing tensorrt package leave PyTorch in place.
+        """
+        from config import settings, resolve_trt_engine_dir
+        
+        engine_dir = Path(resolve_trt_engine_dir(settings.liveportrait_trt_engine_dir))
+        available = {f: attr for f, attr in TRT_ENGINES.items() if (engine_dir / f).exists()}
+        if not available:
+            logger.info(f"No LivePortrait TensorRT engines in {engine_dir}; using PyTorch")
+            return
+        
+        wrapper = self.pipeline.live_portrait_wrapper
+        self._trt_stream = torch.cuda.Stream()
+        try:
+            for engine_file, attr in available.items():
+                setattr(wrapper, attr, _TRTEngine(engine_dir / engine_file, self._trt_stream))
+        except Exception as e:
+            logger.warning(f"Failed to load LivePortrait TensorRT engines, using PyTorch: {e}")
+            return
+        self.backend = "tensorrt"
+        logger.info(f"LivePortrait TensorRT engines loaded from {engine_dir}: {sorted(available.values())}")
+    
+    def _inference_context(self) -> ExitStack:
+        """No-autograd context, plus FP16 autocast on CUDA"""
+        stack = ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if self.device == "cuda":
+            stack.enter_context(torch.autocast(device_type="cuda", dtype=torch.float16))
+        return stack
+    
     def generate_video(
         self,
         audio_path: str,
@@ -110,36 +441,103 @@ class LivePortraitModel:
             output_dir.mkdir(exist_ok=True, parents=True)
             
             # LivePortrait expects specific input format
-            # Process audio to extract motion features
-            from src.utils.audio import extract_audio_features
-            audio_features = extract_audio_features(audio_path, fps=fps)
+            # Process audio to extract motion features, as one (N, D) tensor the
+            # pipeline slices per batch
+            from config import settings
+            if settings.liveportrait_gpu_audio_features and self._copy_stream is not None:
+                audio_features = self._extract_audio_features_gpu(audio_path, fps)
+            else:
+                from src.utils.audio import extract_audio_features
+                audio_features = np.asarray(extract_audio_features(audio_path, fps=fps))
+                if self._copy_stream is not None:
+                    audio_features = self._to_device(audio_features)
+                else:
+                    audio_features = torch.as_tensor(audio_features)
             
             # Load and preprocess source image
             from src.utils.image import load_image_rgb
             source_image = load_image_rgb(reference_image_path)
             
             # Run LivePortrait pipeline
-            output_video = self.pipeline.execute(
-                source_image=source_image,
-                driving_audio_features=audio_features,
-                output_path=output_path
-            )
+            st = os.stat(reference_image_path)
+            self._source_key = (os.path.realpath(reference_image_path), st.st_mtime_ns, st.st_size)
+            try:
+                with self._inference_context():
+                    output_video = self.pipeline.execute(
+                        source_image=source_image,
+                        driving_audio_features=audio_features,
+                        output_path=output_path
+                    )
+            finally:
+                self._source_key = None
             
             # Apply GFPGAN enhancement if requested
             if enhancer == "gfpgan":
-                logger.info("Applying GFPGAN face enhancement...")
-                from utils.gfpgan_utils import enhance_video
-                output_video = enhance_video(output_video, output_path)
+                output_video = self._enhance_with_gfpgan(output_video, output_path)
             
             generation_time = (time.time() - start_time) * 1000
             logger.info(f"✅ LivePortrait video generated in {generation_time:.0f}ms")
             
+            if self.device == "cuda":
+                # Peak reserved per request; steady growth means allocator fragmentation
+                peak_gb = torch.cuda.max_memory_reserved() / 1024**3
+                torch.cuda.reset_peak_memory_stats()
+                logger.info(f"LivePortrait peak CUDA memory reserved: {peak_gb:.2f}GB")
+            
             return output_path, generation_time
             
         except Exception as e:
             logger.error(f"LivePortrait generation failed: {e}", exc_info=True)
             raise
     
+    def _move_networks(self, device: str):
+        """Move the LivePortraitWrapper's PyTorch networks (not TRT engines) to device"""
+        wrapper = self.pipeline.live_portrait_wrapper
+        for name, value in vars(wrapper).items():
+            if isinstance(value, torch.nn.Module):
+                setattr(wrapper, name, value.to(device))
+    
+    def _enhance_with_gfpgan(self, video_path: str, output_path: str) -> str:
+        """
+        Run GFPGAN over the rendered video without both models resident in VRAM.
+        
+        With settings.gfpgan_unload (default) the LivePortrait networks are moved
+        to CPU while GFPGAN is loaded on demand, and GFPGAN is dropped again
+        afterwards; otherwise GFPGAN stays cached on the GPU next to LivePortrait.
+        In unload mode, frames are spread over several GFPGAN worker processes
+        when free VRAM allows (settings.gfpgan_workers, 0 = auto).
+        """
+        from config import settings
+        from utils.gfpgan_utils import default_workers, enhance_video, enhance_video_parallel
+        
+        logger.info("Applying GFPGAN face enhancement...")
+        unload = settings.gfpgan_unload and self.device == "cuda"
+        if unload:
+            self._move_networks("cpu")
+            torch.cuda.empty_cache()
+        try:
+            workers = (settings.gfpgan_workers or default_workers()) if unload else 1
+            if workers > 1:
+                return enhance_video_parallel(
+                    video_path, output_path, settings.gfpgan_model_path, workers=workers
+                )
+            if self._gfpgan is None:
+                from gfpgan import GFPGANer
+                self._gfpgan = GFPGANer(
+                    model_path=settings.gfpgan_model_path,
+                    upscale=1,
+                    arch="clean",
+                    channel_multiplier=2,
+                    bg_upsampler=None,
+                    device=self.device
+                )
+            return enhance_video(video_path, output_path, restorer=self._gfpgan)
+        finally:
+            if unload:
+                self._gfpgan = None
+                torch.cuda.empty_cache()
+                self._move_networks(self.device)
+    
     def cleanup(self):
         """Cleanup model resources"""
         if self.pipeline:
@@ -2,8 +2,16 @@
 LLM (Large Language Model) wrapper
 Using Qwen-2.5 for conversational responses
 """
+import copy
 import logging
-from typing import Optional, List, Dict
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional, List, Dict
+
+from config import settings
+from utils.language import SentenceChunker
 
 logger = logging.getLogger(__name__)
 
@@ -11,21 +19,29 @@ logger = logging.getLogger(__name__)
 class LLMModel:
     """
     LLM wrapper for generating conversational responses.
-    Uses Qwen-2.5 (7B locally, 14B-INT4 on GPU).
-    
-    Note: This is a stub for Phase 2/3 implementation.
+    Uses Qwen-2.5-7B: an FP8 TensorRT-LLM engine on GPUs with FP8 tensor cores
+    (Ada/Hopper) when one is built, INT4 weight-only (AWQ) on other CUDA GPUs,
+    full precision on CPU.
     """
     
-    def __init__(self, model_name: str = "Qwen/Qwen2.5-7B-Instruct"):
+    def __init__(self, model_name: Optional[str] = None, awq_model_name: Optional[str] = None):
         """
         Initialize LLM.
         
         Args:
-            model_name: HuggingFace model name
+            model_name: HuggingFace model name (CPU, or CUDA without an AWQ checkpoint)
+            awq_model_name: AWQ-quantized checkpoint of the same model, used on CUDA
         """
-        self.model_name = model_name
+        self.model_name = model_name or settings.llm_model
+        self.awq_model_name = awq_model_name if awq_model_name is not None else settings.llm_awq_model
         self.model = None
+        self.runner = None  # TensorRT-LLM ModelRunnerCpp (FP8 engine)
         self.tokenizer = None
+        # conversation_id -> (last used, token ids, KV cache) after its last turn
+        self._kv_caches: OrderedDict = OrderedDict()
+        # system prompt -> (token ids, KV cache) of its chat-template block
+        self._system_kv: Dict[str, tuple] = {}
+        self._kv_lock = threading.Lock()
         self._initialized = False
         
     def initialize(self):
@@ -33,36 +49,303 @@ class LLMModel:
         if self._initialized:
             return
             
-        logger.info(f"Loading LLM: {self.model_name}...")
-        
         try:
-            from transformers import AutoModelForCausalLM, AutoTokenizer
+            from transformers import AutoTokenizer
             import torch
             
-            # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                self.model_name,
-                trust_remote_code=True
-            )
+            if self._load_trtllm():
+                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=True)
+                self._initialized = True
+                return
             
-            # Load model (quantized for efficiency)
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                device_map="auto",
-                trust_remote_code=True
-            )
+            # Decode is bound by reading the weights: INT4 weight-only moves 4x less
+            # than FP16 and fits the 7B model in ~5GB of VRAM. The AWQ checkpoint
+            # carries its quantization_config (needs autoawq); embeddings and
+            # lm_head stay FP16. bitsandbytes int8 is avoided, it decodes slower.
+            if torch.cuda.is_available() and self.awq_model_name:
+                try:
+                    self._load_hf(self.awq_model_name, device_map="cuda:0")
+                except Exception as e:
+                    # autoawq is optional (see requirements.txt)
+                    logger.warning(f"Failed to load AWQ checkpoint, using {self.model_name} in FP16: {e}")
+                    self.model = None
+                    torch.cuda.empty_cache()
+            if self.model is None:
+                self._load_hf(self.model_name, device_map="auto")
             
             self._initialized = True
-            logger.info(f"LLM loaded: {self.model_name}")
             
         except Exception as e:
             logger.error(f"Failed to load LLM: {e}")
             raise
     
+    def _load_hf(self, model_name: str, device_map: str):
+        """Load the tokenizer and transformers model of model_name"""
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        import torch
+        
+        logger.info(f"Loading LLM: {model_name}...")
+        
+        # Load tokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            model_name,
+            trust_remote_code=True
+        )
+        
+        # Load model
+        self.model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+            device_map=device_map,
+            trust_remote_code=True
+        )
+        
+        logger.info(f"LLM loaded: {model_name} on {self.model.device}")
+    
+    def _load_trtllm(self) -> bool:
+        """
+        Load the FP8 TensorRT-LLM engine from settings.llm_trt_engine_dir.
+        
+        Only on GPUs with FP8 tensor cores (compute capability 8.9+): FP8
+        halves the weight and KV-cache bytes read per decoded token versus FP16.
+        The engine is built offline from an FP8-quantized checkpoint:
+            trtllm-build --checkpoint_dir qwen25_7b_fp8 --gemm_plugin fp8 \\
+                --max_batch_size 1 --paged_kv_cache enable \\
+                --use_paged_context_fmha enable --output_dir <llm_trt_engine_dir>
+        The paged KV cache is run with block reuse, so a turn that extends the
+        previous prompt (chat history) only prefills the new tokens, and with
+        chunked context for long histories.
+        
+        Returns:
+            True if the engine was loaded (otherwise the AWQ/FP16 path is used)
+        """
+        import torch
+        
+        engine_dir = settings.llm_trt_engine_dir
+        if not (engine_dir and torch.cuda.is_available() and os.path.isdir(engine_dir)):
+            return False
+        if torch.cuda.get_device_capability() < (8, 9):
+            logger.info("GPU has no FP8 tensor cores; using the AWQ checkpoint")
+            return False
+        try:
+            from tensorrt_llm.runtime import ModelRunnerCpp
+        except ImportError:
+            logger.info("tensorrt_llm not installed; using the AWQ checkpoint")
+            return False
+        
+        try:
+            logger.info(f"Loading LLM TensorRT-LLM engine: {engine_dir}...")
+            self.runner = ModelRunnerCpp.from_dir(
+                engine_dir=engine_dir,
+                kv_cache_enable_block_reuse=True,
+                enable_chunked_context=True
+            )
+        except Exception as e:
+            logger.warning(f"Failed to load TensorRT-LLM engine, using the AWQ checkpoint: {e}")
+            return False
+        logger.info(f"LLM loaded: {engine_dir} (TensorRT-LLM FP8)")
+        return True
+    
     def is_ready(self) -> bool:
         """Check if model is initialized"""
-        return self._initialized and self.model is not None
+        return self._initialized and (self.model is not None or self.runner is not None)
+    
+    def _trtllm_generate(self, text: str, max_tokens: int, temperature: float, streaming: bool):
+        """runner.generate for one prompt; returns its output dict (an iterator of them when streaming)"""
+        input_ids = self.tokenizer(text, return_tensors="pt").input_ids[0].int()
+        eos_id = self.tokenizer.eos_token_id
+        outputs = self.runner.generate(
+            batch_input_ids=[input_ids],
+            max_new_tokens=max_tokens,
+            end_id=eos_id,
+            pad_id=self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else eos_id,
+            temperature=temperature,
+            top_p=0.95,
+            streaming=streaming,
+            return_dict=True
+        )
+        return input_ids.numel(), outputs
+    
+    def _trtllm_decode(self, prompt_len: int, output: dict) -> str:
+        """Generated text so far in a runner output dict (batch 0, beam 0)"""
+        end = int(output["sequence_lengths"][0][0])
+        return self.tokenizer.decode(output["output_ids"][0][0][prompt_len:end], skip_special_tokens=True)
+    
+    def _reuse_kv_cache(self, conversation_id: Optional[str], input_ids):
+        """
+        KV cache of the conversation's previous turn, cropped to the prefix it
+        shares with input_ids (None if there is none).
+        
+        Each turn's prompt repeats the previous prompt and reply, so only the
+        tokens after the shared prefix (the new user message) are prefilled.
+        """
+        if conversation_id is None:
+            return None
+        now = time.monotonic()
+        with self._kv_lock:
+            expired = [key for key, (used, _, _) in self._kv_caches.items()
+                       if now - used > settings.llm_kv_cache_ttl_s]
+            for key in expired:
+                del self._kv_caches[key]
+            entry = self._kv_caches.pop(conversation_id, None)
+        if entry is None:
+            return None
+        
+        _, cached_ids, cache = entry
+        # Cropping a DynamicCache needs transformers>=4.42 (older versions: no reuse)
+        if not hasattr(cache, "crop"):
+            return None
+        # At least the last prompt token must be run to get the next-token logits
+        n = min(cache.get_seq_length(), input_ids.shape[1] - 1)
+        matches = cached_ids[:n] == input_ids[0, :n].to(cached_ids.device)
+        prefix = n if bool(matches.all()) else int(matches.int().argmin())
+        if prefix == 0:
+            return None
+        cache.crop(prefix)
+        logger.debug(f"Reusing {prefix} cached tokens for conversation {conversation_id}")
+        return cache
+    
+    def _system_kv_cache(self, system_prompt: Optional[str], input_ids):
+        """
+        Copy of the KV cache of system_prompt's chat-template block, if input_ids
+        starts with it (None otherwise). Computed on first use, then kept.
+        
+        Every turn of every conversation starts with the same system block, so
+        it is prefilled once instead of per request.
+        """
+        if not system_prompt:
+            return None
+        with self._kv_lock:
+            entry = self._system_kv.get(system_prompt)
+        if entry is None:
+            import torch
+            try:
+                from transformers import DynamicCache
+            except ImportError:
+                # transformers<4.36: prefill the whole prompt
+                return None
+            
+            text = self.tokenizer.apply_chat_template(
+                [{"role": "system", "content": system_prompt}],
+                tokenize=False
+            )
+            ids = self.tokenizer(text, return_tensors="pt").input_ids.to(self.model.device)
+            with torch.no_grad():
+                cache = self.model(ids, past_key_values=DynamicCache(), use_cache=True).past_key_values
+            entry = (ids[0], cache)
+            with self._kv_lock:
+                self._system_kv[system_prompt] = entry
+        
+        ids, cache = entry
+        n = ids.numel()
+        if input_ids.shape[1] <= n or not bool((input_ids[0, :n] == ids).all()):
+            return None
+        # generate() extends the cache it is given
+        return copy.deepcopy(cache)
+    
+    def _prompt_kv_cache(self, conversation_id: Optional[str], system_prompt: Optional[str], input_ids):
+        """KV cache to start generation from: the conversation's, else the system prompt's"""
+        cache = self._reuse_kv_cache(conversation_id, input_ids)
+        if cache is None:
+            cache = self._system_kv_cache(system_prompt, input_ids)
+        return cache
+    
+    def _store_kv_cache(self, conversation_id: Optional[str], outputs):
+        """Keep a generate() result's KV cache for the conversation's next turn"""
+        if conversation_id is None:
+            return
+        with self._kv_lock:
+            self._kv_caches[conversation_id] = (time.monotonic(), outputs.sequences[0], outputs.past_key_values)
+            while len(self._kv_caches) > settings.llm_kv_cache_max_conversations:
+                self._kv_caches.popitem(last=False)
+    
+    def _complete(
+        self,
+        text: str,
+        max_tokens: int,
+        temperature: float,
+        conversation_id: Optional[str] = None,
+        system_prompt: Optional[str] = None
+    ) -> str:
+        """Generate a reply to a chat-templated prompt (starting with system_prompt's block, if given)"""
+        if self.runner is not None:
+            prompt_len, output = self._trtllm_generate(text, max_tokens, temperature, streaming=False)
+            return self._trtllm_decode(prompt_len, output).strip()
+        
+        # Tokenize
+        inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
+        
+        # Generate
+        outputs = self.model.generate(
+            **inputs,
+            past_key_values=self._prompt_kv_cache(conversation_id, system_prompt, inputs.input_ids),
+            max_new_tokens=max_tokens,
+            temperature=temperature,
+            do_sample=True,
+            top_p=0.95,
+            return_dict_in_generate=True
+        )
+        self._store_kv_cache(conversation_id, outputs)
+        
+        # Decode
+        response = self.tokenizer.decode(
+            outputs.sequences[0][len(inputs.input_ids[0]):],
+            skip_special_tokens=True
+        )
+        
+        return response.strip()
+    
+    def _stream_text(
+        self,
+        text: str,
+        max_tokens: int,
+        temperature: float,
+        conversation_id: Optional[str] = None,
+        system_prompt: Optional[str] = None
+    ) -> Iterator[str]:
+        """Reply to a chat-templated prompt, as text pieces while tokens are decoded"""
+        if self.runner is not None:
+            prompt_len, outputs = self._trtllm_generate(text, max_tokens, temperature, streaming=True)
+            emitted = ""
+            for output in outputs:
+                # Each output holds all tokens so far; decoding them whole keeps
+                # multi-token characters intact
+                decoded = self._trtllm_decode(prompt_len, output)
+                if len(decoded) > len(emitted) and not decoded.endswith("\ufffd"):
+                    yield decoded[len(emitted):]
+                    emitted = decoded
+            return
+        
+        from transformers import TextIteratorStreamer
+        
+        inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        result = {}
+        
+        def run():
+            try:
+                result["outputs"] = self.model.generate(
+                    **inputs,
+                    past_key_values=self._prompt_kv_cache(conversation_id, system_prompt, inputs.input_ids),
+                    streamer=streamer,
+                    max_new_tokens=max_tokens,
+                    temperature=temperature,
+                    do_sample=True,
+                    top_p=0.95,
+                    return_dict_in_generate=True
+                )
+            except BaseException as e:
+                # Unblock the consumer below; the error is re-raised there
+                result["error"] = e
+                streamer.end()
+        
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        yield from streamer
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        self._store_kv_cache(conversation_id, result["outputs"])
     
     def generate_response(
         self,
@@ -70,7 +353,8 @@ class LLMModel:
         system_prompt: Optional[str] = None,
         max_tokens: int = 256,
         temperature: float = 0.7,
-        language: str = "en"
+        language: str = "en",
+        conversation_id: Optional[str] = None
     ) -> str:
         """
         Generate conversational response.
@@ -81,6 +365,7 @@ class LLMModel:
             max_tokens: Maximum response length
             temperature: Sampling temperature
             language: Response language hint
+            conversation_id: Reuse and keep this conversation's KV cache
             
         Returns:
             Generated response text
@@ -110,25 +395,7 @@ class LLMModel:
                 add_generation_prompt=True
             )
             
-            # Tokenize
-            inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
-            
-            # Generate
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=max_tokens,
-                temperature=temperature,
-                do_sample=True,
-                top_p=0.95
-            )
-            
-            # Decode
-            response = self.tokenizer.decode(
-                outputs[0][len(inputs[0]):],
-                skip_special_tokens=True
-            )
-            
-            return response.strip()
+            return self._complete(text, max_tokens, temperature, conversation_id, system_prompt)
             
         except Exception as e:
             logger.error(f"Response generation failed: {e}")
@@ -137,16 +404,21 @@ class LLMModel:
     def generate_with_history(
         self,
         messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
         max_tokens: int = 256,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        conversation_id: Optional[str] = None
     ) -> str:
         """
         Generate response with conversation history.
         
         Args:
             messages: List of message dicts with 'role' and 'content'
+            system_prompt: System instructions (prepended to messages)
             max_tokens: Maximum response length
             temperature: Sampling temperature
+            conversation_id: Reuse and keep this conversation's KV cache, so
+                only the new turn is prefilled
             
         Returns:
             Generated response text
@@ -155,6 +427,11 @@ class LLMModel:
             self.initialize()
         
         try:
+            if system_prompt:
+                messages = [{"role": "system", "content": system_prompt}] + messages
+            elif messages and messages[0]["role"] == "system":
+                system_prompt = messages[0]["content"]
+            
             # Apply chat template
             text = self.tokenizer.apply_chat_template(
                 messages,
@@ -162,35 +439,62 @@ class LLMModel:
                 add_generation_prompt=True
             )
             
-            # Tokenize
-            inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
-            
-            # Generate
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=max_tokens,
-                temperature=temperature,
-                do_sample=True,
-                top_p=0.95
-            )
-            
-            # Decode
-            response = self.tokenizer.decode(
-                outputs[0][len(inputs[0]):],
-                skip_special_tokens=True
-            )
-            
-            return response.strip()
+            return self._complete(text, max_tokens, temperature, conversation_id, system_prompt)
             
         except Exception as e:
             logger.error(f"Response generation with history failed: {e}")
             raise
     
+    def generate_stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 256,
+        temperature: float = 0.7,
+        conversation_id: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Generate a response chunk by chunk (see SentenceChunker) as tokens are decoded.
+        
+        The caller can start TTS on the first sentence before decoding ends.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            max_tokens: Maximum response length
+            temperature: Sampling temperature
+            conversation_id: Reuse and keep this conversation's KV cache
+            
+        Yields:
+            Text chunks ending at sentence or clause breaks, then any trailing text
+        """
+        if not self.is_ready():
+            self.initialize()
+        
+        text = self.tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        
+        chunker = SentenceChunker(
+            settings.stream_first_chunk_max_words,
+            settings.stream_chunk_min_words,
+            settings.stream_chunk_max_words
+        )
+        system_prompt = messages[0]["content"] if messages and messages[0]["role"] == "system" else None
+        for piece in self._stream_text(text, max_tokens, temperature, conversation_id, system_prompt):
+            yield from chunker.feed(piece)
+        
+        rest = chunker.flush()
+        if rest:
+            yield rest
+    
     def cleanup(self):
         """Cleanup model resources"""
-        if self.model:
+        if self.model or self.runner:
             del self.model
             del self.tokenizer
+            self.runner = None
+            self._kv_caches.clear()
             self._initialized = False
             logger.info("LLM cleaned up")
 
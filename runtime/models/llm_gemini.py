@@ -2,14 +2,41 @@
 Gemini LLM Client for Conversational Responses
 Uses Google Cloud Vertex AI Gemini 2.0 Flash API
 """
+import hashlib
 import logging
-from typing import Optional, List, Dict
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Optional, List, Dict
 import google.generativeai as genai
-from vertexai.preview.generative_models import GenerativeModel, ChatSession
+from vertexai.preview.generative_models import GenerativeModel, ChatSession, Content, GenerationConfig, Part
 import vertexai
 
+from config import settings
+from utils.language import SentenceChunker
+
 logger = logging.getLogger(__name__)
 
+# Conversation turns (user + model message pairs) kept in the chat session
+MAX_HISTORY_TURNS = 10
+
+# Chat sessions kept for conversations that may continue (least recently used evicted)
+MAX_CHAT_SESSIONS = 32
+
+# (project, location, model, system instruction) -> GenerativeModel. Each model
+# lazily opens its own gRPC channel, so clients with the same configuration
+# share one model (chat sessions stay per client)
+_models: Dict[tuple, GenerativeModel] = {}
+_models_lock = threading.Lock()
+
+
+def _history_key(turns: List[Dict[str, str]]) -> str:
+    """Digest of the {"role", "content"} turns a chat session holds"""
+    digest = hashlib.sha1()
+    for msg in turns:
+        role = "user" if msg["role"] == "user" else "model"
+        digest.update(f"{role}\0{msg['content'].strip()}\0".encode())
+    return digest.hexdigest()
+
 
 class GeminiClient:
     """
@@ -35,7 +62,12 @@ class GeminiClient:
         self.project_id = project_id
         self.location = location
         self.model = None
-        self.chat_session: Optional[ChatSession] = None
+        # _history_key(turns) -> idle chat session holding those turns. A session
+        # is removed while a turn runs on it, so concurrent turns never share one
+        self._chats: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._chats_lock = threading.Lock()
+        # (max_tokens, temperature) -> GenerationConfig, built once per combination
+        self._gen_configs: Dict[tuple, GenerationConfig] = {}
         self._initialized = False
         
         # System prompt for concise conversational responses
@@ -52,14 +84,18 @@ Avoid long explanations unless specifically asked."""
         logger.info(f"Initializing Gemini client: {self.model_name}")
         
         try:
-            # Initialize Vertex AI
-            vertexai.init(project=self.project_id, location=self.location)
+            # Initialize Vertex AI (gRPC: one long-lived HTTP/2 channel instead of a connection per call)
+            vertexai.init(project=self.project_id, location=self.location, api_transport="grpc")
             
-            # Create generative model with system instruction
-            self.model = GenerativeModel(
-                self.model_name,
-                system_instruction=[self.system_instruction]
-            )
+            # Create generative model with system instruction, or reuse one (and its channel)
+            key = (self.project_id, self.location, self.model_name, self.system_instruction)
+            with _models_lock:
+                self.model = _models.get(key)
+                if self.model is None:
+                    self.model = _models[key] = GenerativeModel(
+                        self.model_name,
+                        system_instruction=[self.system_instruction]
+                    )
             
             self._initialized = True
             logger.info(f"Gemini client initialized: {self.model_name}")
@@ -72,6 +108,56 @@ Avoid long explanations unless specifically asked."""
         """Check if client is initialized"""
         return self._initialized
     
+    def _generation_config(self, max_tokens: int, temperature: float) -> GenerationConfig:
+        """Shared GenerationConfig for these parameters (callers use a handful of combinations)"""
+        key = (max_tokens, temperature)
+        config = self._gen_configs.get(key)
+        if config is None:
+            config = GenerationConfig(max_output_tokens=max_tokens, temperature=temperature, top_p=0.95)
+            self._gen_configs[key] = config
+        return config
+    
+    def _chat_for(self, conversation_history: List[Dict[str, str]]) -> ChatSession:
+        """
+        Chat session holding this conversation's context.
+        
+        Gemini keeps the turns in the session, so a caller continuing a
+        conversation only sends its new prompt. Sessions are looked up by the
+        contents of the history the caller sends; when none matches (first
+        turn, edited history, evicted), a new session is seeded from its last
+        MAX_HISTORY_TURNS turns. The session is taken out of the cache until
+        _end_turn returns it.
+        """
+        turns = conversation_history[-2 * MAX_HISTORY_TURNS:]
+        with self._chats_lock:
+            chat = self._chats.pop(_history_key(turns), None)
+        if chat is None:
+            history = [
+                Content(role="user" if msg["role"] == "user" else "model", parts=[Part.from_text(msg["content"])])
+                for msg in turns
+            ]
+            chat = self.model.start_chat(history=history)
+        return chat
+    
+    def _end_turn(
+        self,
+        chat: ChatSession,
+        conversation_history: List[Dict[str, str]],
+        prompt: str,
+        reply: str
+    ):
+        """Trim the session to MAX_HISTORY_TURNS and cache it under the history that continues it"""
+        del chat.history[:-2 * MAX_HISTORY_TURNS]
+        # The caller appends this prompt and the reply before the next turn
+        turns = conversation_history + [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": reply}
+        ]
+        with self._chats_lock:
+            self._chats[_history_key(turns[-2 * MAX_HISTORY_TURNS:])] = chat
+            while len(self._chats) > MAX_CHAT_SESSIONS:
+                self._chats.popitem(last=False)
+    
     def generate_response(
         self,
         prompt: str,
@@ -95,17 +181,9 @@ Avoid long explanations unless specifically asked."""
         try:
             logger.info(f"Generating Gemini response for: '{prompt[:50]}...'")
             
-            # Configure generation parameters
-            generation_config = {
-                "max_output_tokens": max_tokens,
-                "temperature": temperature,
-                "top_p": 0.95,
-            }
-            
-            # Generate response
             response = self.model.generate_content(
                 prompt,
-                generation_config=generation_config
+                generation_config=self._generation_config(max_tokens, temperature)
             )
             
             response_text = response.text.strip()
@@ -143,37 +221,14 @@ Avoid long explanations unless specifically asked."""
         try:
             logger.info(f"Generating Gemini response with history ({len(conversation_history)} turns)")
             
-            # Start or continue chat session
-            if self.chat_session is None:
-                self.chat_session = self.model.start_chat()
-            
-            # Build conversation history if this is a new session
-            if len(conversation_history) > 0:
-                # Gemini tracks history automatically in chat sessions
-                # For now, just include the most recent context in the prompt
-                recent_context = conversation_history[-2:] if len(conversation_history) >= 2 else conversation_history
-                context_text = "\n".join([
-                    f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
-                    for msg in recent_context
-                ])
-                full_prompt = f"Previous context:\n{context_text}\n\nUser: {prompt}"
-            else:
-                full_prompt = prompt
-            
-            # Configure generation
-            generation_config = {
-                "max_output_tokens": max_tokens,
-                "temperature": temperature,
-                "top_p": 0.95,
-            }
-            
-            # Send message to chat
-            response = self.chat_session.send_message(
-                full_prompt,
-                generation_config=generation_config
+            chat = self._chat_for(conversation_history)
+            response = chat.send_message(
+                prompt,
+                generation_config=self._generation_config(max_tokens, temperature)
             )
             
             response_text = response.text.strip()
+            self._end_turn(chat, conversation_history, prompt, response_text)
             logger.info(f"Gemini response generated: {len(response_text)} chars")
             
             return response_text
@@ -183,14 +238,141 @@ Avoid long explanations unless specifically asked."""
             # Fallback
             return f"I heard you say: {prompt}"
     
+    async def generate_response_async(
+        self,
+        prompt: str,
+        max_tokens: int = 150,
+        temperature: float = 0.7
+    ) -> str:
+        """
+        Async generate_response: awaits the Gemini round trip on the event loop,
+        so other requests (TTS, video generation) proceed meanwhile.
+        """
+        if not self.is_ready():
+            self.initialize()
+        
+        try:
+            logger.info(f"Generating Gemini response for: '{prompt[:50]}...'")
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=self._generation_config(max_tokens, temperature)
+            )
+            response_text = response.text.strip()
+            logger.info(f"Gemini response generated: {len(response_text)} chars")
+            return response_text
+            
+        except Exception as e:
+            logger.error(f"Gemini generation failed: {e}")
+            return f"I heard you say: {prompt}"
+    
+    async def generate_with_history_async(
+        self,
+        prompt: str,
+        conversation_history: List[Dict[str, str]],
+        max_tokens: int = 150,
+        temperature: float = 0.7
+    ) -> str:
+        """Async generate_with_history on the conversation's chat session"""
+        if not self.is_ready():
+            self.initialize()
+        
+        try:
+            logger.info(f"Generating Gemini response with history ({len(conversation_history)} turns)")
+            chat = self._chat_for(conversation_history)
+            response = await chat.send_message_async(
+                prompt,
+                generation_config=self._generation_config(max_tokens, temperature)
+            )
+            response_text = response.text.strip()
+            self._end_turn(chat, conversation_history, prompt, response_text)
+            logger.info(f"Gemini response generated: {len(response_text)} chars")
+            return response_text
+            
+        except Exception as e:
+            logger.error(f"Gemini generation with history failed: {e}")
+            return f"I heard you say: {prompt}"
+    
+    async def stream_response(
+        self,
+        prompt: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        max_tokens: int = 150,
+        temperature: float = 0.7
+    ) -> AsyncIterator[str]:
+        """
+        Stream the response chunk by chunk (see SentenceChunker) as Gemini generates it.
+        
+        Lets callers start TTS on the first sentence while the rest of the
+        reply is still being generated.
+        
+        Args:
+            prompt: User input text
+            conversation_history: Optional {"role", "content"} turns (uses the chat session)
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            
+        Yields:
+            Text chunks ending at sentence or clause breaks, then any trailing text
+        """
+        if not self.is_ready():
+            self.initialize()
+        
+        config = self._generation_config(max_tokens, temperature)
+        chunker = SentenceChunker(
+            settings.stream_first_chunk_max_words,
+            settings.stream_chunk_min_words,
+            settings.stream_chunk_max_words
+        )
+        emitted = False
+        fallback = ""
+        parts = []
+        try:
+            logger.info(f"Streaming Gemini response for: '{prompt[:50]}...'")
+            if conversation_history:
+                chat = self._chat_for(conversation_history)
+                responses = await chat.send_message_async(
+                    prompt,
+                    generation_config=config,
+                    stream=True
+                )
+            else:
+                responses = await self.model.generate_content_async(
+                    prompt,
+                    generation_config=config,
+                    stream=True
+                )
+            
+            async for response in responses:
+                try:
+                    text = response.text
+                except ValueError:  # Chunk without text (e.g. only a finish reason)
+                    continue
+                parts.append(text)
+                for chunk in chunker.feed(text):
+                    emitted = True
+                    yield chunk
+            
+            if conversation_history:
+                self._end_turn(chat, conversation_history, prompt, "".join(parts).strip())
+                    
+        except Exception as e:
+            logger.error(f"Gemini streaming failed: {e}")
+            if not emitted:
+                fallback = f"I heard you say: {prompt}"
+        
+        rest = chunker.flush() or fallback
+        if rest:
+            yield rest
+    
     def reset_chat(self):
-        """Reset the chat session"""
-        self.chat_session = None
-        logger.info("Gemini chat session reset")
+        """Drop all cached chat sessions"""
+        with self._chats_lock:
+            self._chats.clear()
+        logger.info("Gemini chat sessions reset")
     
     def cleanup(self):
         """Cleanup resources"""
-        self.chat_session = None
+        self.reset_chat()
         self._initialized = False
         logger.info("Gemini client cleaned up")
 
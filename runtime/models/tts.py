@@ -2,10 +2,15 @@
 Text-to-Speech Model Handler
 Manages XTTS-v2 multilingual TTS with voice cloning
 """
+import io
 import os
 import time
 import torch
 import logging
+import numpy as np
+import soundfile as sf
+from collections import OrderedDict
+from contextlib import ExitStack
 from typing import Optional, Tuple
 from pathlib import Path
 
@@ -25,13 +30,18 @@ from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Silence XTTS's Synthesizer inserts between sentences (samples at 24 kHz)
+SENTENCE_GAP_SAMPLES = 10000
+
 
 class XTTSModel:
     """XTTS-v2 TTS model wrapper"""
     
     def __init__(self):
         self.model: Optional[TTS] = None
-        self.device = settings.device
+        self.device = settings.resolved_device
+        # (path, mtime, size) of a reference wav -> (gpt_cond_latent, speaker_embedding)
+        self._speaker_latents: OrderedDict = OrderedDict()
         self._initialized = False
         
     def initialize(self):
@@ -56,7 +66,7 @@ class XTTSModel:
             
             self._initialized = True
             elapsed = time.time() - start_time
-            logger.info(f"XTTS-v2 model loaded in {elapsed:.2f}s")
+            logger.info(f"XTTS-v2 model loaded in {elapsed:.2f}s (backend: {self.backend})")
             
         except Exception as e:
             logger.error(f"Failed to load XTTS-v2 model: {e}")
@@ -66,6 +76,151 @@ class XTTSModel:
         """Check if model is initialized"""
         return self._initialized and self.model is not None
     
+    @property
+    def backend(self) -> str:
+        """Effective backend; FP16 autocast only applies on CUDA"""
+        if settings.xtts_backend == "pytorch_fp16" and self.device == "cuda":
+            return "pytorch_fp16"
+        return "pytorch"
+    
+    def _inference_context(self) -> ExitStack:
+        """No-autograd context, plus FP16 autocast for the GPT decoder and vocoder on CUDA"""
+        stack = ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if self.backend == "pytorch_fp16":
+            stack.enter_context(torch.autocast(device_type="cuda", dtype=torch.float16))
+        return stack
+    
+    def _resolve_voice(self, language: str, speaker_wav: Optional[str]) -> tuple[str, Optional[str]]:
+        """Map the language code and pick a default reference sample if none given"""
+        # Map language codes
+        lang_map = {
+            "en": "en",
+            "zh": "zh-cn",
+            "zh-cn": "zh-cn",
+            "es": "es"
+        }
+        lang_code = lang_map.get(language, "en")
+        
+        # If no speaker wav provided, try to find default reference
+        if not speaker_wav:
+            # Look for language-specific reference sample
+            ref_samples_dir = settings.voice_samples_dir
+            if os.path.exists(ref_samples_dir):
+                # Try to find language-specific sample
+                possible_files = [
+                    f"bruce_{lang_code.split('-')[0]}_sample.wav",
+                    f"bruce_{lang_code}_sample.wav",
+                    "bruce_en_sample.wav"  # Fallback to English
+                ]
+                for filename in possible_files:
+                    candidate = os.path.join(ref_samples_dir, filename)
+                    if os.path.exists(candidate):
+                        speaker_wav = candidate
+                        logger.info(f"Using reference sample: {filename}")
+                        break
+        
+        return lang_code, speaker_wav
+    
+    def _conditioning_latents(self, speaker_wav: str, max_entries: int = 8) -> tuple:
+        """
+        XTTS speaker conditioning (GPT latent + speaker embedding) for a reference wav.
+        
+        TTS.tts() recomputes these from the wav for every sentence; they only
+        depend on the reference, so they are cached by its (path, mtime, size).
+        """
+        st = os.stat(speaker_wav)
+        key = (os.path.realpath(speaker_wav), st.st_mtime_ns, st.st_size)
+        latents = self._speaker_latents.get(key)
+        if latents is not None:
+            self._speaker_latents.move_to_end(key)
+            return latents
+        
+        xtts = self.model.synthesizer.tts_model
+        with torch.inference_mode():
+            latents = xtts.get_conditioning_latents(
+                audio_path=[speaker_wav],
+                gpt_cond_len=xtts.config.gpt_cond_len,
+                gpt_cond_chunk_len=xtts.config.gpt_cond_chunk_len,
+                max_ref_length=xtts.config.max_ref_len,
+                sound_norm_refs=xtts.config.sound_norm_refs
+            )
+        self._speaker_latents[key] = latents
+        if len(self._speaker_latents) > max_entries:
+            self._speaker_latents.popitem(last=False)
+        logger.info(f"Cached XTTS conditioning latents for {os.path.basename(speaker_wav)}")
+        return latents
+    
+    def _generate_wav(self, text: str, lang_code: str, speaker_wav: str) -> np.ndarray:
+        """
+        Synthesize text sentence by sentence with cached speaker latents.
+        
+        Same output as TTS.tts_to_file(speaker_wav=..., split_sentences=True):
+        the Synthesizer's sentence split, the model config's sampling parameters,
+        silence between sentences and save_wav's peak normalization.
+        """
+        gpt_cond_latent, speaker_embedding = self._conditioning_latents(speaker_wav)
+        xtts = self.model.synthesizer.tts_model
+        config = xtts.config
+        
+        wavs = []
+        with self._inference_context():
+            for sentence in self.model.synthesizer.split_into_sentences(text):
+                out = xtts.inference(
+                    sentence,
+                    lang_code,
+                    gpt_cond_latent,
+                    speaker_embedding,
+                    temperature=config.temperature,
+                    length_penalty=config.length_penalty,
+                    repetition_penalty=config.repetition_penalty,
+                    top_k=config.top_k,
+                    top_p=config.top_p
+                )
+                wav = out["wav"]
+                if torch.is_tensor(wav):
+                    wav = wav.float().cpu().numpy()
+                wavs.append(np.asarray(wav, dtype=np.float32).reshape(-1))
+                wavs.append(np.zeros(SENTENCE_GAP_SAMPLES, dtype=np.float32))
+        
+        if not wavs:
+            return np.zeros(0, dtype=np.float32)
+        wav = np.concatenate(wavs)
+        # save_wav scales the peak to full scale (32767 / max(0.01, max|wav|))
+        return wav / max(0.01, float(np.abs(wav).max()))
+    
+    def synthesize_bytes(
+        self,
+        text: str,
+        language: str = "en",
+        speaker_wav: Optional[str] = None
+    ) -> tuple[bytes, float]:
+        """
+        Synthesize speech to in-memory WAV bytes (no file written).
+        
+        For in-process handoff to the avatar stage.
+        
+        Returns:
+            Tuple of (wav_bytes, audio_duration_s)
+        """
+        if not self.is_ready():
+            self.initialize()
+        
+        start_time = time.time()
+        lang_code, speaker_wav = self._resolve_voice(language, speaker_wav)
+        if not (speaker_wav and os.path.exists(speaker_wav)):
+            raise ValueError("speaker_wav is required for XTTS voice cloning")
+        
+        wav = self._generate_wav(text, lang_code, speaker_wav)
+        sample_rate = self.model.synthesizer.output_sample_rate
+        
+        buf = io.BytesIO()
+        sf.write(buf, wav, sample_rate, format='WAV', subtype='PCM_16')
+        audio_duration_s = len(wav) / sample_rate
+        
+        logger.info(f"TTS (in-memory) completed in {(time.time() - start_time) * 1000:.0f}ms, audio duration: {audio_duration_s:.2f}s")
+        return buf.getvalue(), audio_duration_s
+    
     def synthesize(
         self,
         text: str,
@@ -91,32 +246,7 @@ class XTTSModel:
         start_time = time.time()
         
         try:
-            # Map language codes
-            lang_map = {
-                "en": "en",
-                "zh": "zh-cn",
-                "zh-cn": "zh-cn",
-                "es": "es"
-            }
-            lang_code = lang_map.get(language, "en")
-            
-            # If no speaker wav provided, try to find default reference
-            if not speaker_wav:
-                # Look for language-specific reference sample
-                ref_samples_dir = settings.voice_samples_dir
-                if os.path.exists(ref_samples_dir):
-                    # Try to find language-specific sample
-                    possible_files = [
-                        f"bruce_{lang_code.split('-')[0]}_sample.wav",
-                        f"bruce_{lang_code}_sample.wav",
-                        "bruce_en_sample.wav"  # Fallback to English
-                    ]
-                    for filename in possible_files:
-                        candidate = os.path.join(ref_samples_dir, filename)
-                        if os.path.exists(candidate):
-                            speaker_wav = candidate
-                            logger.info(f"Using reference sample: {filename}")
-                            break
+            lang_code, speaker_wav = self._resolve_voice(language, speaker_wav)
             
             # Generate output path if not provided
             if not output_path:
@@ -128,28 +258,18 @@ class XTTSModel:
             
             logger.info(f"Synthesizing: lang={lang_code}, text_len={len(text)}, speaker_wav={speaker_wav}")
             
-            # Synthesize with XTTS-v2
-            # When using speaker_wav for voice cloning, XTTS checks for speaker param first
-            # We must explicitly pass speaker=None when using speaker_wav
+            # Synthesize with XTTS-v2 (voice cloning from the cached reference latents)
             if speaker_wav and os.path.exists(speaker_wav):
-                self.model.tts_to_file(
-                    text=text,
-                    file_path=output_path,
-                    speaker=None,
-                    speaker_wav=speaker_wav,
-                    language=lang_code,
-                    split_sentences=True
-                )
+                wav = self._generate_wav(text, lang_code, speaker_wav)
             else:
                 # No voice cloning - would need a speaker name
                 raise ValueError("speaker_wav is required for XTTS voice cloning")
             
-            duration_ms = (time.time() - start_time) * 1000
+            sample_rate = self.model.synthesizer.output_sample_rate
+            sf.write(output_path, wav, sample_rate, subtype='PCM_16')
             
-            # Get actual audio duration
-            import soundfile as sf
-            audio_data, sample_rate = sf.read(output_path)
-            audio_duration_s = len(audio_data) / sample_rate
+            duration_ms = (time.time() - start_time) * 1000
+            audio_duration_s = len(wav) / sample_rate
             
             logger.info(f"TTS completed in {duration_ms:.0f}ms, audio duration: {audio_duration_s:.2f}s")
             
@@ -163,6 +283,7 @@ class XTTSModel:
         """Cleanup model resources"""
         if self.model:
             del self.model
+            self._speaker_latents.clear()
             if self.device == "cuda":
                 torch.cuda.empty_cache()
             self._initialized = False
@@ -2,12 +2,20 @@
 TTS Client for GPU Service
 Calls external GPU acceleration service instead of running TTS in Docker
 """
+import asyncio
+import hashlib
 import logging
 import os
+import shutil
+import threading
 import time
+import aiofiles
 import httpx
+import soundfile as sf
+from collections import OrderedDict
 from typing import Optional
 from config import settings
+from utils.files import file_sha256
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +26,33 @@ class XTTSClient:
     def __init__(self, service_url: Optional[str] = None):
         self.service_url = service_url or settings.gpu_service_url
         self._initialized = False
-        self._client = httpx.AsyncClient(timeout=300.0)
+        self._init_lock: Optional[asyncio.Lock] = None
+        # One pooled client per process so synthesize() reuses warm connections
+        # instead of reconnecting per utterance; transient reconnects are retried.
+        # Limits go on the transport: AsyncClient ignores limits= when given one
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(300.0, connect=5.0),
+            transport=httpx.AsyncHTTPTransport(
+                retries=2,
+                limits=httpx.Limits(max_keepalive_connections=16, max_connections=32, keepalive_expiry=300)
+            )
+        )
+        # Content-addressed cache of synthesized audio: key -> file in tts_cache_dir,
+        # least recently used first (loaded from disk on first use)
+        self._cache_index: Optional[OrderedDict] = None
+        self._cache_lock = threading.Lock()  # Index is used from worker threads
+        # Voice reference samples: filename -> path, plus the directory mtime it was built at
+        self._ref_index: dict = {}
+        self._ref_index_mtime: Optional[int] = None
         
+    def _check_health(self, health_data: dict) -> str:
+        """Validate a /health payload; returns the service device"""
+        if not health_data.get("models", {}).get("tts", False):
+            raise RuntimeError("TTS model not ready on GPU service")
+        return health_data.get("device", "unknown")
+    
     def initialize(self):
-        """Check if GPU service is available"""
+        """Check if GPU service is available (blocking; for startup code)"""
         if self._initialized:
             return
             
@@ -29,17 +60,11 @@ class XTTSClient:
         start_time = time.time()
         
         try:
-            # Check health endpoint (sync for initialization)
+            # Check health endpoint
             with httpx.Client(timeout=5.0) as sync_client:
                 response = sync_client.get(f"{self.service_url}/health")
                 response.raise_for_status()
-            
-                health_data = response.json()
-                device = health_data.get("device", "unknown")
-                tts_ready = health_data.get("models", {}).get("tts", False)
-            
-                if not tts_ready:
-                    raise RuntimeError("TTS model not ready on GPU service")
+                device = self._check_health(response.json())
             
             self._initialized = True
             elapsed = time.time() - start_time
@@ -49,10 +74,96 @@ class XTTSClient:
             logger.error(f"Failed to connect to GPU service: {e}")
             raise RuntimeError(f"GPU service unavailable at {self.service_url}") from e
     
+    async def ensure_ready(self):
+        """Async health probe on the pooled client, run at most once"""
+        if self._initialized:
+            return
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        
+        async with self._init_lock:
+            if self._initialized:
+                return
+            try:
+                response = await self._client.get(f"{self.service_url}/health", timeout=5.0)
+                response.raise_for_status()
+                device = self._check_health(response.json())
+            except httpx.HTTPError as e:
+                logger.error(f"Failed to connect to GPU service: {e}")
+                raise RuntimeError(f"GPU service unavailable at {self.service_url}") from e
+            
+            self._initialized = True
+            logger.info(f"Connected to GPU service (device={device})")
+    
     def is_ready(self) -> bool:
         """Check if service is initialized"""
         return self._initialized
     
+    def _reference_samples(self) -> dict:
+        """
+        Filename -> path of the voice reference samples.
+        
+        Built with one os.scandir and rebuilt only when the directory's mtime
+        changes (a file was added, removed or renamed), so a lookup costs a
+        single stat instead of one per candidate filename.
+        """
+        try:
+            mtime = os.stat(settings.voice_samples_dir).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if mtime != self._ref_index_mtime:
+            self._ref_index = {
+                entry.name: entry.path
+                for entry in os.scandir(settings.voice_samples_dir) if entry.is_file()
+            }
+            self._ref_index_mtime = mtime
+        return self._ref_index
+    
+    @staticmethod
+    def _cache_key(text: str, lang_code: str, speaker_wav: Optional[str]) -> str:
+        """Hash of (text, language, speaker audio content)"""
+        speaker_hash = file_sha256(speaker_wav) if speaker_wav else ""
+        return hashlib.blake2b(f"{text}|{lang_code}|{speaker_hash}".encode(), digest_size=20).hexdigest()
+    
+    def _cache_lookup(self, key: str, output_path: str) -> Optional[float]:
+        """
+        Copy a cached utterance to output_path.
+        
+        Returns:
+            Audio duration in seconds, or None on a miss
+        """
+        with self._cache_lock:
+            if self._cache_index is None:
+                os.makedirs(settings.tts_cache_dir, exist_ok=True)
+                entries = sorted(os.scandir(settings.tts_cache_dir), key=lambda e: e.stat().st_mtime)
+                self._cache_index = OrderedDict((e.name[:-4], e.path) for e in entries if e.name.endswith(".wav"))
+            
+            cached_path = self._cache_index.get(key)
+            if cached_path is None or not os.path.exists(cached_path):
+                return None
+            self._cache_index.move_to_end(key)
+        
+        # A copy, not a hard link: callers may overwrite output_path in place later
+        shutil.copyfile(cached_path, output_path)
+        return sf.info(cached_path).duration
+    
+    def _cache_store(self, key: str, audio_path: str):
+        """Add a synthesized file to the cache, evicting the least recently used entries"""
+        cached_path = os.path.join(settings.tts_cache_dir, f"{key}.wav")
+        # Write under a temp name so a concurrent lookup never sees a partial file
+        tmp_path = f"{cached_path}.{threading.get_ident()}.tmp"
+        shutil.copyfile(audio_path, tmp_path)
+        os.replace(tmp_path, cached_path)
+        with self._cache_lock:
+            self._cache_index[key] = cached_path
+            self._cache_index.move_to_end(key)
+            evicted = []
+            while len(self._cache_index) > settings.tts_cache_max_entries:
+                evicted.append(self._cache_index.popitem(last=False)[1])
+        for path in evicted:
+            if os.path.exists(path):
+                os.unlink(path)
+    
     async def synthesize(
         self,
         text: str,
@@ -73,7 +184,7 @@ class XTTSClient:
             Tuple of (output_path, generation_time_ms, audio_duration_s)
         """
         if not self.is_ready():
-            self.initialize()
+            await self.ensure_ready()
         
         start_time = time.time()
         
@@ -89,23 +200,19 @@ class XTTSClient:
             
             # If no speaker wav provided, try to find default reference
             if not speaker_wav:
-                # Look for language-specific reference sample
-                ref_samples_dir = settings.voice_samples_dir
-                if os.path.exists(ref_samples_dir):
-                    # Try to find language-specific sample
-                    possible_files = [
-                        f"bruce_{lang_code.split('-')[0]}_sample.wav",
-                        f"bruce_{lang_code}_sample.wav",
-                        "bruce_en_sample.wav"  # Fallback to English
-                    ]
-                    for filename in possible_files:
-                        candidate = os.path.join(ref_samples_dir, filename)
-                        if os.path.exists(candidate):
-                            speaker_wav = candidate
-                            logger.info(f"Using reference sample: {filename}")
-                            break
-            
-            # Both containers share the same /app/assets mount, so keep the Docker path
+                # Look for language-specific reference sample, then fall back to English
+                ref_index = self._reference_samples()
+                possible_files = [
+                    f"bruce_{lang_code.split('-')[0]}_sample.wav",
+                    f"bruce_{lang_code}_sample.wav",
+                    "bruce_en_sample.wav"
+                ]
+                filename = next((f for f in possible_files if f in ref_index), None)
+                if filename:
+                    speaker_wav = ref_index[filename]
+                    logger.info(f"Using reference sample: {filename}")
+            
+            # speaker_wav is still read by path: both containers share the /app/assets mount
             if speaker_wav:
                 logger.info(f"Using speaker_wav path: {speaker_wav}")
             
@@ -117,36 +224,46 @@ class XTTSClient:
                     f"tts_output_{int(time.time() * 1000)}.wav"
                 )
             
+            # Repeated utterance (filler phrases etc.): skip the GPU service round trip
+            cache_key = await asyncio.to_thread(self._cache_key, text, lang_code, speaker_wav)
+            cached_duration = await asyncio.to_thread(self._cache_lookup, cache_key, output_path)
+            if cached_duration is not None:
+                total_time_ms = (time.time() - start_time) * 1000
+                logger.info(f"TTS cache hit in {total_time_ms:.0f}ms, audio: {cached_duration:.2f}s")
+                return output_path, total_time_ms, cached_duration
+            
             logger.info(f"Requesting TTS: lang={lang_code}, text_len={len(text)}")
             
-            # Call GPU service (ASYNC - doesn't block event loop!)
             payload = {
                 "text": text,
                 "language": lang_code,
-                "speaker_wav": speaker_wav,
-                "output_path": output_path
+                "speaker_wav": speaker_wav
             }
             
-            response = await self._client.post(
+            # WAV bytes come back in the response body and are written
+            # straight to output_path as they arrive
+            async with self._client.stream(
+                "POST",
                 f"{self.service_url}/tts/generate",
                 json=payload,
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            if not result.get("success"):
-                raise RuntimeError(f"TTS generation failed: {result.get('error')}")
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    try:
+                        error = response.json().get("detail")
+                    except ValueError:
+                        error = response.text
+                    raise RuntimeError(f"TTS generation failed: {error}")
+                
+                async with aiofiles.open(output_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(1 << 16):
+                        await f.write(chunk)
+                
+                generation_time_ms = float(response.headers.get("X-Generation-Time-Ms", 0))
+                audio_duration_s = float(response.headers.get("X-Audio-Duration", 0))
             
-            # Get the audio file from GPU service
-            remote_audio_path = result.get("audio_path")
-            generation_time_ms = result.get("generation_time_ms", 0)
-            audio_duration_s = result.get("duration_s", 0)
-            
-            # Both containers share the gpu-output volume, so we can use the path directly
-            # No need to copy since the file is already accessible
-            output_path = remote_audio_path
-            logger.info(f"Using audio path from GPU service: {output_path}")
+            logger.info(f"Received audio from GPU service: {output_path}")
+            await asyncio.to_thread(self._cache_store, cache_key, output_path)
             
             total_time_ms = (time.time() - start_time) * 1000
             
@@ -178,3 +295,11 @@ def get_xtts_client() -> XTTSClient:
     if _xtts_client is None:
         _xtts_client = XTTSClient()
     return _xtts_client
+
+
+async def close_xtts_client():
+    """Close the global client's connection pool, if it was created"""
+    global _xtts_client
+    if _xtts_client is not None:
+        await _xtts_client.cleanup()
+        _xtts_client = None
@@ -4,6 +4,9 @@ Chains Audio → ASR → LLM → TTS → Video for interactive conversations
 """
 
 import logging
+import os
+import shutil
+import threading
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 import time
@@ -12,7 +15,8 @@ import asyncio
 from models.asr import ASRModel
 from models.llm import LLMModel
 from models.llm_gemini import GeminiClient
-from pipelines.phase1_script import Phase1Pipeline
+from pipelines.phase1_script import Phase1Pipeline, get_phase1_pipeline
+from utils.video import concat_videos
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -57,6 +61,8 @@ class ConversationPipeline:
         self.llm_model: Optional[LLMModel] = None
         self.gemini_client: Optional[GeminiClient] = None
         self.phase1_pipeline: Optional[Phase1Pipeline] = None  # For TTS + Video
+        # Serializes initialize() so concurrent callers don't load models twice
+        self._init_lock = threading.Lock()
 
         # System prompt for conversational LLM
         self.system_prompt = """You are Bruce, a helpful and friendly AI assistant. 
@@ -67,14 +73,26 @@ Be natural, warm, and engaging in your communication style."""
 
     def initialize(self):
         """Load all models into memory."""
-        start_time = time.time()
+        with self._init_lock:
+            self._load_models()
+
+    def _load_models(self):
+        """Load the models not loaded yet (caller holds _init_lock)."""
+        start_time = time.perf_counter()
         logger.info("Initializing conversation pipeline models...")
 
+        # Leave CUDA memory headroom for other processes and allocator fragmentation
+        # across turns (local LLM)
+        if self.device == "cuda":
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.set_per_process_memory_fraction(0.9)
+
         # Initialize ASR
         if self.asr_model is None:
             logger.info("Loading ASR model (Faster-Whisper)...")
-            # Use int8 for CPU (float16 requires GPU), float16 for CUDA
-            compute_type = "int8" if self.device == "cpu" else "float16"
+            # int8 on CPU; int8 weights with float16 activations on CUDA
+            compute_type = "int8" if self.device == "cpu" else "int8_float16"
             self.asr_model = ASRModel(device=self.device, compute_type=compute_type)
             self.asr_model.initialize()
 
@@ -99,13 +117,15 @@ Be natural, warm, and engaging in your communication style."""
                     logger.info("Loading LLM model (Qwen-2.5-7B)...")
                     self.llm_model = LLMModel()
                     self.llm_model.initialize()
+                    # Prefills and keeps the system prompt's KV cache before the first turn
+                    self.llm_model.generate_response("Hi", system_prompt=self.system_prompt, max_tokens=1)
                 except Exception as e:
                     logger.warning(f"Failed to load LLM, will use fallback responses: {e}")
                     self.llm_model = None
 
         # Note: TTS and Video models are loaded on-demand by phase1_script.run_pipeline()
 
-        elapsed = time.time() - start_time
+        elapsed = time.perf_counter() - start_time
         logger.info(f"All models initialized in {elapsed:.2f}s")
 
     def transcribe(self, audio_path: str, language: str = "en") -> Dict[str, Any]:
@@ -122,45 +142,32 @@ Be natural, warm, and engaging in your communication style."""
         if self.asr_model is None:
             raise RuntimeError("Pipeline not initialized. Call initialize() first.")
 
-        start_time = time.time()
+        start_time = time.perf_counter()
         logger.info(f"Transcribing audio: {audio_path}")
 
-        # ASR model returns (text, language, confidence) tuple
-        transcribe_result = self.asr_model.transcribe(audio_path, language=language)
-        
-        # Handle both tuple formats: (text, language, confidence) or (text, metadata)
-        if isinstance(transcribe_result, tuple):
-            if len(transcribe_result) == 3:
-                # Simple format: (text, language, confidence)
-                text, detected_lang, confidence = transcribe_result
-                metadata = {
-                    "language": detected_lang,
-                    "language_probability": confidence
-                }
-            elif len(transcribe_result) == 2:
-                # Detailed format: (text, metadata_dict)
-                text, metadata = transcribe_result
-            else:
-                raise ValueError(f"Unexpected transcribe result format: {len(transcribe_result)} values")
-        else:
-            raise TypeError(f"Expected tuple from ASR transcribe, got {type(transcribe_result)}")
+        text, detected_lang, confidence = self.asr_model.transcribe(audio_path, language=language)
+        metadata = {
+            "language": detected_lang,
+            "language_probability": confidence
+        }
         
         # Build result dict
         result = {
             "text": text,
             "language": metadata.get("language", language),
-            "transcribe_time": time.time() - start_time,
+            "transcribe_time": time.perf_counter() - start_time,
             "metadata": metadata
         }
 
         logger.info(f"Transcription: '{result['text'][:100]}...' ({result['transcribe_time']:.2f}s)")
         return result
 
-    def generate_response(
+    async def generate_response(
         self,
         user_message: str,
         conversation_history: Optional[List[Dict[str, str]]] = None,
         max_tokens: int = 150,
+        conversation_id: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Generate LLM response to user message.
@@ -169,11 +176,13 @@ Be natural, warm, and engaging in your communication style."""
             user_message: User's input text
             conversation_history: Optional list of {'role': 'user'/'assistant', 'content': '...'}
             max_tokens: Maximum response length
+            conversation_id: Stable id of the conversation; the local LLM keeps its
+                KV cache between turns so only the new turn is prefilled
 
         Returns:
             Dict with 'response' text and timing info
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         # Check which LLM to use (Gemini or local)
         llm_available = self.gemini_client or self.llm_model
@@ -184,7 +193,7 @@ Be natural, warm, and engaging in your communication style."""
             response = user_message
             result = {
                 "response": response,
-                "llm_time": time.time() - start_time,
+                "llm_time": time.perf_counter() - start_time,
                 "fallback": True,
             }
             return result
@@ -194,39 +203,52 @@ Be natural, warm, and engaging in your communication style."""
         # Use Gemini if available, otherwise use local Qwen
         if self.gemini_client:
             if conversation_history:
-                response = self.gemini_client.generate_with_history(
+                response = await self.gemini_client.generate_with_history_async(
                     prompt=user_message,
                     conversation_history=conversation_history,
                     max_tokens=max_tokens,
                 )
             else:
-                response = self.gemini_client.generate_response(
+                response = await self.gemini_client.generate_response_async(
                     prompt=user_message,
                     max_tokens=max_tokens,
                 )
         else:
-            # Use local LLM
+            # Use local LLM (blocking; off the event loop)
             if conversation_history:
-                response = self.llm_model.generate_with_history(
-                    messages=conversation_history,
+                response = await asyncio.to_thread(
+                    self.llm_model.generate_with_history,
+                    messages=conversation_history + [{"role": "user", "content": user_message}],
                     system_prompt=self.system_prompt,
-                    max_new_tokens=max_tokens,
+                    max_tokens=max_tokens,
+                    conversation_id=conversation_id,
                 )
             else:
-                response = self.llm_model.generate_response(
+                response = await asyncio.to_thread(
+                    self.llm_model.generate_response,
                     prompt=user_message,
-                system_prompt=self.system_prompt,
-                max_new_tokens=max_tokens,
-            )
+                    system_prompt=self.system_prompt,
+                    max_tokens=max_tokens,
+                    conversation_id=conversation_id,
+                )
 
         result = {
             "response": response,
-            "llm_time": time.time() - start_time,
+            "llm_time": time.perf_counter() - start_time,
         }
 
         logger.info(f"LLM response: '{response[:100]}...' ({result['llm_time']:.2f}s)")
         return result
 
+    async def warm_references(self):
+        """Precompute the TTS and avatar caches for this pipeline's reference voice and image"""
+        if self.phase1_pipeline is None:
+            self.phase1_pipeline = get_phase1_pipeline()
+        await self.phase1_pipeline.warm_references(
+            reference_image=self.reference_image,
+            voice_sample=self.reference_audio,
+        )
+
     async def generate_avatar_video(
         self,
         text: str,
@@ -244,13 +266,12 @@ Be natural, warm, and engaging in your communication style."""
         Returns:
             Dict with 'video_path', 'audio_path', and timing info
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         logger.info(f"Generating avatar video for: '{text[:100]}...'")
 
-        # Initialize Phase1Pipeline if needed
+        # Create Phase1Pipeline if needed (generate() initializes it off the event loop)
         if self.phase1_pipeline is None:
-            self.phase1_pipeline = Phase1Pipeline()
-            self.phase1_pipeline.initialize()
+            self.phase1_pipeline = get_phase1_pipeline()
 
         # Use phase1_script pipeline (TTS + Video) - it's async
         result = await self.phase1_pipeline.generate(
@@ -261,26 +282,135 @@ Be natural, warm, and engaging in your communication style."""
             job_id=output_name,
         )
 
-        result["total_generation_time"] = time.time() - start_time
+        result["total_generation_time"] = time.perf_counter() - start_time
         logger.info(f"Avatar video generated: {result.get('video_path')} ({result['total_generation_time']:.2f}s)")
 
         return result
 
+    async def _llm_stage(
+        self,
+        user_message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        text_q: asyncio.Queue,
+        max_tokens: int = 150,
+        conversation_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        LLM stage: put response sentences on text_q as they are generated, then None.
+
+        Returns:
+            Dict with 'response' text and timing info (like generate_response)
+        """
+        start_time = time.perf_counter()
+        sentences: List[str] = []
+        fallback = False
+        try:
+            if self.gemini_client:
+                async for sentence in self.gemini_client.stream_response(
+                    prompt=user_message,
+                    conversation_history=conversation_history,
+                    max_tokens=max_tokens,
+                ):
+                    sentences.append(sentence)
+                    text_q.put_nowait(sentence)
+            elif self.llm_model:
+                messages = [{"role": "system", "content": self.system_prompt}]
+                messages += conversation_history or []
+                messages.append({"role": "user", "content": user_message})
+                loop = asyncio.get_running_loop()
+
+                # Local decoding blocks; hand sentences back to the event loop as they complete
+                def decode():
+                    for sentence in self.llm_model.generate_stream(
+                        messages, max_tokens=max_tokens, conversation_id=conversation_id
+                    ):
+                        sentences.append(sentence)
+                        loop.call_soon_threadsafe(text_q.put_nowait, sentence)
+
+                await asyncio.to_thread(decode)
+            else:
+                logger.info(f"Using fallback response (no LLM available) for: '{user_message[:100]}...'")
+                fallback = True
+                sentences.append(user_message)
+                text_q.put_nowait(user_message)
+        finally:
+            text_q.put_nowait(None)
+
+        result = {
+            "response": " ".join(sentences),
+            "llm_time": time.perf_counter() - start_time,
+        }
+        if fallback:
+            result["fallback"] = True
+
+        logger.info(f"LLM response: '{result['response'][:100]}...' ({result['llm_time']:.2f}s)")
+        return result
+
+    async def _tts_stage(
+        self,
+        text_q: asyncio.Queue,
+        audio_q: asyncio.Queue,
+        output_name: str,
+        language: str,
+    ):
+        """TTS stage: synthesize each sentence from text_q onto audio_q, then None."""
+        index = 0
+        while True:
+            sentence = await text_q.get()
+            if sentence is None:
+                break
+            audio_path, tts_duration_ms, audio_duration_s = await self.phase1_pipeline.synthesize(
+                text=sentence,
+                language=language,
+                voice_sample=self.reference_audio,
+                job_id=f"{output_name}_seg{index}",
+            )
+            audio_q.put_nowait({
+                "index": index,
+                "audio_path": audio_path,
+                "tts_duration_ms": tts_duration_ms,
+                "audio_duration_s": audio_duration_s,
+            })
+            index += 1
+        audio_q.put_nowait(None)
+
+    async def _video_stage(self, audio_q: asyncio.Queue, output_name: str) -> List[Dict[str, Any]]:
+        """Video stage: animate each audio segment from audio_q as soon as it is synthesized."""
+        segments = []
+        while True:
+            segment = await audio_q.get()
+            if segment is None:
+                break
+            segment["video_path"], segment["avatar_duration_ms"] = await self.phase1_pipeline.animate(
+                audio_path=segment["audio_path"],
+                reference_image=self.reference_image,
+                job_id=f"{output_name}_seg{segment['index']}",
+            )
+            segments.append(segment)
+        return segments
+
     async def process_conversation(
         self,
         audio_path: str,
         conversation_history: Optional[List[Dict[str, str]]] = None,
         output_name: Optional[str] = None,
         language: str = "en",
+        conversation_id: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Full conversation pipeline: Audio → ASR → LLM → TTS → Video.
 
+        LLM, TTS and video run as concurrent stages connected by queues: each
+        sentence is synthesized as soon as the LLM emits it, and each audio
+        segment is animated while later sentences are still being generated
+        and synthesized. The segment videos are concatenated at the end.
+
         Args:
             audio_path: Path to user's audio input
             conversation_history: Optional conversation context
             output_name: Base name for outputs (auto-generated if None)
             language: Language code
+            conversation_id: Stable id of the conversation (local LLM KV cache reuse)
 
         Returns:
             Dict with all results:
@@ -292,32 +422,66 @@ Be natural, warm, and engaging in your communication style."""
         if self.asr_model is None:
             raise RuntimeError("Pipeline not initialized. Call initialize() first.")
 
-        pipeline_start = time.time()
+        pipeline_start = time.perf_counter()
         logger.info(f"Processing conversation from audio: {audio_path}")
 
-        # Step 1: Transcribe user audio
-        transcription = self.transcribe(audio_path, language=language)
+        # Step 1: Transcribe user audio (blocking model call; off the event loop)
+        transcription = await asyncio.to_thread(self.transcribe, audio_path, language=language)
         user_text = transcription["text"]
 
-        # Step 2: Generate LLM response
-        llm_result = self.generate_response(
-            user_message=user_text,
-            conversation_history=conversation_history,
-        )
-        response_text = llm_result["response"]
-
-        # Step 3: Generate avatar video
         if output_name is None:
             output_name = f"conversation_{int(time.time())}"
 
-        avatar_result = await self.generate_avatar_video(
-            text=response_text,
-            output_name=output_name,
-            language=language,
-        )
+        # Create Phase1Pipeline if needed (its steps initialize it off the event loop)
+        if self.phase1_pipeline is None:
+            self.phase1_pipeline = get_phase1_pipeline()
+
+        # Steps 2-4: LLM → TTS → Video, overlapped sentence by sentence
+        generation_start = time.perf_counter()
+        text_q: asyncio.Queue = asyncio.Queue()
+        audio_q: asyncio.Queue = asyncio.Queue()
+        tasks = [
+            asyncio.create_task(
+                self._llm_stage(user_text, conversation_history, text_q, conversation_id=conversation_id)
+            ),
+            asyncio.create_task(self._tts_stage(text_q, audio_q, output_name, language)),
+            asyncio.create_task(self._video_stage(audio_q, output_name)),
+        ]
+        try:
+            llm_result, _, segments = await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed stage would leave the others waiting on their queues
+            for task in tasks:
+                task.cancel()
+            raise
+        response_text = llm_result["response"]
+
+        if not segments:
+            raise RuntimeError("LLM returned an empty response")
+
+        # The final video is kept on disk; segment audio and video were intermediates
+        video_path = os.path.join(settings.final_output_dir, f"{output_name}_video.mp4")
+        segment_paths = [segment["video_path"] for segment in segments]
+        if len(segment_paths) == 1:
+            await asyncio.to_thread(shutil.move, segment_paths[0], video_path)
+        else:
+            await asyncio.to_thread(concat_videos, segment_paths, video_path)
+            for path in segment_paths:
+                os.remove(path)
+        for segment in segments:
+            os.remove(segment["audio_path"])
+
+        avatar_result = {
+            "video_path": video_path,
+            "num_segments": len(segments),
+            "tts_duration_ms": sum(segment["tts_duration_ms"] for segment in segments),
+            "avatar_duration_ms": sum(segment["avatar_duration_ms"] for segment in segments),
+            "audio_duration_s": sum(segment["audio_duration_s"] for segment in segments),
+            "total_generation_time": time.perf_counter() - generation_start,
+        }
 
         # Compile results
-        total_time = time.time() - pipeline_start
+        total_time = time.perf_counter() - pipeline_start
         result = {
             "transcription": transcription,
             "llm_response": llm_result,
@@ -327,9 +491,30 @@ Be natural, warm, and engaging in your communication style."""
             "response_text": response_text,
         }
 
-        logger.info(f"Conversation processed in {total_time:.2f}s")
+        logger.info(f"Conversation processed in {total_time:.2f}s ({len(segments)} segments)")
         logger.info(f"  User: '{user_text[:80]}...'")
         logger.info(f"  Assistant: '{response_text[:80]}...'")
         logger.info(f"  Video: {avatar_result.get('video_path')}")
 
         return result
+
+
+# Process-wide pipeline: models are loaded once per server, not per conversation
+_conversation_pipeline: Optional[ConversationPipeline] = None
+_conversation_pipeline_lock = threading.Lock()
+
+
+def get_conversation_pipeline(**kwargs) -> ConversationPipeline:
+    """
+    Get or create the process-wide ConversationPipeline, initialized once.
+
+    Args:
+        **kwargs: ConversationPipeline arguments (used by the first call only)
+    """
+    global _conversation_pipeline
+    with _conversation_pipeline_lock:
+        if _conversation_pipeline is None:
+            pipeline = ConversationPipeline(**kwargs)
+            pipeline.initialize()
+            _conversation_pipeline = pipeline
+    return _conversation_pipeline
@@ -2,14 +2,20 @@
 Phase 1 Pipeline: Script → Video
 Orchestrates TTS and Avatar Animation
 """
+import asyncio
 import logging
 import os
+import shutil
+import threading
 import time
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from models.tts import get_xtts_model
 from models.tts_client import get_xtts_client
 from models.avatar import get_avatar_model
+from utils.audio import combine_audio_files
+from utils.language import split_complete_sentences
+from utils.video import concat_videos
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -31,24 +37,32 @@ class Phase1Pipeline:
         
         self.avatar_model = get_avatar_model()
         self._ready = False
+        # Callers initialize from worker threads; one of them does the work
+        self._init_lock = threading.Lock()
+        # Asset filename -> path of an existing asset (misses are not cached)
+        self._voice_sample_paths: Dict[str, str] = {}
+        self._image_paths: Dict[str, str] = {}
+        # (reference_image, voice_sample, language) -> warmup task, run once per combination
+        self._warmups: Dict[tuple, asyncio.Task] = {}
     
     def initialize(self):
         """Initialize all models in the pipeline"""
-        if self._ready:
-            return
-        
-        logger.info("Initializing Phase 1 pipeline...")
-        start_time = time.time()
-        
-        # Initialize TTS model
-        self.tts_model.initialize()
-        
-        # Initialize avatar model
-        self.avatar_model.initialize()
-        
-        self._ready = True
-        elapsed = time.time() - start_time
-        logger.info(f"Phase 1 pipeline ready in {elapsed:.2f}s")
+        with self._init_lock:
+            if self._ready:
+                return
+            
+            logger.info("Initializing Phase 1 pipeline...")
+            start_time = time.perf_counter()
+            
+            # Initialize TTS model
+            self.tts_model.initialize()
+            
+            # Initialize avatar model
+            self.avatar_model.initialize()
+            
+            self._ready = True
+            elapsed = time.perf_counter() - start_time
+            logger.info(f"Phase 1 pipeline ready in {elapsed:.2f}s")
     
     def is_ready(self) -> bool:
         """Check if pipeline is ready"""
@@ -78,51 +92,46 @@ class Phase1Pipeline:
             Dictionary with generation results and metrics
         """
         if not self.is_ready():
-            self.initialize()
+            # Model loading and GPU service health checks block; keep them off the event loop
+            await asyncio.to_thread(self.initialize)
         
         job_id = job_id or f"job_{int(time.time() * 1000)}"
         logger.info(f"[{job_id}] Starting Phase 1 generation")
         
+        sentences, rest = split_complete_sentences(text)
+        if rest.strip():
+            sentences.append(rest.strip())
+        if len(sentences) > 1:
+            return await self._generate_sentences(
+                sentences, language, reference_image, voice_sample, job_id, enhancer
+            )
+        
         try:
             # Step 1: Text → Speech (TTS)
             logger.info(f"[{job_id}] Step 1: TTS synthesis")
-            
-            # Resolve voice sample path
-            voice_sample_path = None
-            if voice_sample:
-                voice_sample_path = os.path.join(settings.voice_samples_dir, voice_sample)
-                if not os.path.exists(voice_sample_path):
-                    logger.warning(f"Voice sample not found: {voice_sample_path}")
-                    voice_sample_path = None
-            
-            audio_path, tts_duration_ms, audio_duration_s = await self.tts_model.synthesize(
+            audio_path, tts_duration_ms, audio_duration_s = await self.synthesize(
                 text=text,
                 language=language,
-                speaker_wav=voice_sample_path,
-                output_path=os.path.join("/tmp/gpu-service-output", f"{job_id}_audio.wav")
+                voice_sample=voice_sample,
+                job_id=job_id
             )
             
-            logger.info(f"[{job_id}] TTS completed: {tts_duration_ms:.0f}ms, audio: {audio_duration_s:.2f}s")
-            
             # Step 2: Audio + Image → Animated Video
             logger.info(f"[{job_id}] Step 2: Avatar animation")
-            
-            # Resolve reference image path
             if not reference_image:
                 reference_image = settings.default_reference_image
-            
-            image_path = os.path.join(settings.images_dir, reference_image)
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"Reference image not found: {image_path}")
-            
-            video_path, avatar_duration_ms = await self.avatar_model.animate(
+            video_path, avatar_duration_ms = await self.animate(
                 audio_path=audio_path,
-                reference_image_path=image_path,
-                output_path=os.path.join("/tmp/gpu-service-output", f"{job_id}_video.mp4"),
+                reference_image=reference_image,
+                job_id=job_id,
                 enhancer=enhancer
             )
             
-            logger.info(f"[{job_id}] Avatar animation completed: {avatar_duration_ms:.0f}ms")
+            # Keep the results on disk; output_dir only holds intermediates
+            video_path, audio_path = await asyncio.gather(*(
+                asyncio.to_thread(shutil.move, path, os.path.join(settings.final_output_dir, os.path.basename(path)))
+                for path in (video_path, audio_path)
+            ))
             
             # Return results
             total_duration_ms = tts_duration_ms + avatar_duration_ms
@@ -143,9 +152,258 @@ class Phase1Pipeline:
             logger.error(f"[{job_id}] Pipeline failed: {e}", exc_info=True)
             raise
     
+    async def _generate_sentences(
+        self,
+        sentences: List[str],
+        language: str,
+        reference_image: Optional[str],
+        voice_sample: Optional[str],
+        job_id: str,
+        enhancer: Optional[str]
+    ) -> dict:
+        """
+        generate() for multi-sentence text, one segment per sentence.
+        
+        A producer task synthesizes the sentences in order while each finished
+        one is animated, so TTS of sentence n+1 overlaps animation of sentence
+        n. The segment videos and audio are then concatenated.
+        """
+        start_time = time.perf_counter()
+        reference_image = reference_image or settings.default_reference_image
+        audio_q: asyncio.Queue = asyncio.Queue()
+        
+        async def tts_producer():
+            # Segments (or the first exception) go to audio_q, then None
+            try:
+                for i, sentence in enumerate(sentences):
+                    result = await self.synthesize(
+                        text=sentence,
+                        language=language,
+                        voice_sample=voice_sample,
+                        job_id=f"{job_id}_s{i}"
+                    )
+                    audio_q.put_nowait((i,) + result)
+            except Exception as e:
+                audio_q.put_nowait(e)
+                return
+            audio_q.put_nowait(None)
+        
+        producer = asyncio.create_task(tts_producer())
+        segments = []
+        try:
+            while True:
+                item = await audio_q.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                i, audio_path, tts_duration_ms, audio_duration_s = item
+                video_path, avatar_duration_ms = await self.animate(
+                    audio_path=audio_path,
+                    reference_image=reference_image,
+                    job_id=f"{job_id}_s{i}",
+                    enhancer=enhancer
+                )
+                segments.append((audio_path, video_path, tts_duration_ms, avatar_duration_ms, audio_duration_s))
+        except BaseException as e:
+            producer.cancel()
+            if isinstance(e, Exception):
+                logger.error(f"[{job_id}] Pipeline failed: {e}", exc_info=True)
+            raise
+        
+        audio_paths = [segment[0] for segment in segments]
+        video_paths = [segment[1] for segment in segments]
+        audio_path = os.path.join(settings.final_output_dir, f"{job_id}_audio.wav")
+        video_path = os.path.join(settings.final_output_dir, f"{job_id}_video.mp4")
+        await asyncio.gather(
+            asyncio.to_thread(combine_audio_files, audio_paths, audio_path, crossfade_duration=0),
+            asyncio.to_thread(concat_videos, video_paths, video_path)
+        )
+        for path in audio_paths + video_paths:
+            os.remove(path)
+        
+        tts_duration_ms = sum(segment[2] for segment in segments)
+        avatar_duration_ms = sum(segment[3] for segment in segments)
+        logger.info(f"[{job_id}] {len(segments)} sentence segments generated in {time.perf_counter() - start_time:.2f}s")
+        
+        return {
+            "job_id": job_id,
+            "video_path": video_path,
+            "audio_path": audio_path,
+            "tts_duration_ms": tts_duration_ms,
+            "avatar_duration_ms": avatar_duration_ms,
+            # Wall clock: TTS and animation overlap
+            "total_duration_ms": (time.perf_counter() - start_time) * 1000,
+            "audio_duration_s": sum(segment[4] for segment in segments),
+            "language": language,
+            "reference_image": reference_image,
+            "num_segments": len(segments)
+        }
+    
+    def _voice_sample_path(self, voice_sample: Optional[str]) -> Optional[str]:
+        """Path of a voice sample filename, or None (default voice) if it does not exist"""
+        if not voice_sample:
+            return None
+        path = self._voice_sample_paths.get(voice_sample)
+        if path is None:
+            path = os.path.join(settings.voice_samples_dir, voice_sample)
+            if not os.path.exists(path):
+                # Not cached: the sample may be added later, and names come from clients
+                logger.warning(f"Voice sample not found: {path}")
+                return None
+            self._voice_sample_paths[voice_sample] = path
+        return path
+    
+    def _image_path(self, reference_image: str) -> str:
+        """Path of a reference image filename; raises FileNotFoundError if it does not exist"""
+        path = self._image_paths.get(reference_image)
+        if path is None:
+            path = os.path.join(settings.images_dir, reference_image)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Reference image not found: {path}")
+            self._image_paths[reference_image] = path
+        return path
+    
+    async def warm_references(
+        self,
+        reference_image: Optional[str] = None,
+        voice_sample: Optional[str] = None,
+        language: str = "en"
+    ):
+        """
+        Run one short synthesis and animation with these references, outputs discarded.
+        
+        The speaker latents of the voice sample and the source features of the
+        image are cached by the TTS and avatar models after their first use, so
+        this moves that work from the first conversation turn to startup.
+        Failures are logged and never raised. Pipelines sharing references
+        (and this singleton) only warm them once.
+        """
+        key = (reference_image, voice_sample, language)
+        task = self._warmups.get(key)
+        if task is None:
+            task = self._warmups[key] = asyncio.ensure_future(
+                self._warm_references(reference_image, voice_sample, language)
+            )
+        await task
+    
+    async def _warm_references(self, reference_image: Optional[str], voice_sample: Optional[str], language: str):
+        start_time = time.perf_counter()
+        job_id = f"warmup_{int(time.time() * 1000)}"
+        paths = []
+        try:
+            audio_path, _, _ = await self.synthesize("Hello.", language, voice_sample, job_id)
+            paths.append(audio_path)
+            video_path, _ = await self.animate(audio_path, reference_image, job_id)
+            paths.append(video_path)
+            logger.info(f"Reference warmup done in {time.perf_counter() - start_time:.2f}s")
+        except Exception as e:
+            logger.warning(f"Reference warmup failed (continuing): {e}")
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+    
+    async def synthesize(
+        self,
+        text: str,
+        language: str = "en",
+        voice_sample: Optional[str] = None,
+        job_id: Optional[str] = None
+    ) -> Tuple[str, float, float]:
+        """
+        TTS step of generate(): speak text with the cloned voice.
+        
+        Args:
+            text: Text to speak
+            language: Language code
+            voice_sample: Voice reference filename (in assets/voice/reference_samples/)
+            job_id: Job identifier used for the output filename
+            
+        Returns:
+            Tuple of (audio_path, tts_duration_ms, audio_duration_s)
+        """
+        if not self.is_ready():
+            await asyncio.to_thread(self.initialize)
+        
+        job_id = job_id or f"job_{int(time.time() * 1000)}"
+        
+        voice_sample_path = self._voice_sample_path(voice_sample)
+        output_path = os.path.join(settings.output_dir, f"{job_id}_audio.wav")
+        if settings.use_external_gpu_service:
+            audio_path, tts_duration_ms, audio_duration_s = await self.tts_model.synthesize(
+                text=text,
+                language=language,
+                speaker_wav=voice_sample_path,
+                output_path=output_path
+            )
+        else:
+            # Local XTTS runs the model and writes the wav synchronously
+            audio_path, tts_duration_ms, audio_duration_s = await asyncio.to_thread(
+                self.tts_model.synthesize,
+                text=text,
+                language=language,
+                speaker_wav=voice_sample_path,
+                output_path=output_path
+            )
+        
+        logger.info(f"[{job_id}] TTS completed: {tts_duration_ms:.0f}ms, audio: {audio_duration_s:.2f}s")
+        return audio_path, tts_duration_ms, audio_duration_s
+    
+    async def animate(
+        self,
+        audio_path: str,
+        reference_image: Optional[str] = None,
+        job_id: Optional[str] = None,
+        enhancer: Optional[str] = None
+    ) -> Tuple[str, float]:
+        """
+        Avatar step of generate(): lip-sync the reference image to audio.
+        
+        Args:
+            audio_path: Speech audio
+            reference_image: Reference image filename (in assets/images/)
+            job_id: Job identifier used for the output filename
+            enhancer: Face enhancer to use ('gfpgan' or None)
+            
+        Returns:
+            Tuple of (video_path, avatar_duration_ms)
+        """
+        if not self.is_ready():
+            await asyncio.to_thread(self.initialize)
+        
+        job_id = job_id or f"job_{int(time.time() * 1000)}"
+        
+        image_path = self._image_path(reference_image or settings.default_reference_image)
+        video_path, avatar_duration_ms = await self.avatar_model.animate(
+            audio_path=audio_path,
+            reference_image_path=image_path,
+            output_path=os.path.join(settings.output_dir, f"{job_id}_video.mp4"),
+            enhancer=enhancer
+        )
+        
+        logger.info(f"[{job_id}] Avatar animation completed: {avatar_duration_ms:.0f}ms")
+        return video_path, avatar_duration_ms
+    
     def cleanup(self):
         """Cleanup pipeline resources"""
         self.tts_model.cleanup()
         self.avatar_model.cleanup()
         self._ready = False
         logger.info("Phase 1 pipeline cleaned up")
+
+
+# Global instance, shared by all conversation pipelines and sessions
+_phase1_pipeline: Optional[Phase1Pipeline] = None
+
+
+def get_phase1_pipeline() -> Phase1Pipeline:
+    """
+    Get or create the global Phase 1 pipeline.
+    
+    Creation is cheap (the TTS and avatar models are global instances);
+    initialization happens on first use, off the event loop.
+    """
+    global _phase1_pipeline
+    if _phase1_pipeline is None:
+        _phase1_pipeline = Phase1Pipeline()
+    return _phase1_pipeline
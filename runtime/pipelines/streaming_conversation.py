@@ -6,14 +6,15 @@ Generates and streams video chunks as they're produced for lower perceived laten
 import logging
 import time
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Dict, Any, List, AsyncGenerator
-import re
 
 from models.asr import ASRModel
 from models.llm import LLMModel
 from models.llm_gemini import GeminiClient
-from pipelines.phase1_script import Phase1Pipeline
+from pipelines.phase1_script import Phase1Pipeline, get_phase1_pipeline
+from utils.language import can_merge_sentence, merge_short_sentences, split_sentences
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -37,7 +38,7 @@ class StreamingConversationPipeline:
         output_dir: str = "outputs/conversations",
         device: str = "cuda",
         use_tensorrt: bool = True,
-        max_parallel_chunks: int = 1,  # Must be 1: GPU service processes requests serially
+        max_parallel_chunks: int = 2,
     ):
         """
         Initialize streaming conversation pipeline.
@@ -48,9 +49,9 @@ class StreamingConversationPipeline:
             output_dir: Directory to save conversation outputs
             device: Device for inference ('cuda', 'mps', or 'cpu')
             use_tensorrt: Whether to use TensorRT for video generation
-            max_parallel_chunks: Must be 1. GPU service runs single-worker uvicorn and processes
-                requests serially. L4 GPU cannot handle concurrent Ditto instances due to CUDA
-                context limitations. Parallel requests would just queue at GPU service anyway.
+            max_parallel_chunks: Bounds how far TTS runs ahead of avatar rendering, which
+                stays serialized (the GPU service runs one Ditto instance): at most
+                max(max_parallel_chunks - 1, 1) synthesized chunks wait for animation.
         """
         self.reference_image = reference_image
         self.reference_audio = reference_audio
@@ -74,18 +75,35 @@ Be natural, warm, and engaging in your communication style."""
         logger.info(f"StreamingConversationPipeline initialized (max_parallel={max_parallel_chunks})")
 
     def initialize(self):
-        """Load all models into memory."""
-        start_time = time.time()
+        """Load all models into memory (ASR, LLM and Phase 1 load concurrently)."""
+        start_time = time.perf_counter()
         logger.info("Initializing streaming conversation pipeline models...")
 
-        # Initialize ASR
-        if self.asr_model is None:
-            logger.info("Loading ASR model (Faster-Whisper)...")
-            compute_type = "int8" if self.device == "cpu" else "float16"
-            self.asr_model = ASRModel(device=self.device, compute_type=compute_type)
-            self.asr_model.initialize()
+        # Loads are disk- and host-to-device-copy bound; startup takes the slowest, not the sum
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="streaming-init") as pool:
+            futures = [pool.submit(init) for init in (self._init_asr, self._init_llm, self._init_phase1)]
+            for future in futures:
+                future.result()
+
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"Streaming pipeline initialized in {elapsed:.2f}s")
+
+    def _init_asr(self):
+        """Load Faster-Whisper and run one warmup decode"""
+        if self.asr_model is not None:
+            return
+        logger.info("Loading ASR model (Faster-Whisper)...")
+        compute_type = "int8" if self.device == "cpu" else "float16"
+        asr_model = ASRModel(device=self.device, compute_type=compute_type)
+        asr_model.initialize()
+        try:
+            asr_model.warmup()
+        except Exception as e:
+            logger.warning(f"ASR warmup failed (continuing): {e}")
+        self.asr_model = asr_model
 
-        # Initialize LLM (Gemini API or local Qwen)
+    def _init_llm(self):
+        """Connect to Gemini, or load the local Qwen model and generate one token"""
         if settings.use_gemini_llm:
             if self.gemini_client is None:
                 try:
@@ -104,19 +122,29 @@ Be natural, warm, and engaging in your communication style."""
             if self.llm_model is None:
                 try:
                     logger.info("Loading LLM model (Qwen-2.5-7B)...")
-                    self.llm_model = LLMModel()
-                    self.llm_model.initialize()
+                    llm_model = LLMModel()
+                    llm_model.initialize()
+                    # Also prefills and keeps the system prompt's KV cache
+                    llm_model.generate_response("Hi", system_prompt=self.system_prompt, max_tokens=1)
+                    self.llm_model = llm_model
                 except Exception as e:
                     logger.warning(f"Failed to load LLM, will use fallback: {e}")
                     self.llm_model = None
 
-        # Initialize Phase1Pipeline
+    def _init_phase1(self):
+        """Initialize the shared Phase 1 pipeline (TTS + avatar)"""
         if self.phase1_pipeline is None:
-            self.phase1_pipeline = Phase1Pipeline()
+            self.phase1_pipeline = get_phase1_pipeline()
             self.phase1_pipeline.initialize()
 
-        elapsed = time.time() - start_time
-        logger.info(f"Streaming pipeline initialized in {elapsed:.2f}s")
+    async def warm_references(self):
+        """Run one short TTS + avatar pass with this pipeline's references (see Phase1Pipeline.warm_references)"""
+        if self.phase1_pipeline is None:
+            self.phase1_pipeline = get_phase1_pipeline()
+        await self.phase1_pipeline.warm_references(
+            reference_image=self.reference_image,
+            voice_sample=self.reference_audio,
+        )
 
     def split_into_sentences(self, text: str) -> List[str]:
         """
@@ -129,58 +157,15 @@ Be natural, warm, and engaging in your communication style."""
         Returns:
             List of sentence strings
         """
-        # Handle common abbreviations by temporarily replacing periods
-        abbreviations = {
-            'D.C.': 'DC_TEMP',
-            'Mr.': 'MR_TEMP',
-            'Mrs.': 'MRS_TEMP',
-            'Ms.': 'MS_TEMP',
-            'Dr.': 'DR_TEMP',
-            'Jr.': 'JR_TEMP',
-            'Sr.': 'SR_TEMP',
-            'U.S.': 'US_TEMP',
-            'U.K.': 'UK_TEMP',
-            'etc.': 'ETC_TEMP',
-            'vs.': 'VS_TEMP',
-            'e.g.': 'EG_TEMP',
-            'i.e.': 'IE_TEMP',
-        }
-        
-        # Replace abbreviations temporarily
-        protected_text = text
-        replacements = {}
-        for abbr, temp in abbreviations.items():
-            if abbr in protected_text:
-                protected_text = protected_text.replace(abbr, temp)
-                replacements[temp] = abbr
-        
-        # Split on sentence boundaries (.!?) followed by space or end
-        sentences = re.split(r'([.!?]+(?:\s+|$))', protected_text)
-        
-        # Rejoin sentences with their punctuation
-        chunks = []
-        for i in range(0, len(sentences) - 1, 2):
-            sentence = sentences[i].strip()
-            punctuation = sentences[i + 1].strip() if i + 1 < len(sentences) else ''
-            if sentence:
-                chunk = sentence + punctuation
-                # Restore abbreviations
-                for temp, abbr in replacements.items():
-                    chunk = chunk.replace(temp, abbr)
-                chunks.append(chunk)
+        # Very short sentences (< 3 words) are dropped, short later ones merged
+        chunks = merge_short_sentences(
+            split_sentences(text, min_words=3),
+            settings.stream_merge_min_words,
+            settings.stream_chunk_max_words
+        )
         
-        # Handle any remaining text
-        if len(sentences) % 2 == 1 and sentences[-1].strip():
-            remaining = sentences[-1].strip()
-            # Restore abbreviations
-            for temp, abbr in replacements.items():
-                remaining = remaining.replace(temp, abbr)
-            chunks.append(remaining)
-        
-        # Filter out empty chunks and very short ones (< 3 words)
-        chunks = [c for c in chunks if len(c.split()) >= 3]
-        
-        logger.info(f"Split text into {len(chunks)} chunks: {[c[:40] + '...' for c in chunks]}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Split text into %d chunks: %s", len(chunks), [c[:40] + '...' for c in chunks])
         return chunks
 
     async def generate_chunk(
@@ -202,10 +187,10 @@ Be natural, warm, and engaging in your communication style."""
         Returns:
             Dict with chunk results
         """
-        chunk_start = time.time()
+        chunk_start = time.perf_counter()
         chunk_id = f"{job_id}_chunk{chunk_index}"
         
-        logger.info(f"[{chunk_id}] Generating chunk: '{text_chunk[:50]}...'")
+        logger.info("[%s] Generating chunk: '%.50s...'", chunk_id, text_chunk)
         
         try:
             # Generate TTS + Avatar for this chunk
@@ -217,18 +202,109 @@ Be natural, warm, and engaging in your communication style."""
                 job_id=chunk_id,
             )
             
-            chunk_time = time.time() - chunk_start
+            chunk_time = time.perf_counter() - chunk_start
             result["chunk_index"] = chunk_index
             result["chunk_time"] = chunk_time
             result["text_chunk"] = text_chunk
             
-            logger.info(f"[{chunk_id}] Chunk generated in {chunk_time:.2f}s")
+            logger.info("[%s] Chunk generated in %.2fs", chunk_id, chunk_time)
             return result
             
         except Exception as e:
             logger.error(f"[{chunk_id}] Chunk generation failed: {e}", exc_info=True)
             raise
 
+    async def _render_chunks(
+        self,
+        sentence_queue: asyncio.Queue,
+        result_queue: asyncio.Queue,
+        job_id: str,
+        language: str,
+    ):
+        """
+        Generate one video chunk per sentence, in arrival order.
+        
+        TTS and avatar animation run as two stages joined by a bounded queue
+        (see max_parallel_chunks), so sentence n+1 is synthesized while
+        sentence n is being animated.
+        A None on sentence_queue ends the input; results (or the first
+        exception) go to result_queue, followed by None when done.
+        """
+        audio_q: asyncio.Queue = asyncio.Queue(maxsize=max(self.max_parallel_chunks - 1, 1))
+        
+        async def tts_stage():
+            # Synthesized chunks (or the first exception) go to audio_q, then None
+            chunk_index = 0
+            held = []  # Sentence taken from the queue but not merged
+            try:
+                while True:
+                    text_chunk = held.pop() if held else await sentence_queue.get()
+                    if text_chunk is None:
+                        break
+                    # Later chunks absorb short sentences already queued behind them:
+                    # one TTS + render round trip instead of two
+                    while chunk_index > 0 and not held and not sentence_queue.empty():
+                        queued = sentence_queue.get_nowait()
+                        if queued is not None and can_merge_sentence(
+                            text_chunk, queued, settings.stream_merge_min_words, settings.stream_chunk_max_words
+                        ):
+                            text_chunk = f"{text_chunk} {queued}"
+                        else:
+                            held.append(queued)
+                    chunk_id = f"{job_id}_chunk{chunk_index}"
+                    logger.info("[%s] Generating chunk: '%.50s...'", chunk_id, text_chunk)
+                    chunk_start = time.perf_counter()
+                    audio = await self.phase1_pipeline.synthesize(
+                        text=text_chunk,
+                        language=language,
+                        voice_sample=self.reference_audio,
+                        job_id=chunk_id,
+                    )
+                    await audio_q.put((chunk_index, chunk_id, text_chunk, chunk_start) + audio)
+                    chunk_index += 1
+            except Exception as e:
+                await audio_q.put(e)
+                return
+            await audio_q.put(None)
+        
+        tts_task = asyncio.create_task(tts_stage())
+        try:
+            while True:
+                item = await audio_q.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                chunk_index, chunk_id, text_chunk, chunk_start, audio_path, tts_duration_ms, audio_duration_s = item
+                video_path, avatar_duration_ms = await self.phase1_pipeline.animate(
+                    audio_path=audio_path,
+                    reference_image=self.reference_image,
+                    job_id=chunk_id,
+                )
+                chunk_time = time.perf_counter() - chunk_start
+                logger.info("[%s] Chunk generated in %.2fs", chunk_id, chunk_time)
+                result_queue.put_nowait({
+                    "job_id": chunk_id,
+                    "video_path": video_path,
+                    "audio_path": audio_path,
+                    "tts_duration_ms": tts_duration_ms,
+                    "avatar_duration_ms": avatar_duration_ms,
+                    "total_duration_ms": tts_duration_ms + avatar_duration_ms,
+                    "audio_duration_s": audio_duration_s,
+                    "language": language,
+                    "reference_image": self.reference_image,
+                    "chunk_index": chunk_index,
+                    "chunk_time": chunk_time,
+                    "text_chunk": text_chunk,
+                })
+        except Exception as e:
+            logger.error(f"[{job_id}] Chunk generation failed: {e}", exc_info=True)
+            result_queue.put_nowait(e)
+            return
+        finally:
+            tts_task.cancel()
+        result_queue.put_nowait(None)
+
     async def process_conversation_streaming(
         self,
         audio_path: str,
@@ -256,24 +332,20 @@ Be natural, warm, and engaging in your communication style."""
         if job_id is None:
             job_id = f"stream_{int(time.time())}"
 
-        pipeline_start = time.time()
-        logger.info(f"[{job_id}] Starting streaming conversation processing")
+        pipeline_start = time.perf_counter()
+        render_task: Optional[asyncio.Task] = None
+        llm_task: Optional[asyncio.Task] = None
+        next_result: Optional[asyncio.Future] = None
+        logger.info("[%s] Starting streaming conversation processing", job_id)
 
         try:
-            # Step 1: Transcribe user audio
-            transcription_start = time.time()
-            transcribe_result = self.asr_model.transcribe(audio_path, language=language)
-            
-            if isinstance(transcribe_result, tuple):
-                if len(transcribe_result) == 3:
-                    text, detected_lang, confidence = transcribe_result
-                    metadata = {"language": detected_lang, "language_probability": confidence}
-                else:
-                    text, metadata = transcribe_result
-            else:
-                raise TypeError(f"Unexpected transcribe result type: {type(transcribe_result)}")
+            # Step 1: Transcribe user audio (blocking decode, off the event loop)
+            text, detected_lang, confidence = await asyncio.to_thread(
+                self.asr_model.transcribe, audio_path, language=language
+            )
+            metadata = {"language": detected_lang, "language_probability": confidence}
             
-            transcription_time = time.time() - transcription_start
+            transcription_time = time.perf_counter() - pipeline_start
             user_text = text
             
             # Yield transcription result
@@ -286,100 +358,111 @@ Be natural, warm, and engaging in your communication style."""
                 }
             }
             
-            logger.info(f"[{job_id}] Transcription: '{user_text[:80]}...'")
+            logger.info("[%s] Transcription: '%.80s...'", job_id, user_text)
 
             # Step 2: Generate LLM response
-            llm_start = time.time()
+            llm_start = time.perf_counter()
             
-            # Check which LLM to use (Gemini or local)
-            llm_available = self.gemini_client or self.llm_model
+            # Sentences go to TTS + video as the LLM produces them, so chunk 0
+            # renders while the rest of the reply is still being generated
+            sentence_queue: asyncio.Queue = asyncio.Queue()
+            result_queue: asyncio.Queue = asyncio.Queue()
+            render_task = asyncio.create_task(
+                self._render_chunks(sentence_queue, result_queue, job_id, language)
+            )
             
-            if not llm_available:
-                # Fallback: echo user text
-                response_text = user_text
-                fallback = True
-            else:
-                # Use Gemini if available, otherwise use local Qwen
-                if self.gemini_client:
-                    if conversation_history:
-                        response_text = self.gemini_client.generate_with_history(
+            async def generate_reply():
+                sentences = []
+                fallback = False
+                try:
+                    if self.gemini_client:
+                        async for sentence in self.gemini_client.stream_response(
                             prompt=user_text,
                             conversation_history=conversation_history,
                             max_tokens=150,
-                        )
-                    else:
-                        response_text = self.gemini_client.generate_response(
-                            prompt=user_text,
-                            max_tokens=150,
-                        )
-                    fallback = False
-                else:
-                    # Use local LLM
-                    if conversation_history:
-                        response_text = self.llm_model.generate_with_history(
-                            messages=conversation_history,
-                            system_prompt=self.system_prompt,
-                            max_new_tokens=150,
-                        )
+                        ):
+                            sentences.append(sentence)
+                            sentence_queue.put_nowait(sentence)
+                    elif self.llm_model:
+                        messages = [{"role": "system", "content": self.system_prompt}]
+                        messages += conversation_history or []
+                        messages.append({"role": "user", "content": user_text})
+                        loop = asyncio.get_running_loop()
+                        
+                        # Local decoding blocks; hand sentences back to the event loop as they complete
+                        def decode():
+                            for sentence in self.llm_model.generate_stream(messages, max_tokens=150):
+                                sentences.append(sentence)
+                                loop.call_soon_threadsafe(sentence_queue.put_nowait, sentence)
+                        
+                        await asyncio.to_thread(decode)
                     else:
-                        response_text = self.llm_model.generate_response(
-                            prompt=user_text,
-                            system_prompt=self.system_prompt,
-                            max_new_tokens=150,
-                        )
-                    fallback = False
+                        # Fallback: echo user text
+                        fallback = True
+                        sentences = self.split_into_sentences(user_text) or [user_text]
+                        for sentence in sentences:
+                            sentence_queue.put_nowait(sentence)
+                finally:
+                    sentence_queue.put_nowait(None)
+                return " ".join(sentences), fallback
             
-            llm_time = time.time() - llm_start
+            llm_task = asyncio.create_task(generate_reply())
+            response_text = None
             
-            # Yield LLM response
-            yield {
-                "type": "llm_response",
-                "data": {
-                    "text": response_text,
-                    "time": llm_time,
-                    "fallback": fallback,
+            def llm_response_event():
+                nonlocal response_text
+                response_text, fallback = llm_task.result()
+                logger.info("[%s] LLM response: '%.80s...'", job_id, response_text)
+                return {
+                    "type": "llm_response",
+                    "data": {
+                        "text": response_text,
+                        "time": time.perf_counter() - llm_start,
+                        "fallback": fallback,
+                    }
                 }
-            }
-            
-            logger.info(f"[{job_id}] LLM response: '{response_text[:80]}...'")
 
-            # Step 3: Split response into chunks and generate video progressively
-            chunks = self.split_into_sentences(response_text)
-            
-            if not chunks:
-                # If splitting failed, use full text as single chunk
-                chunks = [response_text]
-            
-            # Generate chunks sequentially and yield as each completes
-            # Sequential processing required due to GPU service limitations
-            for i, text_chunk in enumerate(chunks):
-                # Generate chunk (blocks until complete)
-                result = await self.generate_chunk(
-                    text_chunk=text_chunk,
-                    chunk_index=i,
-                    job_id=job_id,
-                    language=language,
-                )
-                
-                # Yield immediately after generation completes
+            # Step 3: Yield video chunks as each sentence finishes rendering, while
+            # the LLM is still generating; llm_response is yielded when it is done
+            num_chunks = 0
+            next_result: Optional[asyncio.Future] = None
+            while True:
+                if next_result is None:
+                    next_result = asyncio.ensure_future(result_queue.get())
+                if response_text is None:
+                    await asyncio.wait({llm_task, next_result}, return_when=asyncio.FIRST_COMPLETED)
+                    if llm_task.done():
+                        yield llm_response_event()
+                    if not next_result.done():
+                        continue
+                result = await next_result
+                next_result = None
+                if result is None:
+                    break
+                if isinstance(result, Exception):
+                    raise result
+                num_chunks += 1
                 yield {
                     "type": "video_chunk",
                     "data": result,
                 }
+            if response_text is None:
+                await llm_task
+                yield llm_response_event()
 
             # Yield completion
-            total_time = time.time() - pipeline_start
+            total_time = time.perf_counter() - pipeline_start
             yield {
                 "type": "complete",
                 "data": {
                     "total_time": total_time,
-                    "num_chunks": len(chunks),
+                    "num_chunks": num_chunks,
                     "user_text": user_text,
                     "response_text": response_text,
                 }
             }
             
-            logger.info(f"[{job_id}] Streaming conversation completed in {total_time:.2f}s")
+            logger.info("[%s] Streaming conversation completed in %.2fs", job_id, total_time)
 
         except Exception as e:
             logger.error(f"[{job_id}] Streaming conversation failed: {e}", exc_info=True)
@@ -387,6 +470,11 @@ Be natural, warm, and engaging in your communication style."""
                 "type": "error",
                 "data": {
                     "error": str(e),
-                    "time": time.time() - pipeline_start,
+                    "time": time.perf_counter() - pipeline_start,
                 }
             }
+        finally:
+            # Client went away or a step failed: stop generating and rendering
+            for task in (llm_task, next_result, render_task):
+                if task is not None and not task.done():
+                    task.cancel()
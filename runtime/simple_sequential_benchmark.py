@@ -7,6 +7,7 @@ Use the working script, just time it.
 import subprocess
 import time
 import sys
+from collections import deque
 
 def run_video_generation(run_num):
     """Run the working test script and capture timing."""
@@ -16,27 +17,34 @@ def run_video_generation(run_num):
     
     start = time.time()
     
-    # Run the known-working script
-    result = subprocess.run(
+    # Run the known-working script, streaming its output as it is produced
+    timing_lines = []
+    tail = deque(maxlen=20)
+    with subprocess.Popen(
         ["python", "/app/test_video_generation.py"],
-        capture_output=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        bufsize=1,
         text=True
-    )
+    ) as proc:
+        for line in proc.stdout:
+            sys.stdout.write(line)
+            tail.append(line)
+            if 'Total time:' in line or 'TTS:' in line or 'Video:' in line:
+                timing_lines.append(line.strip())
     
     elapsed = time.time() - start
     
-    if result.returncode == 0:
+    if proc.returncode == 0:
         print(f"✅ Run {run_num} completed in {elapsed:.1f}s")
         
-        # Try to extract timing from output
-        for line in result.stdout.split('\n'):
-            if 'Total time:' in line or 'TTS:' in line or 'Video:' in line:
-                print(f"   {line.strip()}")
+        for line in timing_lines:
+            print(f"   {line}")
         
         return elapsed, True
     else:
         print(f"❌ Run {run_num} failed!")
-        print(result.stderr[-500:] if result.stderr else "No error output")
+        print(''.join(tail)[-500:] if tail else "No error output")
         return elapsed, False
 
 def main():
@@ -6,7 +6,6 @@ set -e
 cd /Users/brucegarro/project/realtime-avatar/runtime
 
 # Set environment variables
-export PYTORCH_ENABLE_MPS_FALLBACK=1
 export PYTHONPATH=/Users/brucegarro/project/realtime-avatar/runtime:$PYTHONPATH
 
 echo "Starting GPU Service on port 8001..."
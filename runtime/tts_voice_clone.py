@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """
-Standalone TTS voice cloning script using XTTS-v2.
-Runs in isolation to avoid NumPy conflicts with Ditto.
+TTS voice cloning with XTTS-v2, as a script or imported.
+
+complete_pipeline.py imports synthesize_speech in the same process as Ditto;
+both run on the image's single NumPy (numpy<2.0.0, as pinned in the Dockerfiles).
 """
 import os
 import sys
@@ -11,26 +13,27 @@ import time
 from TTS.tts.configs.xtts_config import XttsConfig
 from TTS.tts.models.xtts import Xtts
 
-def synthesize_speech(text, speaker_wav, output_path, language="en"):
-    """
-    Synthesize speech using XTTS-v2 voice cloning.
+XTTS_DIR = "/root/.local/share/tts/tts_models--multilingual--multi-dataset--xtts_v2/"
+
+# Loaded XTTS model, reused across calls in the same process
+_model = None
+
+
+def load_model():
+    """Load XTTS-v2 once per process and return it"""
+    global _model
+    if _model is not None:
+        return _model
     
-    Args:
-        text: Text to synthesize
-        speaker_wav: Path to reference voice audio
-        output_path: Path to save output audio
-        language: Language code (en, es, fr, de, it, pt, pl, tr, ru, nl, cs, ar, zh-cn, ja, hu, ko, hi)
-    """
     print(f"Loading XTTS-v2 model...")
     start_time = time.time()
     
-    # Load model
     config = XttsConfig()
-    config.load_json("/root/.local/share/tts/tts_models--multilingual--multi-dataset--xtts_v2/config.json")
+    config.load_json(os.path.join(XTTS_DIR, "config.json"))
     model = Xtts.init_from_config(config)
     model.load_checkpoint(
         config,
-        checkpoint_dir="/root/.local/share/tts/tts_models--multilingual--multi-dataset--xtts_v2/",
+        checkpoint_dir=XTTS_DIR,
         eval=True,
         use_deepspeed=False
     )
@@ -45,6 +48,22 @@ def synthesize_speech(text, speaker_wav, output_path, language="en"):
     load_time = time.time() - start_time
     print(f"Model loaded in {load_time:.2f}s")
     
+    _model = model
+    return _model
+
+
+def synthesize_speech(text, speaker_wav, output_path, language="en"):
+    """
+    Synthesize speech using XTTS-v2 voice cloning.
+    
+    Args:
+        text: Text to synthesize
+        speaker_wav: Path to reference voice audio
+        output_path: Path to save output audio
+        language: Language code (en, es, fr, de, it, pt, pl, tr, ru, nl, cs, ar, zh-cn, ja, hu, ko, hi)
+    """
+    model = load_model()
+    
     # Compute speaker latents from reference audio
     print(f"Computing speaker latents from: {speaker_wav}")
     gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(
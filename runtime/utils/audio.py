@@ -2,12 +2,16 @@
 Audio processing utilities
 """
 import logging
+import math
 import os
 from typing import Tuple
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Page-locked host buffer reused by to_pinned_host (grown on demand)
+_pinned_audio = None
+
 
 def load_audio(file_path: str) -> Tuple[np.ndarray, int]:
     """
@@ -95,6 +99,90 @@ def resample_audio(
         raise
 
 
+def to_mono_16k(
+    audio: np.ndarray,
+    sr: int,
+    target_sr: int = 16000
+) -> np.ndarray:
+    """
+    Convert decoded audio to mono float32 at the target sample rate.
+    
+    Uses polyphase resampling (scipy) instead of librosa, so no numba JIT
+    or resampy import is paid on the hot path.
+    
+    Args:
+        audio: Audio data (samples, or samples x channels)
+        sr: Sample rate of audio
+        target_sr: Target sample rate
+        
+    Returns:
+        Mono float32 audio at target_sr
+    """
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1, dtype=np.float32)
+    
+    if sr != target_sr:
+        from scipy.signal import resample_poly
+        g = math.gcd(sr, target_sr)
+        audio = resample_poly(audio, target_sr // g, sr // g)
+    
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def load_audio_16k(file_path: str, target_sr: int = 16000) -> Tuple[np.ndarray, int]:
+    """
+    Load audio file as mono float32 at 16 kHz (the rate Ditto's HuBERT features expect).
+    
+    Drop-in replacement for librosa.core.load(file_path, sr=16000).
+    
+    Args:
+        file_path: Path to audio file
+        target_sr: Target sample rate
+        
+    Returns:
+        Tuple of (audio_data, sample_rate)
+    """
+    import soundfile as sf
+    
+    try:
+        audio, sr = sf.read(file_path, dtype='float32')
+        return to_mono_16k(audio, sr, target_sr), target_sr
+    except Exception as e:
+        logger.error(f"Failed to load audio {file_path}: {e}")
+        raise
+
+
+def num_video_frames(num_samples: int, sample_rate: int = 16000, fps: int = 25) -> int:
+    """Number of video frames covering num_samples of audio (integer ceil, no float rounding)"""
+    return (num_samples * fps + sample_rate - 1) // sample_rate
+
+
+def to_pinned_host(audio: np.ndarray) -> np.ndarray:
+    """
+    Copy audio into a reused page-locked (pinned) host buffer.
+    
+    Host->device copies from pinned memory are DMA'd directly instead of going
+    through a pageable staging buffer. The returned array is a view into the
+    shared buffer and is only valid until the next call. Without CUDA, returns
+    audio as contiguous float32 (no copy if it already is), so torch.from_numpy
+    can wrap it without copying.
+    """
+    global _pinned_audio
+    import torch
+    
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    if not torch.cuda.is_available():
+        return audio
+    
+    n = len(audio)
+    if _pinned_audio is None or _pinned_audio.numel() < n:
+        _pinned_audio = torch.empty(n, dtype=torch.float32, pin_memory=True)
+    
+    buf = _pinned_audio[:n]
+    buf.copy_(torch.from_numpy(audio))
+    return buf.numpy()
+
+
 def normalize_audio(audio: np.ndarray, target_db: float = -20.0) -> np.ndarray:
     """
     Normalize audio to target dB level.
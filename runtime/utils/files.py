@@ -0,0 +1,21 @@
+"""
+File utilities
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=64)
+def _sha256(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a file, recomputed only when its mtime or size changes"""
+    st = os.stat(path)
+    return _sha256(path, st.st_mtime_ns, st.st_size)
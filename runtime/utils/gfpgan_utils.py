@@ -0,0 +1,205 @@
+"""
+GFPGAN face enhancement for rendered avatar videos
+"""
+import logging
+import multiprocessing as mp
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Each worker holds its own GFPGANer (~2.5GB VRAM with activations)
+VRAM_PER_WORKER_GB = 3
+MAX_WORKERS = 4
+
+# GFPGANer of the current worker process (set by _init_worker)
+_worker_restorer = None
+
+
+def _read_frames(video_path: str) -> Tuple[List[np.ndarray], float]:
+    """Decode all frames (BGR) and the frame rate of a video"""
+    video = cv2.VideoCapture(video_path)
+    fps = video.get(cv2.CAP_PROP_FPS) or 25.0
+    frames = []
+    while True:
+        ret, frame = video.read()
+        if not ret:
+            break
+        frames.append(frame)
+    video.release()
+    return frames, fps
+
+
+def _restore(restorer, frame: np.ndarray) -> np.ndarray:
+    """Enhance every face in one BGR frame"""
+    _, _, restored = restorer.enhance(frame, has_aligned=False, only_center_face=False, paste_back=True)
+    return frame if restored is None else restored
+
+
+class _FFmpegWriter:
+    """
+    Encodes BGR frames with ffmpeg (raw video over stdin) and copies the audio
+    track of audio_source, if any. Writes to a temp file first so output_path
+    may be the source video itself.
+    
+    Frames are handed to a single background thread, so pipe writes (which
+    release the GIL) overlap with GPU enhancement of the next frames while
+    keeping frame order.
+    """
+    
+    def __init__(self, width: int, height: int, fps: float, audio_source: str, output_path: str):
+        self.output_path = output_path
+        fd, self.tmp_path = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(fd)
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-framerate", str(fps), "-i", "-",
+            "-i", audio_source,
+            "-map", "0:v", "-map", "1:a?",
+            "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-c:a", "copy",
+            self.tmp_path,
+        ]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gfpgan-writer")
+        self.pending = []
+    
+    def submit(self, frames: List[np.ndarray]):
+        """Queue frames for writing; returns immediately"""
+        data = b"".join(np.ascontiguousarray(f).tobytes() for f in frames)
+        self.pending.append(self.executor.submit(self.proc.stdin.write, data))
+    
+    def finish(self):
+        """Wait for queued writes, finalize the file and move it to output_path"""
+        try:
+            for future in self.pending:
+                future.result()
+            self.proc.stdin.close()
+            if self.proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg exited with code {self.proc.returncode}")
+            os.replace(self.tmp_path, self.output_path)
+        finally:
+            self.abort()
+    
+    def abort(self):
+        """Stop the writer and remove the temp file (no-op after finish)"""
+        self.executor.shutdown(wait=False)
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+
+def _open_writer(frame: np.ndarray, fps: float, video_path: str, output_path: str) -> _FFmpegWriter:
+    height, width = frame.shape[:2]
+    return _FFmpegWriter(width, height, fps, video_path, output_path)
+
+
+def enhance_video(video_path: str, output_path: str, restorer) -> str:
+    """
+    Enhance a video frame by frame with an already loaded GFPGANer.
+    
+    Args:
+        video_path: Input video (its audio track is kept)
+        output_path: Output video path (may equal video_path)
+        restorer: gfpgan.GFPGANer instance
+    
+    Returns:
+        output_path
+    """
+    frames, fps = _read_frames(video_path)
+    if not frames:
+        raise ValueError(f"No frames decoded from {video_path}")
+    writer = _open_writer(frames[0], fps, video_path, output_path)
+    try:
+        for frame in frames:
+            writer.submit([_restore(restorer, frame)])
+    except BaseException:
+        writer.abort()
+        raise
+    writer.finish()
+    return output_path
+
+
+def _init_worker(model_path: str):
+    """Process pool initializer: load this worker's GFPGANer on cuda:0"""
+    global _worker_restorer
+    from gfpgan import GFPGANer
+    _worker_restorer = GFPGANer(
+        model_path=model_path,
+        upscale=1,
+        arch="clean",
+        channel_multiplier=2,
+        bg_upsampler=None,
+        device="cuda:0"
+    )
+
+
+def _enhance_frames(frames: List[np.ndarray]) -> List[np.ndarray]:
+    return [_restore(_worker_restorer, f) for f in frames]
+
+
+def default_workers() -> int:
+    """Worker count that fits in free VRAM: min(MAX_WORKERS, free_gb // VRAM_PER_WORKER_GB)"""
+    import torch
+    if not torch.cuda.is_available():
+        return 1
+    free_bytes, _ = torch.cuda.mem_get_info()
+    return max(1, min(MAX_WORKERS, int(free_bytes / 1024**3) // VRAM_PER_WORKER_GB))
+
+
+def enhance_video_parallel(
+    video_path: str,
+    output_path: str,
+    model_path: str,
+    workers: Optional[int] = None,
+    frames_per_task: int = 8
+) -> str:
+    """
+    Enhance a video with several GFPGAN worker processes sharing the GPU.
+    
+    A single GFPGANer processes one face at a time and leaves much of the GPU
+    idle; independent processes (each with its own model and CUDA context)
+    keep it busy. Frames are sent in chunks of frames_per_task and
+    reassembled in order.
+    
+    Args:
+        video_path: Input video (its audio track is kept)
+        output_path: Output video path (may equal video_path)
+        model_path: GFPGAN weights
+        workers: Worker processes (default: default_workers())
+        frames_per_task: Frames per task sent to a worker
+    
+    Returns:
+        output_path
+    """
+    frames, fps = _read_frames(video_path)
+    if not frames:
+        raise ValueError(f"No frames decoded from {video_path}")
+    workers = workers or default_workers()
+    
+    logger.info(f"GFPGAN: enhancing {len(frames)} frames with {workers} workers")
+    chunks = [frames[i:i + frames_per_task] for i in range(0, len(frames), frames_per_task)]
+    # CUDA cannot be re-initialized in a forked child
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(model_path,)
+    ) as pool:
+        # Chunks come back in order; encode each while later ones are still being enhanced
+        writer = _open_writer(frames[0], fps, video_path, output_path)
+        try:
+            for chunk in pool.map(_enhance_frames, chunks):
+                writer.submit(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+    writer.finish()
+    return output_path
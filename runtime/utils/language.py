@@ -2,10 +2,23 @@
 Language detection and processing utilities
 """
 import logging
+import re
 from typing import Optional, List
 
 logger = logging.getLogger(__name__)
 
+# Sentence end: terminal punctuation followed by whitespace (the text may still be streaming)
+_SENTENCE_END = re.compile(r'[.!?]+\s+')
+_ABBREVIATIONS = ("D.C.", "Mr.", "Mrs.", "Ms.", "Dr.", "Jr.", "Sr.", "U.S.", "U.K.", "etc.", "vs.", "e.g.", "i.e.")
+# Clause break inside a sentence, where an overlong chunk may be cut
+_CLAUSE_END = re.compile(r'[,;:]\s+')
+# A complete word of streamed text (followed by whitespace)
+_WORD = re.compile(r'\S+\s+')
+# Whitespace after terminal punctuation, unless the punctuation ends an abbreviation
+_SENTENCE_BOUNDARY = re.compile(
+    r'(?<=[.!?])' + ''.join(rf'(?<!\b{re.escape(abbr)})' for abbr in _ABBREVIATIONS) + r'\s+'
+)
+
 
 # Language code mappings
 LANGUAGE_CODES = {
@@ -129,6 +142,121 @@ def split_multilingual_text(text: str) -> List[dict]:
     return [{'text': text, 'language': language}]
 
 
+def split_complete_sentences(text: str, min_words: int = 3) -> tuple[list[str], str]:
+    """
+    Split off the complete sentences at the start of partially streamed text.
+    
+    Sentences shorter than min_words are kept together with the next one, and
+    periods of common abbreviations do not end a sentence.
+    
+    Returns:
+        Tuple of (complete sentences, remaining text)
+    """
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        candidate = text[start:match.end()].strip()
+        if candidate.endswith(_ABBREVIATIONS) or len(candidate.split()) < min_words:
+            continue
+        sentences.append(candidate)
+        start = match.end()
+    return sentences, text[start:]
+
+
+class SentenceChunker:
+    """
+    Cuts streamed text into TTS chunks as it arrives.
+    
+    The first chunk is emitted at the first sentence end whatever its length,
+    or cut after first_chunk_max_words words, so the first audio starts as
+    early as possible. Later chunks are only emitted at sentence ends once
+    they have min_words words, and cut at a clause break (or after max_words
+    words) when a sentence runs longer than max_words. A cut at a clause
+    break always leaves at least min_words words (no "Well," chunks).
+    """
+    
+    def __init__(self, first_chunk_max_words: int = 8, min_words: int = 3, max_words: int = 25):
+        self.first_chunk_max_words = first_chunk_max_words
+        self.min_words = min_words
+        self.max_words = max_words
+        self._buffer = ""
+        self._emitted = False
+    
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text; returns the chunks it completed"""
+        self._buffer += text
+        chunks = []
+        while True:
+            end = self._next_chunk_end()
+            if end is None:
+                return chunks
+            chunks.append(self._buffer[:end].strip())
+            self._buffer = self._buffer[end:]
+            self._emitted = True
+    
+    def flush(self) -> str:
+        """End of stream: returns the remaining text (may be empty)"""
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest
+    
+    def _next_chunk_end(self) -> Optional[int]:
+        min_words = self.min_words if self._emitted else 1
+        max_words = self.max_words if self._emitted else self.first_chunk_max_words
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[:match.end()].strip()
+            if candidate.endswith(_ABBREVIATIONS) or len(candidate.split()) < min_words:
+                continue
+            return match.end()
+        
+        # No usable sentence end: cut overlong text at its last clause break
+        words = list(_WORD.finditer(self._buffer))
+        if len(words) < max_words:
+            return None
+        limit = words[max_words - 1].end()
+        shortest = words[min(self.min_words, max_words) - 1].end()
+        clauses = [match.end() for match in _CLAUSE_END.finditer(self._buffer, 0, limit)
+                   if match.end() >= shortest]
+        return clauses[-1] if clauses else limit
+
+
+def split_sentences(text: str, min_words: int = 1) -> List[str]:
+    """
+    Split complete text into sentences in a single regex pass.
+    
+    Periods of common abbreviations do not end a sentence.
+    
+    Args:
+        text: Text to split
+        min_words: Sentences with fewer words are dropped
+    
+    Returns:
+        Sentences with their punctuation
+    """
+    return [s for s in map(str.strip, _SENTENCE_BOUNDARY.split(text)) if len(s.split()) >= min_words]
+
+
+def can_merge_sentence(previous: str, sentence: str, min_words: int = 6, max_words: int = 25) -> bool:
+    """True if sentence is shorter than min_words and fits after previous within max_words"""
+    words = len(sentence.split())
+    return words < min_words and len(previous.split()) + words <= max_words
+
+
+def merge_short_sentences(sentences: List[str], min_words: int = 6, max_words: int = 25) -> List[str]:
+    """
+    Append short sentences to the chunk before them (see can_merge_sentence).
+    
+    Nothing is merged into the first chunk, which stays short for time to
+    first frame.
+    """
+    merged = []
+    for sentence in sentences:
+        if len(merged) > 1 and can_merge_sentence(merged[-1], sentence, min_words, max_words):
+            merged[-1] = f"{merged[-1]} {sentence}"
+        else:
+            merged.append(sentence)
+    return merged
+
+
 def get_voice_sample_for_language(
     language: str,
     voice_samples_dir: str
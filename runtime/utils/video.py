@@ -189,6 +189,57 @@ def create_video_from_frames(
         raise
 
 
+def concat_videos(
+    video_paths: list,
+    output_path: str
+) -> str:
+    """
+    Concatenate videos with identical encoding parameters without re-encoding.
+    
+    Args:
+        video_paths: Input video paths, in playback order
+        output_path: Output video path
+        
+    Returns:
+        Path to output video
+    """
+    import subprocess
+    import tempfile
+    
+    try:
+        # Concat demuxer input list
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            for path in video_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+            list_path = f.name
+        
+        cmd = [
+            'ffmpeg',
+            '-y',
+            '-loglevel', 'error',
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', list_path,
+            '-c', 'copy',
+            output_path
+        ]
+        
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        finally:
+            os.unlink(list_path)
+        
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {result.stderr}")
+        
+        logger.debug(f"Concatenated {len(video_paths)} videos: {output_path}")
+        return output_path
+        
+    except Exception as e:
+        logger.error(f"Failed to concatenate videos: {e}")
+        raise
+
+
 def loop_video(
     video_path: str,
     duration: float,
@@ -210,6 +210,7 @@ async function processStreamingConversation(audioBlob) {
     
     let buffer = '';
     let shouldCloseStream = false;  // Flag to close stream after chunk 0
+    let firstChunkReceived = false;  // Chunk 0 may arrive before llm_response
     
     // Process stream in real-time
     while (true) {
@@ -258,6 +259,9 @@ async function processStreamingConversation(audioBlob) {
                     addToTranscript('assistant', responseText);
                     updateStatus('Generating video...', 'loading');
                     console.log('LLM Response:', responseText.substring(0, 80));
+                    if (firstChunkReceived) {
+                        shouldCloseStream = true;
+                    }
                     break;
                 
                 case 'video_chunk':
@@ -289,10 +293,14 @@ async function processStreamingConversation(audioBlob) {
                         console.log(`⚡ [PERF] TTFF: ${ttff.toFixed(2)}s - First chunk ready`);
                         updateStatus(`▶️ Playing chunk 0 (${ttff.toFixed(1)}s TTFF)`, 'loading');
                         
-                        // Mark to close stream after processing current buffer
+                        // Mark to close stream after processing current buffer (once the
+                        // reply text is in too: chunks are sent while the LLM still runs)
                         // Browser connection limit (6 per domain) blocks video loading if stream is open
-                        console.log(`🔌 Will close stream after chunk 0 to allow video downloads`);
-                        shouldCloseStream = true;
+                        firstChunkReceived = true;
+                        if (responseText) {
+                            console.log(`🔌 Will close stream after chunk 0 to allow video downloads`);
+                            shouldCloseStream = true;
+                        }
                     } else {
                         updateStatus(`Chunk ${chunkIndex} (${chunkTime.toFixed(1)}s)`, 'loading');
                     }